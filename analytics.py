@@ -0,0 +1,263 @@
+#!/usr/bin/env python3
+"""
+Session Analytics
+Per-session metrics (rating, turns, coaching uptake, reply latency) kept in
+append-only column files, and cohort reports computed with NumPy
+"""
+
+import json
+import os
+import threading
+import time
+from typing import Dict, Iterable, List
+
+import numpy as np
+
+from assessment import Assessment, extract_rating
+from transcript import CUSTOMER, REPRESENTATIVE, Transcript
+
+DEFAULT_ANALYTICS_DIR = os.path.join(
+    os.path.expanduser("~"), ".cache", "ai-roleplay-trainer", "analytics"
+)
+
+# One raw little-endian file per column; rows are appended, never rewritten
+SESSION_COLUMNS = {
+    "timestamp": "<f8",  # When the session ended
+    "scenario": "<i4",  # Code into the "scenario" dictionary
+    "trainee": "<i4",  # Code into the "trainee" dictionary
+    "rating": "<f4",  # Overall rating from the feedback, NaN if none
+    "turns": "<i4",  # Representative turns until the call ended
+    "hints": "<i4",  # Coaching hints shown
+    "hints_followed": "<i4",  # Hints followed by a better-rated exchange
+    "off_topic": "<i4",  # Representative turns caught by the topic filter
+}
+TURN_COLUMNS = {
+    "session": "<i4",  # Row in the session columns
+    "latency": "<f4",  # Seconds from representative turn to full reply
+}
+TABLES = {"sessions": SESSION_COLUMNS, "turns": TURN_COLUMNS}
+
+PERCENTILES = (50, 90, 99)
+
+
+def session_metrics(
+    transcript: Transcript,
+    assessments: List[Assessment],
+    hinted: Iterable[int],
+    redirect: str = None,
+) -> Dict:
+    """Metrics of one finished session, apart from the feedback rating
+
+    Args:
+        transcript: The session's transcript
+        assessments: Its rolling assessments
+        hinted: Assessment `upto` values coaching hints were shown for
+        redirect: The scenario's canned reply to off-topic input
+    """
+    ratings = {a.upto: a.rating for a in assessments if a.rating}
+    hinted = set(hinted)
+    # A hint at `upto` is about the next representative turn, assessed at upto + 2
+    followed = sum(
+        1
+        for upto in hinted
+        if upto in ratings and ratings.get(upto + 2, 0) > ratings[upto]
+    )
+    turns = transcript.turns
+    return {
+        "turns": sum(turn.speaker == REPRESENTATIVE for turn in turns),
+        "hints": len(hinted),
+        "hints_followed": followed,
+        "off_topic": sum(
+            turn.speaker == CUSTOMER and turn.text == redirect for turn in turns[1:]
+        ),
+        # The opening line is left out; its timestamps span the briefing
+        "latencies": [
+            turn.ended_at - turn.started_at
+            for turn in turns[1:]
+            if turn.speaker == CUSTOMER
+        ],
+    }
+
+
+class AnalyticsStore:
+    """Column files for sessions and customer-reply turns
+
+    Strings (scenario, trainee) are dictionary-encoded in dictionaries.json.
+    Readers memory-map the columns; a row half-written by a crash is ignored
+    because every column is truncated to the shortest one.
+
+    Args:
+        directory: Where the column files live
+    """
+
+    def __init__(self, directory: str = DEFAULT_ANALYTICS_DIR):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._dictionaries_path = os.path.join(directory, "dictionaries.json")
+        try:
+            with open(self._dictionaries_path, encoding="utf-8") as f:
+                self.dictionaries = json.load(f)
+        except (OSError, ValueError):
+            self.dictionaries = {"scenario": [], "trainee": []}
+
+    def _path(self, table: str, column: str) -> str:
+        return os.path.join(self.directory, f"{table}.{column}")
+
+    def _code(self, dictionary: str, value: str) -> int:
+        values = self.dictionaries[dictionary]
+        if value not in values:
+            values.append(value)
+            with open(self._dictionaries_path + ".tmp", "w", encoding="utf-8") as f:
+                json.dump(self.dictionaries, f, ensure_ascii=False)
+            os.replace(self._dictionaries_path + ".tmp", self._dictionaries_path)
+        return values.index(value)
+
+    def record_session(
+        self,
+        scenario_id: str,
+        trainee: str,
+        metrics: Dict,
+        feedback: str,
+        timestamp: float = None,
+    ) -> int:
+        """Append one session; returns its row
+
+        Args:
+            scenario_id: Scenario played
+            trainee: Who played it
+            metrics: From session_metrics
+            feedback: End-of-session feedback, for the overall rating
+            timestamp: When the session ended (default now)
+        """
+        rating = extract_rating(feedback)
+        with self._lock:
+            row = self._truncate_partial_rows("sessions")
+            self._truncate_partial_rows("turns")
+            values = {
+                "timestamp": time.time() if timestamp is None else timestamp,
+                "scenario": self._code("scenario", scenario_id),
+                "trainee": self._code("trainee", trainee or ""),
+                "rating": np.nan if rating is None else rating,
+                "turns": metrics["turns"],
+                "hints": metrics["hints"],
+                "hints_followed": metrics["hints_followed"],
+                "off_topic": metrics["off_topic"],
+            }
+            self._append("sessions", {k: [v] for k, v in values.items()})
+            latencies = metrics["latencies"]
+            self._append(
+                "turns",
+                {"session": [row] * len(latencies), "latency": latencies},
+            )
+            return row
+
+    def _append(self, table: str, columns: Dict[str, list]):
+        for column, dtype in TABLES[table].items():
+            with open(self._path(table, column), "ab") as f:
+                np.asarray(columns[column], dtype=dtype).tofile(f)
+
+    def _truncate_partial_rows(self, table: str) -> int:
+        """Cut every column back to the rows all columns have; returns that count"""
+        sizes = {}
+        for column, dtype in TABLES[table].items():
+            path = self._path(table, column)
+            size = os.path.getsize(path) if os.path.exists(path) else 0
+            sizes[path] = (size, np.dtype(dtype).itemsize)
+        rows = min(size // itemsize for size, itemsize in sizes.values())
+        for path, (size, itemsize) in sizes.items():
+            if size > rows * itemsize:
+                os.truncate(path, rows * itemsize)
+        return rows
+
+    def _load(self, table: str) -> Dict[str, np.ndarray]:
+        """Memory-mapped columns of a table, truncated to whole rows"""
+        columns = {}
+        for column, dtype in TABLES[table].items():
+            path = self._path(table, column)
+            size = os.path.getsize(path) if os.path.exists(path) else 0
+            if size < np.dtype(dtype).itemsize:
+                columns[column] = np.empty(0, dtype=dtype)
+            else:
+                columns[column] = np.memmap(
+                    path, dtype=dtype, mode="r", shape=size // np.dtype(dtype).itemsize
+                )
+        rows = min(len(values) for values in columns.values())
+        return {column: values[:rows] for column, values in columns.items()}
+
+    def report(
+        self, scenario_id: str = None, trainee: str = None, since: float = None
+    ) -> Dict:
+        """Aggregates over the sessions matching every given filter"""
+        sessions = self._load("sessions")
+        mask = np.ones(len(sessions["timestamp"]), dtype=bool)
+        for dictionary, value in (("scenario", scenario_id), ("trainee", trainee)):
+            if value is not None:
+                values = self.dictionaries[dictionary]
+                code = values.index(value) if value in values else -1
+                mask &= sessions[dictionary] == code
+        if since is not None:
+            mask &= sessions["timestamp"] >= since
+
+        rating = sessions["rating"][mask]
+        rated = rating[~np.isnan(rating)]
+        turns = sessions["turns"][mask]
+        hints = int(sessions["hints"][mask].sum())
+        followed = int(sessions["hints_followed"][mask].sum())
+
+        turn_columns = self._load("turns")
+        turn_session = turn_columns["session"]
+        in_cohort = np.zeros(len(turn_session), dtype=bool)
+        known = turn_session < len(mask)
+        in_cohort[known] = mask[turn_session[known]]
+        latency = turn_columns["latency"][in_cohort]
+
+        def percentiles(values):
+            if not len(values):
+                return {}
+            points = np.percentile(values, PERCENTILES)
+            return {f"p{p}": round(float(v), 3) for p, v in zip(PERCENTILES, points)}
+
+        return {
+            "sessions": int(mask.sum()),
+            "rated": int(len(rated)),
+            "rating_mean": round(float(rated.mean()), 2) if len(rated) else None,
+            "rating_distribution": {
+                str(star): int(count)
+                for star, count in enumerate(
+                    np.bincount(np.clip(np.rint(rated), 1, 5).astype(int), minlength=6)
+                )
+                if star
+            },
+            "turns_mean": round(float(turns.mean()), 2) if len(turns) else None,
+            "turns": percentiles(turns),
+            "coaching_hints": hints,
+            "coaching_uptake": round(followed / hints, 3) if hints else None,
+            "off_topic_turns": int(sessions["off_topic"][mask].sum()),
+            "reply_latency": percentiles(latency),
+        }
+
+
+def format_report(report: Dict) -> str:
+    """Human-readable cohort report"""
+
+    def points(values):
+        return "  ".join(f"{k} {v}" for k, v in values.items()) or "-"
+
+    distribution = "  ".join(
+        f"{star}★ {count}" for star, count in report["rating_distribution"].items()
+    )
+    uptake = report["coaching_uptake"]
+    return "\n".join(
+        [
+            f"Sessions: {report['sessions']} ({report['rated']} rated)",
+            f"Rating: mean {report['rating_mean'] or '-'}   {distribution}",
+            f"Turns to resolution: mean {report['turns_mean'] or '-'}   "
+            f"{points(report['turns'])}",
+            f"Coaching: {report['coaching_hints']} hints, "
+            f"{'-' if uptake is None else format(uptake, '.0%')} followed by a "
+            "better exchange",
+            f"Off-topic turns: {report['off_topic_turns']}",
+            f"Customer reply latency (s): {points(report['reply_latency'])}",
+        ]
+    )
@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+"""
+Rolling Assessment
+Scores each exchange in the background while the call is in progress, so
+end-of-session feedback only has to synthesize the per-exchange results
+"""
+
+import re
+import threading
+from concurrent.futures import Executor, Future
+from typing import Callable, Dict, List
+
+from llm_providers import is_error_response
+
+# Assessment responses are asked for in this line format
+FIELD_PATTERN = re.compile(r"^\s*(RATING|STRENGTH|ISSUE|HINT)\s*:\s*(.*)$", re.I)
+
+
+# "OVERALL RATING: 4/5", "**Overall rating (1-5):** 3.5", ...
+OVERALL_RATING_PATTERN = re.compile(r"OVERALL\s+RATING", re.I)
+# The scale the prompt asked for, e.g. "(1-5)", so its "1" isn't read as a rating
+RATING_SCALE_PATTERN = re.compile(r"[(\[]\s*1\s*(?:-|–|to)\s*5\s*[)\]]", re.I)
+RATING_OUT_OF_FIVE_PATTERN = re.compile(r"\b([1-5](?:\.\d+)?)\s*(?:/|out of)\s*5\b")
+RATING_NUMBER_PATTERN = re.compile(r"(?<![\d.])([1-5](?:\.\d+)?)(?![\d.])")
+
+
+def extract_rating(feedback: str):
+    """Overall 1-5 rating from free-text feedback, or None
+
+    Reads the OVERALL RATING section the feedback prompts ask for,
+    preferring an explicit "N/5" there over a bare number, and falls back to
+    the last "N/5" in the text.
+    """
+    match = OVERALL_RATING_PATTERN.search(feedback)
+    if match is not None:
+        section = RATING_SCALE_PATTERN.sub("", feedback[match.end() :][:120])
+        for pattern in (RATING_OUT_OF_FIVE_PATTERN, RATING_NUMBER_PATTERN):
+            rating = pattern.search(section)
+            if rating is not None:
+                return float(rating.group(1))
+    matches = RATING_OUT_OF_FIVE_PATTERN.findall(feedback)
+    if not matches:
+        return None
+    return float(matches[-1])
+
+
+class Assessment:
+    """Interim assessment of the representative's latest response
+
+    `upto` is the number of transcript turns that were assessed; the
+    representative turn being judged is turns[upto - 2].
+    """
+
+    __slots__ = ("upto", "rating", "strength", "issue", "hint")
+
+    def __init__(
+        self,
+        upto: int,
+        rating: int = None,
+        strength: str = "",
+        issue: str = "",
+        hint: str = "",
+    ):
+        self.upto = upto
+        self.rating = rating
+        self.strength = strength
+        self.issue = issue
+        self.hint = hint
+
+    @classmethod
+    def parse(cls, upto: int, text: str) -> "Assessment":
+        """Read RATING/STRENGTH/ISSUE/HINT lines; unstructured text is the hint"""
+        fields = {}
+        for line in text.splitlines():
+            match = FIELD_PATTERN.match(line)
+            if match:
+                fields[match.group(1).lower()] = match.group(2).strip()
+
+        rating = None
+        digits = re.search(r"[1-5]", fields.get("rating", ""))
+        if digits:
+            rating = int(digits.group())
+        none = ("", "none", "n/a", "-")
+        return cls(
+            upto,
+            rating,
+            "" if fields.get("strength", "").lower() in none else fields["strength"],
+            "" if fields.get("issue", "").lower() in none else fields["issue"],
+            fields.get("hint") or (text.strip() if not fields else ""),
+        )
+
+    def render(self, exchange: int) -> str:
+        """One line for the synthesis prompt"""
+        rating = f"{self.rating}/5" if self.rating else "unrated"
+        return (
+            f"Exchange {exchange}: {rating}; strength: {self.strength or '-'}; "
+            f"issue: {self.issue or '-'}"
+        )
+
+    def to_dict(self) -> Dict:
+        return {slot: getattr(self, slot) for slot in self.__slots__}
+
+
+class RollingAssessor:
+    """Runs one assessment per transcript length on a shared executor
+
+    Args:
+        assess: Callable taking a turn count and returning the raw model text
+        executor: Where assessments run (the trainer's background pool)
+    """
+
+    def __init__(self, assess: Callable[[int], str], executor: Executor):
+        self.assess = assess
+        self.executor = executor
+        self._futures: Dict[int, Future] = {}
+        self._lock = threading.Lock()
+
+    def submit(self, upto: int) -> Future:
+        """Assessment future for the first `upto` turns (started at most once)"""
+        with self._lock:
+            future = self._futures.get(upto)
+            if future is None:
+                future = self.executor.submit(self._run, upto)
+                self._futures[upto] = future
+            return future
+
+    def add(self, assessment: Assessment):
+        """Record an assessment made without the model"""
+        future = Future()
+        future.set_result(assessment)
+        with self._lock:
+            self._futures[assessment.upto] = future
+
+    def _run(self, upto: int) -> Assessment:
+        text = self.assess(upto)
+        if is_error_response(text):
+            raise RuntimeError(text)
+        return Assessment.parse(upto, text)
+
+    def results(self) -> List[Assessment]:
+        """Finished assessments in transcript order, waiting for pending ones
+
+        Failed assessments, including provider error responses, are left out.
+        """
+        with self._lock:
+            futures = sorted(self._futures.items())
+        results = []
+        for _, future in futures:
+            try:
+                results.append(future.result())
+            except Exception:
+                continue
+        return results
+
+    def reset(self):
+        with self._lock:
+            self._futures = {}
+
+    def to_list(self) -> List[Dict]:
+        return [assessment.to_dict() for assessment in self.results()]
+
+    def load(self, assessments: List[Dict]):
+        """Restore assessments saved with to_list"""
+        with self._lock:
+            self._futures = {}
+        for fields in assessments:
+            self.add(Assessment(**fields))
+
+
+def build_synthesis_prompt(assessments: List[Assessment], coaching_context: str) -> str:
+    """Short end-of-session prompt over the per-exchange assessments"""
+    lines = "\n".join(
+        assessment.render(exchange)
+        for exchange, assessment in enumerate(assessments, 1)
+    )
+    ratings = [a.rating for a in assessments if a.rating]
+    average = f"{sum(ratings) / len(ratings):.1f}/5" if ratings else "n/a"
+    return f"""
+            Turn these per-exchange assessments of a customer service call into final feedback for the representative.
+
+            CONTEXT: {coaching_context}
+
+            ASSESSMENTS (average interim rating {average}):
+            {lines}
+
+            Provide, briefly:
+            1. STRENGTHS: What did they do well?
+            2. AREAS FOR IMPROVEMENT: What could they have done better?
+            3. SPECIFIC SUGGESTIONS: Concrete advice for handling similar situations
+            4. OVERALL RATING: Rate their performance from 1-5 with brief explanation
+
+            Base the rating on the trend across exchanges. Keep it under 200 words.
+        """
@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+"""
+Batch Transcript Grading
+Grades stored transcripts with the end-of-session feedback prompt, without
+the interactive trainer
+"""
+
+import contextlib
+import json
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Callable, Dict, Iterator, Set, Tuple
+
+from assessment import extract_rating
+from batching import BatchQueue
+from feedback_prompts import build_feedback_prompt, format_conversation_for_review
+from llm_providers import LLMProvider, is_error_response
+from transcript import Transcript
+
+
+def read_transcripts(input_path: str) -> Iterator[Tuple[str, str]]:
+    """Yield (transcript id, formatted conversation) from a JSONL file
+
+    Each line is an object with an optional "id" (defaults to the line
+    number) and one of "transcript" (already formatted conversation text),
+    "turns" (Transcript.to_list() records) or "conversation_history" (the
+    trainer's message list).
+    """
+    with open(input_path, encoding="utf-8") as f:
+        for line_number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            transcript_id = str(record.get("id", line_number))
+            if "transcript" in record:
+                yield transcript_id, record["transcript"]
+            elif "turns" in record:
+                yield transcript_id, Transcript.from_list(record["turns"]).render()
+            else:
+                yield transcript_id, format_conversation_for_review(
+                    record["conversation_history"]
+                )
+
+
+def completed_ids(output_path: str) -> Set[str]:
+    """Ids already graded successfully in an existing output file"""
+    if not os.path.exists(output_path):
+        return set()
+
+    done = set()
+    with open(output_path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue  # Partial line from an interrupted run
+            if not record.get("error"):
+                done.add(record["id"])
+    return done
+
+
+def _terminate_partial_line(output_path: str):
+    """Make sure appended results start on a fresh line after an interruption"""
+    if not os.path.exists(output_path) or not os.path.getsize(output_path):
+        return
+    with open(output_path, "rb+") as f:
+        f.seek(-1, os.SEEK_END)
+        if f.read(1) != b"\n":
+            f.write(b"\n")
+
+
+def _grading_messages(conversation_text: str):
+    return [{"role": "user", "content": build_feedback_prompt(conversation_text)}]
+
+
+def grade_transcript(provider: LLMProvider, conversation_text: str) -> str:
+    """Generate end-of-session feedback for one formatted conversation"""
+    return provider.make_call(
+        _grading_messages(conversation_text), max_tokens=1500, call_site="batch_grading"
+    )
+
+
+def grade_transcripts(
+    input_path: str,
+    output_path: str,
+    provider: LLMProvider,
+    workers: int = 8,
+    progress: Callable[[str], None] = print,
+    batch: BatchQueue = None,
+) -> Dict[str, float]:
+    """Grade every transcript in a JSONL file with a bounded worker pool
+
+    Results are appended to output_path as they complete, one JSON object per
+    line. Transcripts already graded successfully in output_path are skipped,
+    so an interrupted run resumes where it stopped.
+
+    Args:
+        input_path: JSONL file of transcripts (see read_transcripts)
+        output_path: JSONL file results are appended to
+        provider: LLM provider used for grading
+        workers: Maximum concurrent grading calls
+        progress: Callable receiving progress lines
+        batch: Submit through this BatchQueue (the provider's batch
+              endpoint) instead of per-request calls; workers is then unused
+
+    Returns:
+        Run statistics: graded, errors, skipped, seconds, per_minute
+    """
+    done = completed_ids(output_path)
+    _terminate_partial_line(output_path)
+    stats = {"graded": 0, "errors": 0, "skipped": 0}
+    started = time.perf_counter()
+
+    def report():
+        elapsed = time.perf_counter() - started
+        per_minute = stats["graded"] / elapsed * 60 if elapsed else 0.0
+        progress(
+            f"Graded {stats['graded']} ({stats['errors']} errors, "
+            f"{stats['skipped']} skipped) in {elapsed:.1f}s - {per_minute:.1f}/min"
+        )
+        return elapsed, per_minute
+
+    def make_record(transcript_id, feedback, call_started):
+        record = {
+            "id": transcript_id,
+            "feedback": feedback,
+            "seconds": round(time.perf_counter() - call_started, 3),
+        }
+        if is_error_response(feedback):
+            record["error"] = feedback
+        else:
+            record["rating"] = extract_rating(feedback)
+        return record
+
+    def grade(transcript_id, conversation_text):
+        call_started = time.perf_counter()
+        feedback = grade_transcript(provider, conversation_text)
+        return make_record(transcript_id, feedback, call_started)
+
+    def queue_batched(transcript_id, conversation_text):
+        record = Future()
+        call_started = time.perf_counter()
+        batch.submit(
+            _grading_messages(conversation_text), 1500, "batch_grading"
+        ).add_done_callback(
+            lambda future: record.set_result(
+                make_record(transcript_id, future.result(), call_started)
+            )
+        )
+        return record
+
+    # Batches need a deep window to fill up; calls only as many as workers
+    window = batch.max_batch_size * 2 if batch else workers * 2
+
+    # Batched grading waits on the queue's poller; only direct calls need threads
+    with (
+        open(output_path, "a", encoding="utf-8") as output,
+        (
+            contextlib.nullcontext()
+            if batch
+            else ThreadPoolExecutor(max_workers=workers)
+        ) as executor,
+    ):
+        pending = set()
+
+        def collect(finished):
+            for future in finished:
+                record = future.result()
+                output.write(json.dumps(record, ensure_ascii=False) + "\n")
+                output.flush()
+                stats["errors" if "error" in record else "graded"] += 1
+                if (stats["graded"] + stats["errors"]) % 25 == 0:
+                    report()
+
+        for transcript_id, conversation_text in read_transcripts(input_path):
+            if transcript_id in done:
+                stats["skipped"] += 1
+                continue
+            # Keep the in-flight window bounded so huge inputs aren't read ahead
+            if len(pending) >= window:
+                finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+                collect(finished)
+            if batch:
+                pending.add(queue_batched(transcript_id, conversation_text))
+            else:
+                pending.add(executor.submit(grade, transcript_id, conversation_text))
+
+        if batch:
+            batch.flush()
+        finished, _ = wait(pending)
+        collect(finished)
+
+    elapsed, per_minute = report()
+    return {**stats, "seconds": elapsed, "per_minute": per_minute}
@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+"""
+Batch Submission
+Collects non-interactive requests (feedback, bulk grading) and sends them
+through the providers' asynchronous batch endpoints instead of one call each
+"""
+
+import itertools
+import threading
+import time
+from concurrent.futures import Future
+from typing import Dict, List
+
+from llm_providers import LLMProvider, base_provider
+
+
+class BatchQueue:
+    """Groups requests into provider batches and resolves a future per request
+
+    Requests collect until max_batch_size are waiting or the oldest has
+    waited max_wait seconds, then go out as one batch. A daemon thread polls
+    submitted batches every poll_interval seconds and resolves each request's
+    future with its response text (or error string).
+
+    Batches go to the innermost provider: batch traffic has its own quota at
+    the providers, so it bypasses the live-call rate scheduler and the
+    response cache.
+
+    Args:
+        provider: Provider (or provider wrapper) to submit batches to
+        max_batch_size: Requests per batch
+        max_wait: Seconds to keep collecting before submitting a partial batch
+        poll_interval: Seconds between status checks of submitted batches
+    """
+
+    def __init__(
+        self,
+        provider: LLMProvider,
+        max_batch_size: int = 100,
+        max_wait: float = 30.0,
+        poll_interval: float = 30.0,
+    ):
+        self.provider = base_provider(provider)
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.poll_interval = poll_interval
+        self.stats = {"requests": 0, "batches": 0}
+        self._waiting: List[Dict] = []
+        self._futures: Dict[str, Future] = {}
+        self._submitted: Dict[str, List[str]] = {}  # batch id -> custom ids
+        self._first_waiting = None
+        self._flush = False
+        self._closed = False
+        self._ids = itertools.count(1)
+        self._condition = threading.Condition()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def submit(
+        self,
+        messages: List[Dict[str, str]],
+        max_tokens: int = 1000,
+        call_site: str = None,
+        model: str = None,
+    ) -> Future:
+        """Queue one request; the future resolves to its response text"""
+        future = Future()
+        with self._condition:
+            if self._closed:
+                raise RuntimeError("BatchQueue is closed")
+            custom_id = f"req-{next(self._ids)}"
+            self._waiting.append(
+                {
+                    "custom_id": custom_id,
+                    "messages": messages,
+                    "max_tokens": max_tokens,
+                    "call_site": call_site,
+                    "model": model,
+                }
+            )
+            self._futures[custom_id] = future
+            self.stats["requests"] += 1
+            if self._first_waiting is None:
+                self._first_waiting = time.monotonic()
+            self._condition.notify_all()
+        return future
+
+    def flush(self):
+        """Submit whatever is waiting without waiting for a full batch"""
+        with self._condition:
+            self._flush = True
+            self._condition.notify_all()
+
+    def pending(self) -> int:
+        """Requests not yet resolved"""
+        with self._condition:
+            return len(self._futures)
+
+    def close(self, wait: bool = True):
+        """Submit what is waiting and, if wait, block until all futures resolve"""
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+        if wait:
+            self._thread.join()
+
+    def _run(self):
+        next_poll = time.monotonic() + self.poll_interval
+        while True:
+            with self._condition:
+                while True:
+                    now = time.monotonic()
+                    ready = self._waiting and (
+                        len(self._waiting) >= self.max_batch_size
+                        or self._flush
+                        or self._closed
+                        or now - self._first_waiting >= self.max_wait
+                    )
+                    if ready or (self._submitted and now >= next_poll):
+                        break
+                    if self._closed and not self._submitted:
+                        return
+                    deadlines = []
+                    if self._waiting:
+                        deadlines.append(self._first_waiting + self.max_wait)
+                    if self._submitted:
+                        deadlines.append(next_poll)
+                    timeout = max(min(deadlines) - now, 0) if deadlines else None
+                    self._condition.wait(timeout)
+                batch = []
+                if ready:
+                    batch = self._waiting[: self.max_batch_size]
+                    self._waiting = self._waiting[self.max_batch_size :]
+                    self._first_waiting = time.monotonic() if self._waiting else None
+                    self._flush = self._flush and bool(self._waiting)
+                submitted = list(self._submitted)
+
+            if batch:
+                self._submit(batch)
+            elif submitted:
+                for batch_id in submitted:
+                    self._poll(batch_id)
+                next_poll = time.monotonic() + self.poll_interval
+
+    def _submit(self, batch: List[Dict]):
+        custom_ids = [request["custom_id"] for request in batch]
+        try:
+            batch_id = self.provider.submit_batch(batch)
+        except Exception as e:
+            self._resolve(
+                {custom_id: f"Error making batch call: {e}" for custom_id in custom_ids}
+            )
+            return
+        with self._condition:
+            self._submitted[batch_id] = custom_ids
+            self.stats["batches"] += 1
+
+    def _poll(self, batch_id: str):
+        try:
+            results = self.provider.poll_batch(batch_id)
+        except Exception:
+            return  # Transient; polled again next interval
+        if results is None:
+            return
+        with self._condition:
+            custom_ids = self._submitted.pop(batch_id)
+        self._resolve(
+            {
+                custom_id: results.get(
+                    custom_id, "API Error: No result returned for batch request."
+                )
+                for custom_id in custom_ids
+            }
+        )
+
+    def _resolve(self, results: Dict[str, str]):
+        with self._condition:
+            futures = [(self._futures.pop(key), text) for key, text in results.items()]
+        for future, text in futures:
+            future.set_result(text)
@@ -0,0 +1,213 @@
+#!/usr/bin/env python3
+"""
+Trainer Benchmark Suite
+Drives CustomerServiceTrainer through the replay provider to measure the
+trainer's own per-turn overhead, payload size and allocations offline
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import statistics
+import time
+import tracemalloc
+from concurrent.futures import Executor, Future
+from unittest import mock
+
+from llm_providers import DEFAULT_REPLAY_FIXTURE, ReplayProvider
+from main import CustomerServiceTrainer
+
+SCRIPTED_RESPONSES = [
+    "Hi Sarah, thanks for calling. I'm sorry about the surprise on your bill - let me look into that $45 charge for you.",
+    "I see it here. It's the TechFlow Plus Enhancement, which applies automatically once the initial 2-year contract ends, per Section 12.3.",
+    "I completely understand that it feels unexpected. The package includes priority support, premium channels, a 50% speed boost and free tech visits.",
+    "You have a few options: keep it with 50% off for the next 3 months, or remove it with 30-day written notice.",
+    "Since you were billed within the last 15 days, I can also refund this month's charge if you decide to remove it.",
+    "Done - I've removed the enhancement and processed the refund. Is there anything else I can help you with today?",
+]
+
+
+def percentile(values, fraction):
+    """Nearest-rank percentile of a list of numbers"""
+    ordered = sorted(values)
+    return ordered[min(int(fraction * len(ordered)), len(ordered) - 1)]
+
+
+class DeferredExecutor(Executor):
+    """Holds submitted calls until run_pending, so a step can time them"""
+
+    def __init__(self):
+        self.pending = []
+
+    def submit(self, fn, *args, **kwargs):
+        future = Future()
+        self.pending.append((future, fn, args, kwargs))
+        return future
+
+    def run_pending(self):
+        pending, self.pending = self.pending, []
+        for future, fn, args, kwargs in pending:
+            try:
+                future.set_result(fn(*args, **kwargs))
+            except Exception as e:
+                future.set_exception(e)
+
+
+class StepRecorder:
+    """Collects wall time, payload bytes and allocations per trainer step"""
+
+    def __init__(self, provider, trace_allocations):
+        self.provider = provider
+        self.trace_allocations = trace_allocations
+        self.samples = []
+
+    @contextlib.contextmanager
+    def step(self, name, turn=None):
+        requests_before = len(self.provider.request_sizes)
+        if self.trace_allocations:
+            tracemalloc.reset_peak()
+            before = tracemalloc.take_snapshot()
+        started = time.perf_counter()
+
+        yield
+
+        elapsed = time.perf_counter() - started
+        sample = {
+            "step": name,
+            "turn": turn,
+            "ms": elapsed * 1000,
+            "payload_bytes": sum(
+                size for _, size in self.provider.request_sizes[requests_before:]
+            ),
+        }
+        if self.trace_allocations:
+            after = tracemalloc.take_snapshot()
+            diff = after.compare_to(before, "filename")
+            sample["new_blocks"] = sum(max(stat.count_diff, 0) for stat in diff)
+            sample["peak_kib"] = tracemalloc.get_traced_memory()[1] / 1024
+        self.samples.append(sample)
+
+
+def run_session(recorder, trainer, turns):
+    """Run one scripted session through every instrumented trainer step"""
+    with (
+        mock.patch("builtins.input", return_value=""),
+        contextlib.redirect_stdout(io.StringIO()),
+    ):
+        with recorder.step("start_scenario"):
+            trainer.start_scenario()
+
+        # Rolling assessments (which carry the coaching hint) normally overlap
+        # the trainee's typing; hold them so their call is timed as a step
+        assessments = DeferredExecutor()
+        trainer.assessor.executor = assessments
+        for turn in range(turns):
+            response = SCRIPTED_RESPONSES[turn % len(SCRIPTED_RESPONSES)]
+            with recorder.step("handle_user_response", turn + 1):
+                trainer.handle_user_response(response)
+                # Count background summarization against the turn that caused it
+                trainer.context.wait_for_digest()
+
+            with recorder.step("assess_exchange", turn + 1):
+                assessments.run_pending()
+        trainer.assessor.executor = trainer.background
+
+        with recorder.step("end_scenario_with_feedback"):
+            trainer.end_scenario_with_feedback()
+
+
+def run_benchmark(sessions=5, turns=12, fixture=DEFAULT_REPLAY_FIXTURE, latency=None):
+    """Run the benchmark and return the raw per-step samples
+
+    Sessions run twice: once untraced for timing and payload size, and once
+    under tracemalloc for allocation counts (tracing inflates timings).
+    """
+    samples = []
+    for trace_allocations in (False, True):
+        if trace_allocations:
+            tracemalloc.start()
+        for _ in range(sessions):
+            provider = ReplayProvider(fixture, latency=latency)
+            trainer = CustomerServiceTrainer(provider=provider, use_cache=False)
+            recorder = StepRecorder(provider, trace_allocations)
+            run_session(recorder, trainer, turns)
+            samples.extend(recorder.samples)
+        if trace_allocations:
+            tracemalloc.stop()
+    return samples
+
+
+def summarize(samples):
+    """Aggregate samples per step: timing from untraced runs, allocations from traced"""
+    summary = {}
+    for name in dict.fromkeys(sample["step"] for sample in samples):
+        timed = [s for s in samples if s["step"] == name and "new_blocks" not in s]
+        traced = [s for s in samples if s["step"] == name and "new_blocks" in s]
+        ms = [s["ms"] for s in timed]
+        summary[name] = {
+            "count": len(timed),
+            "mean_ms": statistics.mean(ms),
+            "p50_ms": percentile(ms, 0.50),
+            "p95_ms": percentile(ms, 0.95),
+            "mean_payload_bytes": statistics.mean(s["payload_bytes"] for s in timed),
+            "mean_new_blocks": statistics.mean(s["new_blocks"] for s in traced),
+            "max_peak_kib": max(s["peak_kib"] for s in traced),
+        }
+    return summary
+
+
+def payload_by_turn(samples):
+    """Mean customer-reply payload bytes per turn number (should stay flat)"""
+    by_turn = {}
+    for sample in samples:
+        if sample["step"] == "handle_user_response" and "new_blocks" not in sample:
+            by_turn.setdefault(sample["turn"], []).append(sample["payload_bytes"])
+    return {turn: statistics.mean(sizes) for turn, sizes in sorted(by_turn.items())}
+
+
+def print_report(summary, by_turn):
+    print("=" * 96)
+    print("TRAINER BENCHMARK (replay provider - local overhead only)")
+    print("=" * 96)
+    print(
+        f"{'step':<36}{'n':>5}{'mean ms':>10}{'p50 ms':>9}{'p95 ms':>9}"
+        f"{'payload B':>11}{'new blocks':>12}{'peak KiB':>10}"
+    )
+    for name, row in summary.items():
+        print(
+            f"{name:<36}{row['count']:>5}{row['mean_ms']:>10.2f}{row['p50_ms']:>9.2f}"
+            f"{row['p95_ms']:>9.2f}{row['mean_payload_bytes']:>11.0f}"
+            f"{row['mean_new_blocks']:>12.0f}{row['max_peak_kib']:>10.1f}"
+        )
+
+    print("\nCustomer reply payload by turn:")
+    print("  " + "  ".join(f"{turn}:{size:.0f}B" for turn, size in by_turn.items()))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline trainer benchmark suite")
+    parser.add_argument("--sessions", type=int, default=5, help="Sessions per pass")
+    parser.add_argument("--turns", type=int, default=12, help="Turns per session")
+    parser.add_argument(
+        "--fixture", default=DEFAULT_REPLAY_FIXTURE, help="Replay fixture file"
+    )
+    parser.add_argument(
+        "--latency",
+        help="Replay latency model: seconds per response or 'recorded' (default: none)",
+    )
+    parser.add_argument("--json", metavar="PATH", help="Also write results as JSON")
+    args = parser.parse_args()
+
+    samples = run_benchmark(args.sessions, args.turns, args.fixture, args.latency)
+    summary = summarize(samples)
+    by_turn = payload_by_turn(samples)
+    print_report(summary, by_turn)
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"steps": summary, "payload_by_turn": by_turn}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
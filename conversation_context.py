@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+"""
+Conversation Context Management
+Keeps the per-turn payload sent to the LLM within a token budget
+"""
+
+from concurrent.futures import Executor, ThreadPoolExecutor, wait
+from typing import Callable, Dict, List, Tuple
+
+from llm_providers import is_error_response
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token estimate (about 4 characters per token)"""
+    return len(text) // 4 + 1
+
+
+class ConversationContext:
+    """Token-budgeted view of a roleplay conversation
+
+    The persona prefix (system prompt, opening cue and the customer's opening
+    line) and the last `keep_exchanges` exchanges are sent verbatim. Older
+    exchanges are folded one at a time into a running digest, so each summary
+    call only covers the newest folded exchange. Kept exchanges are re-sent
+    exactly as they were sent (instruction template included), so until the
+    next fold the payload up to the previous turn matches the last request
+    byte for byte: its cache breakpoint is reused and OpenAI turns can chain
+    on the stored response. A fold whose summary call fails keeps the old
+    digest and retries the exchange with the next fold.
+    """
+
+    def __init__(
+        self,
+        summarize: Callable[[str, str], str],
+        token_budget: int = 4000,
+        keep_exchanges: int = 4,
+        executor: Executor = None,
+    ):
+        """
+        Args:
+            summarize: Callable taking (current digest, exchange text) and
+                      returning the updated digest
+            token_budget: Estimated token ceiling for each request payload
+            keep_exchanges: Number of most recent exchanges kept verbatim
+            executor: Where folds run (e.g. a server's shared background
+                     pool); None for a private single-worker executor
+        """
+        self.summarize = summarize
+        self.token_budget = token_budget
+        self.keep_exchanges = keep_exchanges
+
+        self.prefix: List[Dict[str, str]] = []
+        self.exchanges: List[Tuple[str, str, Dict[str, str]]] = []
+        self.digest = ""
+        self.unfolded: List[str] = []  # Exchanges whose summary call failed
+
+        # Each fold waits for the previous one, so folds apply to the digest
+        # strictly in order even on a shared executor
+        self._owns_executor = executor is None
+        self._executor = executor or ThreadPoolExecutor(max_workers=1)
+        self._pending_fold = None
+
+    def start(self, prefix_messages: List[Dict[str, str]]):
+        """Reset the context around a new persona prefix"""
+        self.wait_for_digest()
+        self.prefix = list(prefix_messages)
+        self.exchanges = []
+        self.digest = ""
+        self.unfolded = []
+
+    def add_exchange(
+        self, representative_text: str, customer_reply: str, turn: Dict[str, str]
+    ):
+        """Record a completed exchange and fold anything past the window
+
+        Folding runs in the background while the trainee reads the reply.
+
+        Args:
+            representative_text: What the representative actually said
+            customer_reply: The customer's full reply
+            turn: The instruction-wrapped message that was sent for this turn
+        """
+        self.exchanges.append((representative_text, customer_reply, turn))
+        while len(self.exchanges) > self.keep_exchanges:
+            self._fold_oldest()
+
+    def build_messages(self, new_turn: Dict[str, str]) -> List[Dict[str, str]]:
+        """Build the request payload for a new representative turn
+
+        Args:
+            new_turn: The full (instruction-wrapped) message for this turn
+
+        Returns:
+            Message list within the token budget where possible
+        """
+        messages = self._assemble(new_turn)
+        while self.exchanges and self._estimate(messages) > self.token_budget:
+            self._fold_oldest()
+            messages = self._assemble(new_turn)
+        return messages
+
+    def wait_for_digest(self) -> str:
+        """Block until pending folds have been applied and return the digest"""
+        if self._pending_fold is not None:
+            self._pending_fold.result()
+            self._pending_fold = None
+        return self.digest
+
+    def _fold_oldest(self):
+        """Queue the oldest verbatim exchange to be folded into the digest"""
+        representative_text, customer_reply, _ = self.exchanges.pop(0)
+        exchange = self.format_exchange(representative_text, customer_reply)
+        self._pending_fold = self._executor.submit(
+            self._fold, exchange, self._pending_fold
+        )
+
+    def _fold(self, exchange_text: str, previous_fold=None):
+        if previous_fold is not None:
+            wait((previous_fold,))
+        exchanges = self.unfolded + [exchange_text]
+        digest = self.summarize(self.digest, "\n".join(exchanges)).strip()
+        if not digest or is_error_response(digest):
+            self.unfolded = exchanges
+            return
+        self.digest = digest
+        self.unfolded = []
+
+    def _assemble(self, new_turn: Dict[str, str]) -> List[Dict[str, str]]:
+        digest = self.wait_for_digest()
+        system = [msg for msg in self.prefix if msg["role"] == "system"]
+        opening = [msg for msg in self.prefix if msg["role"] != "system"]
+
+        messages = list(system)
+        if digest:
+            # After the cached persona so the persona prefix stays byte-identical
+            messages.append(
+                {"role": "system", "content": f"SUMMARY OF THE CALL SO FAR:\n{digest}"}
+            )
+        messages.extend(opening)
+        for _, customer_reply, turn in self.exchanges:
+            messages.append(turn)
+            messages.append({"role": "assistant", "content": customer_reply})
+        messages.append(new_turn)
+        return messages
+
+    def to_state(self) -> Dict:
+        """JSON-serializable snapshot, after pending folds have been applied"""
+        self.wait_for_digest()
+        return {
+            "prefix": self.prefix,
+            "exchanges": [list(exchange) for exchange in self.exchanges],
+            "digest": self.digest,
+            "unfolded": self.unfolded,
+        }
+
+    def load_state(self, state: Dict):
+        """Restore a snapshot taken with to_state"""
+        self.wait_for_digest()
+        self.prefix = state["prefix"]
+        self.exchanges = [tuple(exchange) for exchange in state["exchanges"]]
+        self.digest = state["digest"]
+        self.unfolded = state.get("unfolded", [])
+
+    def close(self):
+        """Finish pending folds and stop a private summary worker"""
+        if self._owns_executor:
+            self._executor.shutdown(wait=True)
+        elif self._pending_fold is not None:
+            wait((self._pending_fold,))
+
+    @staticmethod
+    def format_exchange(representative_text: str, customer_reply: str) -> str:
+        """Format one exchange as plain transcript text"""
+        return f"Representative: {representative_text}\nCustomer: {customer_reply}"
+
+    @staticmethod
+    def _estimate(messages: List[Dict[str, str]]) -> int:
+        return sum(estimate_tokens(msg["content"]) for msg in messages)
@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+"""
+Session Event Log
+Append-only SQLite (WAL) log of turns, coaching hints, feedback and provider
+call timings, written by a background thread so turns never wait on disk
+"""
+
+import json
+import os
+import queue
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List
+
+DEFAULT_EVENT_LOG_PATH = os.path.join(
+    os.path.expanduser("~"), ".cache", "ai-roleplay-trainer", "events.sqlite3"
+)
+
+# Event kinds
+SESSION_START = "session_start"
+TURN = "turn"
+COACHING_HINT = "coaching_hint"
+FEEDBACK = "feedback"
+LLM_CALL = "llm_call"
+
+_CLOSE = object()
+
+
+class EventLog:
+    """Durable event log with batched commits
+
+    record() only puts the event on a queue. A writer thread drains the
+    queue, inserting everything waiting in one transaction per commit_interval
+    (or max_batch events), so a burst of events costs one fsync.
+
+    Args:
+        path: SQLite database file (":memory:" for tests)
+        commit_interval: Longest seconds an event waits before being committed
+        max_batch: Events per transaction at most
+    """
+
+    def __init__(
+        self,
+        path: str = DEFAULT_EVENT_LOG_PATH,
+        commit_interval: float = 0.5,
+        max_batch: int = 500,
+    ):
+        self.path = path
+        self.commit_interval = commit_interval
+        self.max_batch = max_batch
+        self.stats = {"events": 0, "commits": 0, "errors": 0}
+        self._queue = queue.SimpleQueue()
+        self._written = threading.Condition()
+        self._written_count = 0
+        self._queued_count = 0
+        self._count_lock = threading.Lock()
+
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db_lock = threading.Lock()
+        self._db.executescript(
+            """
+            PRAGMA journal_mode=WAL;
+            PRAGMA synchronous=NORMAL;
+            CREATE TABLE IF NOT EXISTS events (
+                id INTEGER PRIMARY KEY,
+                session_id TEXT NOT NULL,
+                scenario_id TEXT,
+                trainee TEXT,
+                kind TEXT NOT NULL,
+                timestamp REAL NOT NULL,
+                data TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS events_session ON events (session_id, id);
+            CREATE INDEX IF NOT EXISTS events_scenario ON events (scenario_id, timestamp);
+            CREATE INDEX IF NOT EXISTS events_trainee ON events (trainee, timestamp);
+            """
+        )
+        self._thread = threading.Thread(target=self._write_loop, daemon=True)
+        self._thread.start()
+
+    def record(
+        self,
+        session_id: str,
+        kind: str,
+        scenario_id: str = None,
+        trainee: str = None,
+        **data: Any,
+    ):
+        """Queue one event; never blocks on the database"""
+        with self._count_lock:
+            self._queued_count += 1
+        self._queue.put(
+            (session_id, scenario_id, trainee, kind, time.time(), json.dumps(data))
+        )
+
+    def flush(self, timeout: float = None) -> bool:
+        """Wait until every event recorded so far is committed"""
+        with self._count_lock:
+            target = self._queued_count
+        with self._written:
+            return self._written.wait_for(
+                lambda: self._written_count >= target, timeout
+            )
+
+    def close(self):
+        """Commit what is queued and stop the writer"""
+        if self._thread.is_alive():
+            self._queue.put(_CLOSE)
+            self._thread.join()
+        with self._db_lock:
+            self._db.close()
+
+    def _write_loop(self):
+        closing = False
+        while not closing:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.commit_interval
+            while len(batch) < self.max_batch:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=timeout))
+                except queue.Empty:
+                    break
+            if _CLOSE in batch:
+                batch.remove(_CLOSE)
+                closing = True
+            self._write(batch)
+
+    def _write(self, rows: List[tuple]):
+        if rows:
+            try:
+                with self._db_lock, self._db:
+                    self._db.executemany(
+                        "INSERT INTO events (session_id, scenario_id, trainee, kind, "
+                        "timestamp, data) VALUES (?, ?, ?, ?, ?, ?)",
+                        rows,
+                    )
+                self.stats["events"] += len(rows)
+                self.stats["commits"] += 1
+            except sqlite3.Error:
+                # Losing log lines must never take down a training session
+                self.stats["errors"] += 1
+        with self._written:
+            self._written_count += len(rows)
+            self._written.notify_all()
+
+    def session_events(self, session_id: str) -> List[Dict[str, Any]]:
+        """Committed events of one session, in order"""
+        return self._select("WHERE session_id = ? ORDER BY id", (session_id,))
+
+    def sessions(self, scenario_id: str = None, trainee: str = None) -> List[Dict]:
+        """Session start events, newest first, optionally filtered"""
+        clauses, params = ["kind = ?"], [SESSION_START]
+        if scenario_id is not None:
+            clauses.append("scenario_id = ?")
+            params.append(scenario_id)
+        if trainee is not None:
+            clauses.append("trainee = ?")
+            params.append(trainee)
+        return self._select(
+            f"WHERE {' AND '.join(clauses)} ORDER BY timestamp DESC", params
+        )
+
+    def _select(self, where: str, params) -> List[Dict[str, Any]]:
+        with self._db_lock:
+            rows = self._db.execute(
+                "SELECT session_id, scenario_id, trainee, kind, timestamp, data "
+                f"FROM events {where}",
+                params,
+            ).fetchall()
+        return [
+            {
+                "session_id": session_id,
+                "scenario_id": scenario_id,
+                "trainee": trainee,
+                "kind": kind,
+                "timestamp": timestamp,
+                **json.loads(data),
+            }
+            for session_id, scenario_id, trainee, kind, timestamp, data in rows
+        ]
@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+"""
+Feedback Prompts
+The end-of-session feedback prompt and transcript formatting shared by the
+trainer, batch grading and the server
+"""
+
+from scenario_catalog import catalog
+from transcript import Transcript
+
+
+def build_feedback_prompt(conversation_text):
+    """Build the end-of-session feedback prompt for a formatted conversation"""
+    return f"""
+            Analyze this customer service conversation and provide constructive feedback:
+
+            CONVERSATION:
+            {conversation_text}
+
+            Please provide feedback on the customer service representative's performance:
+
+            1. STRENGTHS: What did they do well?
+            2. AREAS FOR IMPROVEMENT: What could they have done better?
+            3. SPECIFIC SUGGESTIONS: Concrete advice for handling similar situations
+            4. OVERALL RATING: Rate their performance from 1-5 with brief explanation
+
+            Focus on:
+            - Empathy and active listening
+            - Problem-solving approach
+            - Communication clarity
+            - De-escalation techniques
+            - Professional tone
+
+            Keep feedback constructive and specific.
+        """
+
+
+def format_conversation_for_review(conversation_history, scenario_id=None):
+    """Format a stored trainer message list for feedback analysis
+
+    Live sessions render their Transcript directly; this rebuilds one from
+    the messages, unwrapping representative turns with the scenario template.
+    """
+    return Transcript.from_messages(
+        conversation_history, catalog.get(scenario_id)
+    ).render()
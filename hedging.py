@@ -0,0 +1,251 @@
+#!/usr/bin/env python3
+"""
+Hedged Requests
+Composite provider that hedges slow calls onto a secondary provider and
+shifts traffic away from degraded backends
+"""
+
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, Dict, Iterator, List
+
+from llm_providers import LLMProvider, base_provider, is_error_response
+
+
+class LatencyTracker:
+    """Rolling window of latencies and failures for one backend"""
+
+    def __init__(self, window: int = 50, min_samples: int = 5):
+        self.min_samples = min_samples
+        self.latencies = deque(maxlen=window)
+        self.outcomes = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, seconds: float, ok: bool):
+        with self._lock:
+            if ok:
+                self.latencies.append(seconds)
+            self.outcomes.append(ok)
+
+    def percentile(self, fraction: float):
+        """Latency percentile over the window, or None with too few samples"""
+        with self._lock:
+            if len(self.latencies) < self.min_samples:
+                return None
+            ordered = sorted(self.latencies)
+        return ordered[min(int(fraction * len(ordered)), len(ordered) - 1)]
+
+    @property
+    def error_rate(self) -> float:
+        with self._lock:
+            if not self.outcomes:
+                return 0.0
+            return self.outcomes.count(False) / len(self.outcomes)
+
+
+class HedgedProvider(LLMProvider):
+    """Provider that races a secondary when the primary is slow
+
+    The healthiest provider (by rolling p95 latency, penalized by error rate)
+    is tried first. If it hasn't answered - or, when streaming, hasn't sent
+    its first chunk - within its adaptive threshold (the rolling p95, clamped
+    to min_hedge_delay), the next provider is started as well and the first
+    success wins. A failed primary fails over immediately. A losing call
+    that has already been sent runs to completion and its result is
+    discarded, so it still costs tokens and rate-limit quota; a losing
+    stream is closed once it starts, which ends its generation early.
+
+    Args:
+        providers: Providers in preferred order (the order breaks ties)
+        hedge_percentile: Latency percentile used as the hedge threshold
+        default_hedge_delay: Threshold in seconds until enough samples exist
+        min_hedge_delay: Lower bound on the threshold, so fast backends
+                        aren't hedged on every call
+    """
+
+    def __init__(
+        self,
+        providers: List[LLMProvider],
+        hedge_percentile: float = 0.95,
+        default_hedge_delay: float = 3.0,
+        min_hedge_delay: float = 0.5,
+        window: int = 50,
+    ):
+        self.providers = providers
+        self.model = "+".join(getattr(p, "model", "") for p in providers)
+        self.hedge_percentile = hedge_percentile
+        self.default_hedge_delay = default_hedge_delay
+        self.min_hedge_delay = min_hedge_delay
+        # Full-response latency for make_call, time to first chunk for streams
+        self.health = {
+            kind: [LatencyTracker(window) for _ in providers]
+            for kind in ("call", "first_chunk")
+        }
+        self._executor = ThreadPoolExecutor(max_workers=8 * len(providers))
+
+    @property
+    def cache_stats(self) -> Dict[str, int]:
+        totals = {"hit_tokens": 0, "miss_tokens": 0}
+        for provider in self.providers:
+            for name, value in provider.cache_stats.items():
+                totals[name] = totals.get(name, 0) + value
+        return totals
+
+    def ranked(self, kind: str = "call") -> List[int]:
+        """Provider indexes, healthiest first"""
+
+        def score(index):
+            tracker = self.health[kind][index]
+            latency = tracker.percentile(self.hedge_percentile)
+            if latency is None:
+                latency = self.default_hedge_delay
+            return latency * (1 + 4 * tracker.error_rate)
+
+        return sorted(range(len(self.providers)), key=score)
+
+    def hedge_delay(self, index: int, kind: str = "call") -> float:
+        latency = self.health[kind][index].percentile(self.hedge_percentile)
+        if latency is None:
+            return self.default_hedge_delay
+        return max(latency, self.min_hedge_delay)
+
+    def make_call(
+        self,
+        messages: List[Dict[str, str]],
+        max_tokens: int = 1000,
+        call_site: str = None,
+        model: str = None,
+    ) -> str:
+        """Call the healthiest provider, hedging onto the next one if slow"""
+        order = self.ranked("call")
+        futures = {}
+
+        def launch(index):
+            future = self._executor.submit(
+                self._timed_call, index, messages, max_tokens, call_site, model
+            )
+            futures[future] = index
+
+        launch(order[0])
+        remaining = order[1:]
+        timeout = self.hedge_delay(order[0])
+        response = None
+
+        while futures:
+            done, _ = wait(futures, timeout=timeout, return_when=FIRST_COMPLETED)
+            if not done:
+                # Primary is past its threshold: hedge
+                if remaining:
+                    launch(remaining.pop(0))
+                timeout = None
+                continue
+
+            for future in done:
+                futures.pop(future)
+                response = future.result()
+                if not is_error_response(response):
+                    for loser in futures:
+                        # Only stops a hedge not yet sent; a running call
+                        # finishes and its result is discarded
+                        loser.cancel()
+                    return response
+
+            # Everything in flight failed: fail over to the next provider
+            if not futures and remaining:
+                index = remaining.pop(0)
+                launch(index)
+                timeout = self.hedge_delay(index)
+
+        return response
+
+    def _timed_call(self, index, messages, max_tokens, call_site, model):
+        started = time.perf_counter()
+        try:
+            response = self.providers[index].make_call(
+                messages, max_tokens, call_site, model
+            )
+        except Exception as e:
+            response = f"Error making hedged API call: {str(e)}"
+        self.health["call"][index].record(
+            time.perf_counter() - started, not is_error_response(response)
+        )
+        return response
+
+    def stream_call(
+        self,
+        messages: List[Dict[str, str]],
+        max_tokens: int = 1000,
+        call_site: str = None,
+        model: str = None,
+    ) -> Iterator[str]:
+        """Stream from whichever provider sends a good first chunk first"""
+        order = self.ranked("first_chunk")
+        streams = {}
+
+        def launch(index):
+            stream = self.providers[index].stream_call(
+                messages, max_tokens, call_site, model
+            )
+            future = self._executor.submit(self._first_chunk, index, stream)
+            streams[future] = (index, stream)
+
+        launch(order[0])
+        remaining = order[1:]
+        timeout = self.hedge_delay(order[0], "first_chunk")
+        failure = None
+
+        while streams:
+            done, _ = wait(streams, timeout=timeout, return_when=FIRST_COMPLETED)
+            if not done:
+                if remaining:
+                    launch(remaining.pop(0))
+                timeout = None
+                continue
+
+            for future in done:
+                index, stream = streams.pop(future)
+                first_chunk = future.result()
+                if first_chunk is None or is_error_response(first_chunk):
+                    failure = first_chunk
+                    continue
+
+                for loser in streams:
+                    # Close losing streams (and their connections) once they yield
+                    loser.add_done_callback(lambda _, s=streams[loser][1]: s.close())
+                yield first_chunk
+                yield from stream
+                return
+
+            if not streams and remaining:
+                index = remaining.pop(0)
+                launch(index)
+                timeout = self.hedge_delay(index, "first_chunk")
+
+        yield failure or "API Error: No provider returned content."
+
+    def _first_chunk(self, index, stream):
+        """Pull the first chunk of a stream, recording time to first chunk"""
+        started = time.perf_counter()
+        try:
+            chunk = next(stream, None)
+        except Exception as e:
+            chunk = f"Error making hedged API call: {str(e)}"
+        ok = chunk is not None and not is_error_response(chunk)
+        self.health["first_chunk"][index].record(time.perf_counter() - started, ok)
+        return chunk
+
+    def submit_batch(self, requests: List[Dict[str, Any]]) -> str:
+        """Submit a batch through the healthiest backend's own batch endpoint
+
+        Backends are unwrapped (rate limiting, caching) first. Batches aren't
+        latency-sensitive, so they are not hedged.
+        """
+        index = self.ranked("call")[0]
+        provider = base_provider(self.providers[index])
+        return f"{index}:{provider.submit_batch(requests)}"
+
+    def poll_batch(self, batch_id: str):
+        index, _, provider_batch_id = batch_id.partition(":")
+        return base_provider(self.providers[int(index)]).poll_batch(provider_batch_id)
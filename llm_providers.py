@@ -4,72 +4,1061 @@ LLM Provider Abstractions
 Provides a common interface for different LLM APIs (OpenAI, Anthropic, etc.)
 """
 
+import asyncio
+import hashlib
+import itertools
+import json
 import os
+import random
+import threading
+import time
 from abc import ABC, abstractmethod
-from typing import List, Dict, Any
+from collections import OrderedDict
+from typing import List, Dict, Any, Iterator
+
+import telemetry
+import tracing
+
+# Anthropic accepts at most four cache_control breakpoints per request
+MAX_CACHE_BREAKPOINTS = 4
+
+# Stored OpenAI responses remembered for previous_response_id chaining
+MAX_RESPONSE_CHAINS = 1024
+
+# Output tokens added to max_tokens for reasoning models (see OpenAIProvider)
+REASONING_TOKEN_ALLOWANCE = 1024
+
+DEFAULT_REPLAY_FIXTURE = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "fixtures", "replay_session.json"
+)
+
+
+def is_error_response(response: str) -> bool:
+    """Whether a provider response is one of the error strings providers return"""
+    return response.startswith(("Error making ", "API Error:"))
+
+
+def request_key(messages: List[Dict[str, Any]], max_tokens: int) -> str:
+    """Stable hash of a request's messages and max_tokens"""
+    payload = json.dumps([messages, max_tokens], sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def _conversation_key(messages: List[Dict[str, Any]]) -> str:
+    """Hash of the roles and contents of a message list (flags ignored)"""
+    payload = json.dumps(
+        [[msg["role"], msg["content"]] for msg in messages], ensure_ascii=False
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def _request_id(response) -> str:
+    """Request id the SDKs attach to responses, falling back to the object id"""
+    return getattr(response, "_request_id", None) or getattr(response, "id", None)
+
+
+def base_provider(provider):
+    """Unwrap providers that wrap another provider (e.g. CachingProvider)"""
+    while hasattr(provider, "provider"):
+        provider = provider.provider
+    return provider
+
+
+def anthropic_model_tiers(model: str) -> Dict[str, str]:
+    """Tier name -> Claude model; ANTHROPIC_FAST_MODEL overrides the fast one"""
+    return {
+        "fast": os.getenv("ANTHROPIC_FAST_MODEL", "claude-3-5-haiku-20241022"),
+        "standard": model,
+    }
+
+
+def openai_model_tiers(model: str) -> Dict[str, str]:
+    """Tier name -> OpenAI model; OPENAI_FAST_MODEL overrides the fast one"""
+    return {"fast": os.getenv("OPENAI_FAST_MODEL", "gpt-5-mini"), "standard": model}
 
 
 class LLMProvider(ABC):
-    """Abstract base class for LLM providers"""
+    """Abstract base class for LLM providers
+
+    Messages may include leading {"role": "system"} entries, which providers
+    send as their system prompt/instructions. Any message can also carry
+    "cache": True to mark the end of a stable prefix that should be cached.
+    """
+
+    # Model per tier name ("fast", "standard"); subclasses fill this in
+    model_tiers: Dict[str, str] = {}
+
+    def __init__(self):
+        self.cache_stats = {"hit_tokens": 0, "miss_tokens": 0}
+        self._batches: Dict[str, Dict[str, str]] = {}
+        self._batch_ids = itertools.count(1)
+
+    def model_for(self, model: str = None) -> str:
+        """Concrete model id for a tier name, a model id, or None (the default)"""
+        return self.model_tiers.get(model, model or getattr(self, "model", ""))
+
+    def record_cache_usage(self, hit_tokens: int, miss_tokens: int):
+        """Accumulate prompt-cache hit and miss input token counts"""
+        self.cache_stats["hit_tokens"] += hit_tokens
+        self.cache_stats["miss_tokens"] += miss_tokens
+
+    def emit_call_record(
+        self,
+        call_site: str,
+        started: float,
+        ttft: float = None,
+        usage: Dict[str, int] = None,
+        request_id: str = None,
+        error: str = None,
+        streamed: bool = False,
+        model: str = None,
+    ):
+        """Emit a telemetry.CallRecord for a finished API call
+
+        Args:
+            call_site: Trainer step that made the call
+            started: time.perf_counter() when the request was sent
+            ttft: Seconds to the first streamed chunk
+            usage: input_tokens / output_tokens / cached_tokens counts
+            request_id: Provider request id, if known
+            error: Error message if the call failed
+            streamed: Whether the call was streamed
+            model: Model the call went to (default self.model)
+        """
+        telemetry.emit(
+            telemetry.CallRecord(
+                provider=type(self).__name__.replace("Provider", "").lower(),
+                model=model or getattr(self, "model", ""),
+                call_site=call_site,
+                latency=time.perf_counter() - started,
+                ttft=ttft,
+                request_id=request_id,
+                error=error,
+                streamed=streamed,
+                **(usage or {}),
+            )
+        )
 
     @abstractmethod
-    def make_call(self, messages: List[Dict[str, str]], max_tokens: int = 1000) -> str:
+    def make_call(
+        self,
+        messages: List[Dict[str, str]],
+        max_tokens: int = 1000,
+        call_site: str = None,
+        model: str = None,
+    ) -> str:
         """Make a call to the LLM API
 
         Args:
             messages: List of message dicts with 'role' and 'content' keys
             max_tokens: Maximum tokens to generate
+            call_site: Which trainer step is calling (e.g. 'customer_reply').
+                      Providers that wrap others use it for per-site policies.
+            model: Tier name ("fast", "standard") or model id; None for the
+                  provider's default model
 
         Returns:
             Generated text response
         """
         pass
 
+    def stream_call(
+        self,
+        messages: List[Dict[str, str]],
+        max_tokens: int = 1000,
+        call_site: str = None,
+        model: str = None,
+    ) -> Iterator[str]:
+        """Stream a call to the LLM API, yielding text chunks as they arrive
+
+        Providers without native streaming fall back to yielding the full
+        response from make_call as a single chunk.
+
+        Args:
+            messages: List of message dicts with 'role' and 'content' keys
+            max_tokens: Maximum tokens to generate
+            call_site: Which trainer step is calling (see make_call)
+            model: Tier name or model id (see make_call)
+
+        Yields:
+            Generated text chunks, in order
+        """
+        yield self.make_call(messages, max_tokens, call_site, model)
+
+    def submit_batch(self, requests: List[Dict[str, Any]]) -> str:
+        """Submit requests to the provider's asynchronous batch endpoint
+
+        Providers without a batch endpoint fall back to making the calls
+        now, one by one, and hold the results for poll_batch.
+
+        Args:
+            requests: Dicts with "custom_id", "messages", "max_tokens",
+                     "call_site" and optional "model" keys; custom ids must be
+                     unique in a batch
+
+        Returns:
+            Batch id for poll_batch
+        """
+        batch_id = f"local-{next(self._batch_ids)}"
+        self._batches[batch_id] = {
+            request["custom_id"]: self.make_call(
+                request["messages"],
+                request["max_tokens"],
+                request["call_site"],
+                request.get("model"),
+            )
+            for request in requests
+        }
+        return batch_id
+
+    def poll_batch(self, batch_id: str):
+        """Results of a finished batch, or None while it is still processing
+
+        Returns:
+            Dict of custom id -> response text (or error string), or None
+        """
+        return self._batches.pop(batch_id, None)
+
 
 class AnthropicProvider(LLMProvider):
     """Anthropic Claude API provider"""
 
-    def __init__(self):
+    def __init__(self, client=None):
         import anthropic
 
-        self.client = anthropic.Anthropic()
+        super().__init__()
+        self.client = client or anthropic.Anthropic()
         self.model = "claude-sonnet-4-20250514"
+        self.model_tiers = anthropic_model_tiers(self.model)
+        # Batch id -> (submitted at, custom id -> call site)
+        self._batch_sites = {}
 
-    def make_call(self, messages: List[Dict[str, str]], max_tokens: int = 1000) -> str:
+    def make_call(
+        self,
+        messages: List[Dict[str, str]],
+        max_tokens: int = 1000,
+        call_site: str = None,
+        model: str = None,
+    ) -> str:
         """Make a call to Anthropic's API"""
+        started = time.perf_counter()
         try:
-            response = self.client.messages.create(
-                model=self.model,
-                max_tokens=max_tokens,
-                messages=messages,
-            )
+            request = self._build_request(messages, max_tokens, model)
+            with tracing.span("anthropic.messages.create", model=request["model"]):
+                response = self.client.messages.create(**request)
+            usage = self._record_usage(getattr(response, "usage", None))
+            request_id = _request_id(response)
             if response and hasattr(response, "content") and response.content:
+                self.emit_call_record(
+                    call_site,
+                    started,
+                    usage=usage,
+                    request_id=request_id,
+                    model=self.model_for(model),
+                )
                 return response.content[0].text
             else:
-                return "API Error: No content returned."
+                error = "API Error: No content returned."
+                self.emit_call_record(
+                    call_site,
+                    started,
+                    usage=usage,
+                    request_id=request_id,
+                    error=error,
+                    model=self.model_for(model),
+                )
+                return error
         except Exception as e:
+            self.emit_call_record(
+                call_site, started, error=str(e), model=self.model_for(model)
+            )
             return f"Error making Anthropic API call: {str(e)}"
 
+    def stream_call(
+        self,
+        messages: List[Dict[str, str]],
+        max_tokens: int = 1000,
+        call_site: str = None,
+        model: str = None,
+    ) -> Iterator[str]:
+        """Stream a call to Anthropic's API"""
+        started = time.perf_counter()
+        ttft = None
+        try:
+            request = self._build_request(messages, max_tokens, model)
+            with (
+                tracing.span("anthropic.messages.stream", model=request["model"]),
+                self.client.messages.stream(**request) as stream,
+            ):
+                for text in stream.text_stream:
+                    if ttft is None:
+                        ttft = time.perf_counter() - started
+                    yield text
+                final_message = stream.get_final_message()
+            usage = self._record_usage(final_message.usage)
+            self.emit_call_record(
+                call_site,
+                started,
+                ttft,
+                usage,
+                request_id=_request_id(final_message),
+                streamed=True,
+                model=self.model_for(model),
+            )
+        except Exception as e:
+            self.emit_call_record(
+                call_site,
+                started,
+                ttft,
+                error=str(e),
+                streamed=True,
+                model=self.model_for(model),
+            )
+            yield f"Error making Anthropic API call: {str(e)}"
+
+    def submit_batch(self, requests: List[Dict[str, Any]]) -> str:
+        """Submit requests to the Message Batches API (half price, async)"""
+        batch = self.client.messages.batches.create(
+            requests=[
+                {
+                    "custom_id": request["custom_id"],
+                    "params": self._build_request(
+                        request["messages"],
+                        request["max_tokens"],
+                        request.get("model"),
+                    ),
+                }
+                for request in requests
+            ]
+        )
+        self._batch_sites[batch.id] = (
+            time.perf_counter(),
+            {request["custom_id"]: request["call_site"] for request in requests},
+        )
+        return batch.id
+
+    def poll_batch(self, batch_id: str):
+        """Fetch the results of an ended message batch"""
+        batch = self.client.messages.batches.retrieve(batch_id)
+        if batch.processing_status != "ended":
+            return None
+
+        started, call_sites = self._batch_sites.pop(batch_id, (time.perf_counter(), {}))
+        results = {}
+        for entry in self.client.messages.batches.results(batch_id):
+            call_site = call_sites.get(entry.custom_id)
+            if entry.result.type == "succeeded" and entry.result.message.content:
+                message = entry.result.message
+                usage = self._record_usage(getattr(message, "usage", None))
+                self.emit_call_record(
+                    call_site, started, usage=usage, request_id=_request_id(message)
+                )
+                results[entry.custom_id] = message.content[0].text
+            else:
+                error = f"API Error: Batch request {entry.result.type}."
+                self.emit_call_record(call_site, started, error=error)
+                results[entry.custom_id] = error
+        return results
+
+    @tracing.traced("anthropic.build_request")
+    def _build_request(
+        self, messages: List[Dict[str, Any]], max_tokens: int, model: str = None
+    ) -> Dict[str, Any]:
+        """Build messages.create kwargs with a cached system prompt
+
+        System messages become system prompt blocks and "cache" flags become
+        cache_control breakpoints. Only the last breakpoints that fit within
+        the API limit are kept; a later breakpoint covers the whole prefix.
+        """
+        system_blocks = []
+        chat_messages = []
+        cached_positions = []
+        for msg in messages:
+            if msg["role"] == "system":
+                block = {"type": "text", "text": msg["content"]}
+                if msg.get("cache"):
+                    block["cache_control"] = {"type": "ephemeral"}
+                system_blocks.append(block)
+                continue
+            if msg.get("cache"):
+                cached_positions.append(len(chat_messages))
+            chat_messages.append({"role": msg["role"], "content": msg["content"]})
+
+        system_breakpoints = sum("cache_control" in b for b in system_blocks)
+        allowed = max(MAX_CACHE_BREAKPOINTS - system_breakpoints, 0)
+        for position in cached_positions[max(len(cached_positions) - allowed, 0) :]:
+            msg = chat_messages[position]
+            msg["content"] = [
+                {
+                    "type": "text",
+                    "text": msg["content"],
+                    "cache_control": {"type": "ephemeral"},
+                }
+            ]
+
+        request = {
+            "model": self.model_for(model),
+            "max_tokens": max_tokens,
+            "messages": chat_messages,
+        }
+        if system_blocks:
+            request["system"] = system_blocks
+        return request
+
+    def _record_usage(self, usage) -> Dict[str, int]:
+        """Record cache hits (reads) and misses (writes + uncached input)
+
+        Returns:
+            Token counts for the call record
+        """
+        if usage is None:
+            return {}
+        cache_read = getattr(usage, "cache_read_input_tokens", 0) or 0
+        cache_write = getattr(usage, "cache_creation_input_tokens", 0) or 0
+        self.record_cache_usage(cache_read, usage.input_tokens + cache_write)
+        return {
+            "input_tokens": usage.input_tokens + cache_read + cache_write,
+            "output_tokens": usage.output_tokens,
+            "cached_tokens": cache_read,
+        }
+
 
 class OpenAIProvider(LLMProvider):
     """OpenAI API provider using the correct API syntax"""
 
-    def __init__(self):
+    def __init__(self, client=None):
         from openai import OpenAI
 
-        self.client = OpenAI()
+        super().__init__()
+        self.client = client or OpenAI()
         self.model = "gpt-5"
+        self.model_tiers = openai_model_tiers(self.model)
+        # Batch id -> (submitted at, custom id -> call site)
+        self._batch_sites = {}
+        # Hash of a conversation up to an assistant reply -> id of the stored
+        # response that produced it, so the next turn only sends what's new
+        self._chains = OrderedDict()
+        self._chains_lock = threading.Lock()
+        self.chain_stats = {"chained": 0, "replayed": 0, "lost": 0}
 
-    def make_call(self, messages: List[Dict[str, str]], max_tokens: int = 1000) -> str:
+    def make_call(
+        self,
+        messages: List[Dict[str, str]],
+        max_tokens: int = 1000,
+        call_site: str = None,
+        model: str = None,
+    ) -> str:
         """Make a call to OpenAI's API using the responses endpoint"""
+        started = time.perf_counter()
         try:
-            # Convert conversation to a single input string for the responses API
-            # This is a simplified approach - in production you might want more sophisticated conversion
-            conversation_text = self._messages_to_text(messages)
+            response = self._create(messages, max_tokens, model)
+            usage = self._record_usage(getattr(response, "usage", None))
+            request_id = _request_id(response)
+
+            if hasattr(response, "output_text"):
+                self.emit_call_record(
+                    call_site,
+                    started,
+                    usage=usage,
+                    request_id=request_id,
+                    model=self.model_for(model),
+                )
+                self._remember(messages, response.output_text, response.id)
+                return response.output_text
+            else:
+                error = "API Error: No output_text in response."
+                self.emit_call_record(
+                    call_site,
+                    started,
+                    usage=usage,
+                    request_id=request_id,
+                    error=error,
+                    model=self.model_for(model),
+                )
+                return error
+
+        except Exception as e:
+            self.emit_call_record(
+                call_site, started, error=str(e), model=self.model_for(model)
+            )
+            return f"Error making OpenAI API call: {str(e)}"
+
+    def stream_call(
+        self,
+        messages: List[Dict[str, str]],
+        max_tokens: int = 1000,
+        call_site: str = None,
+        model: str = None,
+    ) -> Iterator[str]:
+        """Stream a call to OpenAI's responses endpoint"""
+        started = time.perf_counter()
+        ttft = None
+        chunks = []
+        try:
+            stream = self._create(messages, max_tokens, model, stream=True)
+
+            for event in stream:
+                if event.type == "response.output_text.delta":
+                    if ttft is None:
+                        ttft = time.perf_counter() - started
+                    chunks.append(event.delta)
+                    yield event.delta
+                elif event.type == "response.completed":
+                    self._remember(messages, "".join(chunks), event.response.id)
+                    usage = self._record_usage(event.response.usage)
+                    self.emit_call_record(
+                        call_site,
+                        started,
+                        ttft,
+                        usage,
+                        request_id=_request_id(event.response),
+                        streamed=True,
+                        model=self.model_for(model),
+                    )
+
+        except Exception as e:
+            self.emit_call_record(
+                call_site,
+                started,
+                ttft,
+                error=str(e),
+                streamed=True,
+                model=self.model_for(model),
+            )
+            yield f"Error making OpenAI API call: {str(e)}"
 
-            response = self.client.responses.create(
-                model=self.model, input=conversation_text
+    def submit_batch(self, requests: List[Dict[str, Any]]) -> str:
+        """Upload the requests as JSONL and start a /v1/responses batch"""
+        lines = []
+        for request in requests:
+            body = self._build_request(
+                request["messages"], request["max_tokens"], model=request.get("model")
+            )
+            lines.append(
+                json.dumps(
+                    {
+                        "custom_id": request["custom_id"],
+                        "method": "POST",
+                        "url": "/v1/responses",
+                        "body": body,
+                    },
+                    ensure_ascii=False,
+                )
             )
+        input_file = self.client.files.create(
+            file=("batch.jsonl", "\n".join(lines).encode("utf-8")), purpose="batch"
+        )
+        batch = self.client.batches.create(
+            input_file_id=input_file.id,
+            endpoint="/v1/responses",
+            completion_window="24h",
+        )
+        self._batch_sites[batch.id] = (
+            time.perf_counter(),
+            {request["custom_id"]: request["call_site"] for request in requests},
+        )
+        return batch.id
+
+    def poll_batch(self, batch_id: str):
+        """Fetch the results of a finished batch from its output files"""
+        batch = self.client.batches.retrieve(batch_id)
+        if batch.status not in ("completed", "failed", "expired", "cancelled"):
+            return None
+
+        started, call_sites = self._batch_sites.pop(batch_id, (time.perf_counter(), {}))
+        results = {}
+        for file_id in (batch.output_file_id, batch.error_file_id):
+            if not file_id:
+                continue
+            for line in self.client.files.content(file_id).text.splitlines():
+                if not line.strip():
+                    continue
+                entry = json.loads(line)
+                custom_id = entry["custom_id"]
+                body = (entry.get("response") or {}).get("body") or {}
+                text = "".join(
+                    part.get("text", "")
+                    for item in body.get("output", [])
+                    if item.get("type") == "message"
+                    for part in item.get("content", [])
+                    if part.get("type") == "output_text"
+                )
+                if text and not entry.get("error"):
+                    usage = body.get("usage") or {}
+                    cached = (usage.get("input_tokens_details") or {}).get(
+                        "cached_tokens", 0
+                    )
+                    self.record_cache_usage(
+                        cached, usage.get("input_tokens", 0) - cached
+                    )
+                    self.emit_call_record(
+                        call_sites.get(custom_id),
+                        started,
+                        usage={
+                            "input_tokens": usage.get("input_tokens", 0),
+                            "output_tokens": usage.get("output_tokens", 0),
+                            "cached_tokens": cached,
+                        },
+                        request_id=body.get("id"),
+                    )
+                    results[custom_id] = text
+                else:
+                    error = entry.get("error") or body.get("error") or "no output"
+                    results[custom_id] = f"API Error: Batch request failed: {error}"
+                    self.emit_call_record(
+                        call_sites.get(custom_id), started, error=results[custom_id]
+                    )
+        for custom_id in call_sites.keys() - results.keys():
+            results[custom_id] = f"API Error: Batch {batch.status} without a result."
+        return results
+
+    def _create(
+        self,
+        messages: List[Dict[str, str]],
+        max_tokens: int,
+        model: str = None,
+        **options,
+    ):
+        """responses.create, continuing a stored response when one matches
+
+        If the messages extend a conversation this provider already sent (up
+        to the last assistant reply), only the messages after that reply go
+        out, with previous_response_id. A chain the API no longer knows
+        (expired or deleted) is dropped and the call is replayed in full.
+        """
+        previous_response_id, position = self._continuation(messages)
+        if previous_response_id is not None:
+            try:
+                request = self._build_request(messages, max_tokens, position, model)
+                with tracing.span(
+                    "openai.responses.create", model=request["model"], chained=True
+                ):
+                    response = self.client.responses.create(
+                        **request,
+                        previous_response_id=previous_response_id,
+                        **options,
+                    )
+                self.chain_stats["chained"] += 1
+                return response
+            except Exception as e:
+                # An unknown previous response id is a 400/404; anything else
+                # (rate limits, network) is not worth a second full request
+                if getattr(e, "status_code", None) not in (400, 404):
+                    raise
+                self._forget(previous_response_id)
+                self.chain_stats["lost"] += 1
+        self.chain_stats["replayed"] += 1
+        request = self._build_request(messages, max_tokens, model=model)
+        with tracing.span("openai.responses.create", model=request["model"]):
+            return self.client.responses.create(**request, **options)
+
+    @tracing.traced("openai.build_request")
+    def _build_request(
+        self,
+        messages: List[Dict[str, str]],
+        max_tokens: int,
+        start: int = 0,
+        model: str = None,
+    ) -> Dict[str, Any]:
+        """responses.create kwargs sending messages[start:] as input items
+
+        System messages are always sent, as instructions: they are not
+        carried over by previous_response_id, and keeping them byte-identical
+        lets OpenAI's automatic prefix caching apply.
+        """
+        model = self.model_for(model)
+        return {
+            "model": model,
+            "input": [
+                {"role": msg["role"], "content": msg["content"]}
+                for msg in messages[start:]
+                if msg["role"] != "system"
+            ],
+            "max_output_tokens": max_tokens + self._reasoning_allowance(model),
+            **self._instructions(messages),
+        }
+
+    def _reasoning_allowance(self, model: str) -> int:
+        """Extra output tokens for models whose reasoning counts as output
+
+        max_tokens is meant for visible text; without headroom a short limit
+        can be spent entirely on reasoning.
+        """
+        if model.startswith(("gpt-5", "o")):
+            return REASONING_TOKEN_ALLOWANCE
+        return 0
+
+    def _continuation(self, messages: List[Dict[str, str]]):
+        """(previous_response_id, index of the first new message), or (None, 0)"""
+        for position in range(len(messages) - 1, -1, -1):
+            if messages[position]["role"] == "assistant":
+                key = _conversation_key(messages[: position + 1])
+                with self._chains_lock:
+                    response_id = self._chains.get(key)
+                    if response_id is not None:
+                        self._chains.move_to_end(key)
+                        return response_id, position + 1
+                break
+        return None, 0
+
+    def _remember(self, messages: List[Dict[str, str]], reply: str, response_id):
+        """Record that response_id holds messages plus this reply"""
+        if not reply or not response_id or is_error_response(reply):
+            return
+        key = _conversation_key(messages + [{"role": "assistant", "content": reply}])
+        with self._chains_lock:
+            self._chains[key] = response_id
+            self._chains.move_to_end(key)
+            while len(self._chains) > MAX_RESPONSE_CHAINS:
+                self._chains.popitem(last=False)
+
+    def _forget(self, response_id: str):
+        with self._chains_lock:
+            for key in [k for k, v in self._chains.items() if v == response_id]:
+                del self._chains[key]
+
+    def _instructions(self, messages: List[Dict[str, str]]) -> Dict[str, str]:
+        """Join system messages into the responses API instructions parameter"""
+        system_parts = [msg["content"] for msg in messages if msg["role"] == "system"]
+        return {"instructions": "\n\n".join(system_parts)} if system_parts else {}
+
+    def _record_usage(self, usage) -> Dict[str, int]:
+        """Record cached input tokens reported by OpenAI's prefix cache
+
+        Returns:
+            Token counts for the call record
+        """
+        if usage is None:
+            return {}
+        details = getattr(usage, "input_tokens_details", None)
+        cached = getattr(details, "cached_tokens", 0) or 0
+        self.record_cache_usage(cached, usage.input_tokens - cached)
+        return {
+            "input_tokens": usage.input_tokens,
+            "output_tokens": usage.output_tokens,
+            "cached_tokens": cached,
+        }
+
+
+class ReplayProvider(LLMProvider):
+    """Offline provider that serves recorded responses from a fixture file
+
+    A fixture is a JSON object with a "recordings" list. Each recording has a
+    "response" and may have "key" (request_key of the recorded request),
+    "call_site", "ttft" (seconds to first token) and "duration" (seconds to
+    the full response). Requests are matched by key first, then by call site
+    in recorded order (cycling), then by recorded order overall.
+
+    Batches are a local stand-in for the providers' batch endpoints: they
+    report as processing until batch_delay seconds after submission.
+
+    Args:
+        fixture_path: Path to the fixture JSON file
+        latency: None for no delay, a number of seconds for a fixed delay
+                before each response, or "recorded" to sample time-to-first
+                -token and throughput from the recordings
+        batch_delay: Seconds a submitted batch takes to finish
+    """
+
+    def __init__(self, fixture_path: str, latency=None, batch_delay: float = 0.0):
+        super().__init__()
+        with open(fixture_path, encoding="utf-8") as f:
+            self.recordings = json.load(f)["recordings"]
+        self.model = "replay"
+        self.latency = latency
+        self.batch_delay = batch_delay
+        self.request_sizes = []  # (call_site, payload bytes) per request
+        self.batch_sizes = []  # requests per submitted batch
+        self._pending_batches = {}  # batch id -> (ready at, requests)
+
+        self._by_key = {r["key"]: r for r in self.recordings if r.get("key")}
+        self._by_site = {}
+        for recording in self.recordings:
+            self._by_site.setdefault(recording.get("call_site"), []).append(recording)
+        self._positions = {}
+
+        # Samples for the "recorded" latency model
+        self._ttfts = [r["ttft"] for r in self.recordings if "ttft" in r]
+        self._throughputs = [
+            len(r["response"]) / (r["duration"] - r.get("ttft", 0))
+            for r in self.recordings
+            if r.get("duration", 0) > r.get("ttft", 0)
+        ]
+
+    def make_call(
+        self,
+        messages: List[Dict[str, str]],
+        max_tokens: int = 1000,
+        call_site: str = None,
+        model: str = None,
+    ) -> str:
+        """Serve the matching recorded response"""
+        return "".join(self.stream_call(messages, max_tokens, call_site, model))
+
+    def stream_call(
+        self,
+        messages: List[Dict[str, str]],
+        max_tokens: int = 1000,
+        call_site: str = None,
+        model: str = None,
+    ) -> Iterator[str]:
+        """Stream the matching recorded response word by word"""
+        started = time.perf_counter()
+        recording = self._match(messages, max_tokens, call_site)
+        response = recording["response"]
+        ttft, chars_per_second = self._latency_for(recording)
+
+        time.sleep(ttft)
+        for position, word in enumerate(response.split(" ")):
+            chunk = word if position == 0 else " " + word
+            if chars_per_second:
+                time.sleep(len(chunk) / chars_per_second)
+            yield chunk
+
+        # Token counts are estimates (about 4 characters per token)
+        self.emit_call_record(
+            call_site,
+            started,
+            ttft,
+            {
+                "input_tokens": self.request_sizes[-1][1] // 4,
+                "output_tokens": len(response) // 4,
+            },
+            streamed=True,
+        )
+
+    def submit_batch(self, requests: List[Dict[str, Any]]) -> str:
+        """Queue a batch that finishes batch_delay seconds from now"""
+        batch_id = f"replay-batch-{len(self.batch_sizes) + 1}"
+        self.batch_sizes.append(len(requests))
+        self._pending_batches[batch_id] = (
+            time.monotonic() + self.batch_delay,
+            list(requests),
+        )
+        return batch_id
+
+    def poll_batch(self, batch_id: str):
+        """Serve the batch's recorded responses once its delay has passed"""
+        ready_at, requests = self._pending_batches[batch_id]
+        if time.monotonic() < ready_at:
+            return None
+        del self._pending_batches[batch_id]
+        results = {}
+        for request in requests:
+            started = time.perf_counter()
+            recording = self._match(
+                request["messages"], request["max_tokens"], request["call_site"]
+            )
+            self.emit_call_record(
+                request["call_site"],
+                started,
+                usage={
+                    "input_tokens": self.request_sizes[-1][1] // 4,
+                    "output_tokens": len(recording["response"]) // 4,
+                },
+            )
+            results[request["custom_id"]] = recording["response"]
+        return results
+
+    def _match(self, messages, max_tokens, call_site):
+        key = request_key(messages, max_tokens)
+        self.request_sizes.append(
+            (call_site, len(json.dumps(messages, ensure_ascii=False).encode("utf-8")))
+        )
+        if key in self._by_key:
+            return self._by_key[key]
+
+        site = call_site if call_site in self._by_site else None
+        candidates = self._by_site.get(site) or self.recordings
+        position = self._positions.get(site, 0)
+        self._positions[site] = position + 1
+        return candidates[position % len(candidates)]
+
+    def _latency_for(self, recording):
+        """(seconds to first token, characters per second or None)"""
+        if self.latency is None:
+            return 0, None
+        if self.latency != "recorded":
+            return float(self.latency), None
+        ttft = recording.get("ttft") or (
+            random.choice(self._ttfts) if self._ttfts else 0
+        )
+        throughput = random.choice(self._throughputs) if self._throughputs else None
+        return ttft, throughput
+
+
+class RecordingProvider(LLMProvider):
+    """Provider wrapper that records calls into a ReplayProvider fixture"""
+
+    def __init__(self, provider: LLMProvider):
+        super().__init__()
+        self.provider = provider
+        self.model = getattr(provider, "model", "")
+        self.cache_stats = provider.cache_stats
+        self.recordings = []
+
+    def make_call(
+        self,
+        messages: List[Dict[str, str]],
+        max_tokens: int = 1000,
+        call_site: str = None,
+        model: str = None,
+    ) -> str:
+        """Make the call and record the response and its duration"""
+        started = time.perf_counter()
+        response = self.provider.make_call(messages, max_tokens, call_site, model)
+        duration = time.perf_counter() - started
+        self._record(messages, max_tokens, call_site, response, duration, duration)
+        return response
+
+    def stream_call(
+        self,
+        messages: List[Dict[str, str]],
+        max_tokens: int = 1000,
+        call_site: str = None,
+        model: str = None,
+    ) -> Iterator[str]:
+        """Stream the call and record time-to-first-token and duration"""
+        started = time.perf_counter()
+        ttft = None
+        chunks = []
+        for chunk in self.provider.stream_call(messages, max_tokens, call_site, model):
+            if ttft is None:
+                ttft = time.perf_counter() - started
+            chunks.append(chunk)
+            yield chunk
+        duration = time.perf_counter() - started
+        self._record(
+            messages, max_tokens, call_site, "".join(chunks), ttft or duration, duration
+        )
+
+    def _record(self, messages, max_tokens, call_site, response, ttft, duration):
+        self.recordings.append(
+            {
+                "key": request_key(messages, max_tokens),
+                "call_site": call_site,
+                "response": response,
+                "ttft": round(ttft, 4),
+                "duration": round(duration, 4),
+            }
+        )
+
+    def save(self, fixture_path: str):
+        """Write the recordings as a ReplayProvider fixture"""
+        with open(fixture_path, "w", encoding="utf-8") as f:
+            json.dump({"recordings": self.recordings}, f, indent=2, ensure_ascii=False)
+
+
+class AsyncLLMProvider(ABC):
+    """Abstract base class for asynchronous LLM providers
+
+    Built on the SDKs' async clients so a single event loop can keep many
+    calls in flight without a thread per call.
+    """
+
+    def __init__(self, max_concurrency: int = 10):
+        self.max_concurrency = max_concurrency
+        self.cache_stats = {"hit_tokens": 0, "miss_tokens": 0}
+
+    model_tiers: Dict[str, str] = {}
+
+    record_cache_usage = LLMProvider.record_cache_usage
+    model_for = LLMProvider.model_for
+
+    @abstractmethod
+    async def make_call(
+        self, messages: List[Dict[str, str]], max_tokens: int = 1000
+    ) -> str:
+        """Make an awaitable call to the LLM API
+
+        Args:
+            messages: List of message dicts with 'role' and 'content' keys
+            max_tokens: Maximum tokens to generate
+
+        Returns:
+            Generated text response
+        """
+        pass
+
+    async def make_calls(
+        self,
+        message_sets: List[List[Dict[str, str]]],
+        max_tokens: int = 1000,
+        max_concurrency: int = None,
+    ) -> List[str]:
+        """Run several calls concurrently with a bounded number in flight
+
+        Args:
+            message_sets: One message list per call
+            max_tokens: Maximum tokens to generate per call
+            max_concurrency: Maximum simultaneous calls. Defaults to the
+                            provider's max_concurrency
+
+        Returns:
+            Generated text responses, in the same order as message_sets
+        """
+        semaphore = asyncio.Semaphore(max_concurrency or self.max_concurrency)
+
+        async def bounded_call(messages):
+            async with semaphore:
+                return await self.make_call(messages, max_tokens)
+
+        return await asyncio.gather(
+            *(bounded_call(messages) for messages in message_sets)
+        )
+
+
+class AsyncAnthropicProvider(AsyncLLMProvider):
+    """Anthropic Claude API provider on the async client"""
+
+    def __init__(self, max_concurrency: int = 10):
+        import anthropic
+
+        super().__init__(max_concurrency)
+        self.client = anthropic.AsyncAnthropic()
+        self.model = "claude-sonnet-4-20250514"
+        self.model_tiers = anthropic_model_tiers(self.model)
+
+    async def make_call(
+        self, messages: List[Dict[str, str]], max_tokens: int = 1000
+    ) -> str:
+        """Make an awaitable call to Anthropic's API"""
+        try:
+            response = await self.client.messages.create(
+                **self._build_request(messages, max_tokens)
+            )
+            self._record_usage(getattr(response, "usage", None))
+            if response and hasattr(response, "content") and response.content:
+                return response.content[0].text
+            else:
+                return "API Error: No content returned."
+        except Exception as e:
+            return f"Error making Anthropic API call: {str(e)}"
+
+    _build_request = AnthropicProvider._build_request
+    _record_usage = AnthropicProvider._record_usage
+
+
+class AsyncOpenAIProvider(AsyncLLMProvider):
+    """OpenAI API provider on the async client"""
+
+    def __init__(self, max_concurrency: int = 10):
+        from openai import AsyncOpenAI
+
+        super().__init__(max_concurrency)
+        self.client = AsyncOpenAI()
+        self.model = "gpt-5"
+        self.model_tiers = openai_model_tiers(self.model)
+
+    async def make_call(
+        self, messages: List[Dict[str, str]], max_tokens: int = 1000
+    ) -> str:
+        """Make an awaitable call to OpenAI's responses endpoint"""
+        try:
+            response = await self.client.responses.create(
+                **self._build_request(messages, max_tokens)
+            )
+            self._record_usage(getattr(response, "usage", None))
 
             if hasattr(response, "output_text"):
                 return response.output_text
@@ -79,26 +1068,29 @@ class OpenAIProvider(LLMProvider):
         except Exception as e:
             return f"Error making OpenAI API call: {str(e)}"
 
-    def _messages_to_text(self, messages: List[Dict[str, str]]) -> str:
-        """Convert message history to a single text input for OpenAI responses API"""
-        text_parts = []
-        for msg in messages:
-            role = msg.get("role", "user")
-            content = msg.get("content", "")
-            if role == "user":
-                text_parts.append(f"Human: {content}")
-            elif role == "assistant":
-                text_parts.append(f"Assistant: {content}")
+    _build_request = OpenAIProvider._build_request
+    _reasoning_allowance = OpenAIProvider._reasoning_allowance
+    _instructions = OpenAIProvider._instructions
+    _record_usage = OpenAIProvider._record_usage
+
 
-        return "\n\n".join(text_parts)
+def _hedge_order() -> List[str]:
+    """Providers combined by the 'hedged' provider, in preferred order"""
+    names = os.getenv("LLM_HEDGE_PROVIDERS", "anthropic,openai")
+    return [name.strip() for name in names.split(",") if name.strip()]
 
 
-def create_provider(provider_name: str = None) -> LLMProvider:
+def create_provider(provider_name: str = None, async_mode: bool = False):
     """Factory function to create LLM providers
 
     Args:
-        provider_name: Name of provider ('openai' or 'anthropic').
-                      If None, uses LLM_PROVIDER env var or defaults to 'anthropic'
+        provider_name: Name of provider ('openai', 'anthropic', 'hedged' or
+                      'replay'). If None, uses LLM_PROVIDER env var or defaults
+                      to 'anthropic'. 'hedged' races the providers listed in
+                      LLM_HEDGE_PROVIDERS (default 'anthropic,openai').
+                      'replay' serves the fixture in LLM_REPLAY_FIXTURE with the
+                      latency model in LLM_REPLAY_LATENCY (seconds or 'recorded')
+        async_mode: If True, return the AsyncLLMProvider counterpart
 
     Returns:
         Configured LLM provider instance
@@ -109,10 +1101,173 @@ def create_provider(provider_name: str = None) -> LLMProvider:
     provider_name = provider_name.lower().strip()
 
     if provider_name == "openai":
-        return OpenAIProvider()
+        return AsyncOpenAIProvider() if async_mode else OpenAIProvider()
     elif provider_name == "anthropic":
-        return AnthropicProvider()
+        return AsyncAnthropicProvider() if async_mode else AnthropicProvider()
+    elif provider_name == "hedged":
+        if async_mode:
+            raise ValueError("The hedged provider has no async counterpart")
+        from hedging import HedgedProvider
+
+        return HedgedProvider([create_provider(name) for name in _hedge_order()])
+    elif provider_name == "replay":
+        if async_mode:
+            raise ValueError("The replay provider has no async counterpart")
+        return ReplayProvider(
+            os.getenv("LLM_REPLAY_FIXTURE", DEFAULT_REPLAY_FIXTURE),
+            latency=os.getenv("LLM_REPLAY_LATENCY"),
+        )
     else:
         raise ValueError(
-            f"Unknown provider: {provider_name}. Supported: 'openai', 'anthropic'"
+            f"Unknown provider: {provider_name}. "
+            "Supported: 'openai', 'anthropic', 'hedged', 'replay'"
+        )
+
+
+def _http2_available() -> bool:
+    """HTTP/2 in httpx needs the optional h2 package"""
+    try:
+        import h2  # noqa: F401
+
+        return True
+    except ImportError:
+        return False
+
+
+class ProviderRegistry:
+    """Process-wide provider instances backed by one pooled HTTP client each
+
+    Every session that asks for the same provider gets the same instance, so
+    connections (and their TLS handshakes) are reused across sessions. Pool
+    limits default to the LLM_POOL_MAX_CONNECTIONS, LLM_POOL_MAX_KEEPALIVE and
+    LLM_POOL_KEEPALIVE_EXPIRY environment variables. Rate limits per API
+    come from LLM_RATE_LIMIT_RPM and LLM_RATE_LIMIT_TPM.
+    """
+
+    def __init__(
+        self,
+        max_connections: int = None,
+        max_keepalive_connections: int = None,
+        keepalive_expiry: float = None,
+        http2: bool = None,
+    ):
+        self.max_connections = max_connections or int(
+            os.getenv("LLM_POOL_MAX_CONNECTIONS", "100")
+        )
+        self.max_keepalive_connections = max_keepalive_connections or int(
+            os.getenv("LLM_POOL_MAX_KEEPALIVE", "20")
+        )
+        self.keepalive_expiry = keepalive_expiry or float(
+            os.getenv("LLM_POOL_KEEPALIVE_EXPIRY", "30")
         )
+        self.http2 = _http2_available() if http2 is None else http2
+        self._providers = {}
+        self._http_clients = {}
+        self._lock = threading.RLock()
+
+    def get(self, provider_name: str = None) -> LLMProvider:
+        """Return the shared provider instance, creating it on first use
+
+        API providers are wrapped in a ScheduledProvider, so every session
+        sharing the instance also shares its rate limits (see scheduler.py).
+        """
+        provider_name = self._normalize(provider_name)
+        with self._lock:
+            if provider_name not in self._providers:
+                provider = self._create(provider_name)
+                if provider_name in self._http_clients:
+                    from scheduler import RateLimitScheduler, ScheduledProvider
+
+                    provider = ScheduledProvider(
+                        provider, RateLimitScheduler.from_env()
+                    )
+                self._providers[provider_name] = provider
+            return self._providers[provider_name]
+
+    @staticmethod
+    def _normalize(provider_name: str = None) -> str:
+        if provider_name is None:
+            provider_name = os.getenv("LLM_PROVIDER", "anthropic")
+        return provider_name.lower().strip()
+
+    def _create(self, provider_name: str) -> LLMProvider:
+        if provider_name == "anthropic":
+            import anthropic
+
+            http_client = anthropic.DefaultHttpxClient(**self._client_options())
+            self._http_clients[provider_name] = http_client
+            return AnthropicProvider(anthropic.Anthropic(http_client=http_client))
+        elif provider_name == "openai":
+            import openai
+
+            http_client = openai.DefaultHttpxClient(**self._client_options())
+            self._http_clients[provider_name] = http_client
+            return OpenAIProvider(openai.OpenAI(http_client=http_client))
+        elif provider_name == "hedged":
+            from hedging import HedgedProvider
+
+            # Hedge across the registry's own pooled providers
+            return HedgedProvider([self.get(name) for name in _hedge_order()])
+        # Providers without an HTTP client (e.g. replay) are shared as-is
+        return create_provider(provider_name)
+
+    def _client_options(self) -> Dict[str, Any]:
+        import httpx
+
+        return {
+            "limits": httpx.Limits(
+                max_connections=self.max_connections,
+                max_keepalive_connections=self.max_keepalive_connections,
+                keepalive_expiry=self.keepalive_expiry,
+            ),
+            "http2": self.http2,
+            "event_hooks": {
+                "request": [tracing.http_request_hook],
+                "response": [tracing.http_response_hook],
+            },
+        }
+
+    def prewarm(self, provider_names: List[str] = None) -> threading.Thread:
+        """Open connections in the background so first calls skip the handshake
+
+        Args:
+            provider_names: Providers to warm. Defaults to LLM_PROVIDER.
+
+        Returns:
+            The background thread doing the warm-up
+        """
+
+        def warm():
+            for name in provider_names or [None]:
+                try:
+                    name = self._normalize(name)
+                    provider = base_provider(self.get(name))
+                    http_client = self._http_clients.get(name)
+                    if http_client is not None:
+                        # Any response will do - this only establishes TLS
+                        http_client.head(str(provider.client.base_url))
+                except Exception:
+                    pass  # Warm-up is best effort; the real call will report errors
+
+        thread = threading.Thread(target=warm, daemon=True)
+        thread.start()
+        return thread
+
+    def close(self):
+        """Close every pooled HTTP client and forget the shared providers"""
+        with self._lock:
+            for http_client in self._http_clients.values():
+                http_client.close()
+            self._http_clients.clear()
+            self._providers.clear()
+
+
+registry = ProviderRegistry()
+
+
+def get_provider(provider_name: str = None) -> LLMProvider:
+    """Shared provider instance from the process-wide registry
+
+    Unlike create_provider, repeated calls return the same instance.
+    """
+    return registry.get(provider_name)
@@ -0,0 +1,411 @@
+#!/usr/bin/env python3
+"""
+Load Generator
+Runs a cohort of scripted bot trainees through CustomerServiceTrainer
+against the stand-in LLM server to measure what one deployment can carry
+"""
+
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import threading
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+
+try:
+    import resource
+except ImportError:  # Windows: no peak RSS
+    resource = None
+
+import telemetry
+from benchmark import SCRIPTED_RESPONSES, percentile
+from llm_providers import DEFAULT_REPLAY_FIXTURE, ProviderRegistry
+from main import CustomerServiceTrainer
+
+STANDIN_SCRIPT = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "standin_llm.py"
+)
+PERCENTILES = (0.50, 0.95, 0.99)
+
+
+class TimedExecutor(ThreadPoolExecutor):
+    """Thread pool that records how long each task waited for a worker"""
+
+    def __init__(self, max_workers: int):
+        super().__init__(max_workers=max_workers)
+        self.waits = []
+
+    def submit(self, fn, /, *args, **kwargs):
+        queued = time.perf_counter()
+
+        def run():
+            self.waits.append(time.perf_counter() - queued)
+            return fn(*args, **kwargs)
+
+        return super().submit(run)
+
+
+def start_standin(latency="recorded", error_rate=0.0, fixture=DEFAULT_REPLAY_FIXTURE):
+    """Start the stand-in server in a child process; returns (process, base URL)
+
+    A separate process keeps the stand-in's own work off this process's
+    interpreter lock, so it doesn't count against the trainer's capacity.
+    """
+    process = subprocess.Popen(
+        [
+            sys.executable,
+            STANDIN_SCRIPT,
+            "--port",
+            "0",
+            "--latency",
+            str(latency),
+            "--error-rate",
+            str(error_rate),
+            "--fixture",
+            fixture,
+        ],
+        stdout=subprocess.PIPE,
+        text=True,
+    )
+    line = process.stdout.readline()
+    if "http://" not in line:
+        process.kill()
+        raise RuntimeError(f"Stand-in server failed to start: {line.strip()!r}")
+    return process, line[line.index("http://") :].strip()
+
+
+def peak_rss_kib():
+    """Peak resident set size of this process in KiB, or None if unknown"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 1024 if sys.platform == "darwin" else peak
+
+
+class Cohort:
+    """N bot trainees sharing one provider stack and background executor
+
+    Each bot plays one session: start_scenario, `turns` scripted replies
+    with coaching on (waiting for each hint, as the server's /coach does),
+    then end_scenario_with_feedback, with a randomized think time before
+    each reply. Bots start spread evenly over `ramp` seconds.
+
+    Args:
+        provider: Provider every session shares
+        trainees: Number of bots
+        turns: Representative turns per session
+        think_time: Mean seconds a bot takes to answer (uniform 0.5x-1.5x)
+        ramp: Seconds over which the bots start
+        background_workers: Size of the shared background executor
+    """
+
+    def __init__(
+        self,
+        provider,
+        trainees: int = 20,
+        turns: int = 6,
+        think_time: float = 2.0,
+        ramp: float = 10.0,
+        background_workers: int = 32,
+    ):
+        self.provider = provider
+        self.trainees = trainees
+        self.turns = turns
+        self.think_time = think_time
+        self.ramp = ramp
+        self.background = TimedExecutor(background_workers)
+        self.steps = []  # (step name, seconds)
+        self.state_bytes = []  # Serialized session size when each session ends
+        self.failures = []
+        self.live = 0
+        self.max_live = 0
+        self._lock = threading.Lock()
+
+    def run(self) -> float:
+        """Run every bot to completion; returns the wall time in seconds"""
+        started = time.perf_counter()
+        threads = []
+        for index in range(self.trainees):
+            delay = self.ramp * index / max(self.trainees - 1, 1)
+            thread = threading.Thread(target=self._bot, args=(index, delay))
+            thread.start()
+            threads.append(thread)
+        for thread in threads:
+            thread.join()
+        self.background.shutdown()
+        return time.perf_counter() - started
+
+    def _step(self, name, action, *args):
+        started = time.perf_counter()
+        result = action(*args)
+        self.steps.append((name, time.perf_counter() - started))
+        return result
+
+    def _bot(self, index, delay):
+        time.sleep(delay)
+        with self._lock:
+            self.live += 1
+            self.max_live = max(self.max_live, self.live)
+        trainer = CustomerServiceTrainer(
+            provider=self.provider,
+            use_cache=False,  # Cached opening lines would hide load
+            background=self.background,
+            trainee=f"bot-{index:03d}",
+        )
+        trainer.coaching_enabled = True
+        try:
+            self._step("start_scenario", trainer.start_scenario, False)
+            for turn in range(self.turns):
+                time.sleep(random.uniform(0.5, 1.5) * self.think_time)
+                response = SCRIPTED_RESPONSES[turn % len(SCRIPTED_RESPONSES)]
+                self._step(
+                    "handle_user_response", trainer.handle_user_response, response
+                )
+                self._step("coaching_hint", trainer.analyze_conversation_for_coaching)
+            self._step("end_scenario_with_feedback", trainer.end_scenario_with_feedback)
+            self.state_bytes.append(len(json.dumps(trainer.to_state())))
+        except Exception as e:
+            self.failures.append(f"bot-{index:03d}: {e}")
+        finally:
+            trainer.close()
+            with self._lock:
+                self.live -= 1
+
+
+def run_load(
+    base_url: str,
+    trainees: int = 20,
+    turns: int = 6,
+    think_time: float = 2.0,
+    ramp: float = 10.0,
+    background_workers: int = 32,
+):
+    """Run a cohort against a stand-in server and return the report dict
+
+    The provider comes from a fresh ProviderRegistry pointed at base_url, so
+    the stack is the one a real deployment runs (pooled HTTP client, rate
+    limit scheduler when configured, the SDK's retries).
+    """
+    sink = telemetry.HistogramSink()
+    telemetry.add_sink(sink)
+    registry = ProviderRegistry()
+    try:
+        with mock.patch.dict(
+            os.environ,
+            {"ANTHROPIC_BASE_URL": base_url, "ANTHROPIC_API_KEY": "stand-in"},
+        ):
+            provider = registry.get("anthropic")
+        rss_before = peak_rss_kib()
+        cohort = Cohort(provider, trainees, turns, think_time, ramp, background_workers)
+        wall = cohort.run()
+    finally:
+        telemetry.remove_sink(sink)
+        registry.close()
+    with urllib.request.urlopen(f"{base_url}/stats") as response:
+        standin = json.load(response)
+    return build_report(cohort, sink.records, standin, wall, rss_before)
+
+
+def _percentiles(values):
+    if not values:
+        return {}
+    return {
+        f"p{round(fraction * 100)}": round(percentile(values, fraction), 3)
+        for fraction in PERCENTILES
+    }
+
+
+def build_report(cohort, records, standin, wall, rss_before=None):
+    """Throughput, latency percentiles, queueing delay and memory of a run"""
+    service_times = standin["service_times"]
+    call_sites = {}
+    for site in sorted({r.call_site or "unknown" for r in records}):
+        site_records = [r for r in records if (r.call_site or "unknown") == site]
+        ok = [r for r in site_records if not r.error]
+        call_sites[site] = {
+            "calls": len(site_records),
+            "errors": len(site_records) - len(ok),
+            "latency": _percentiles([r.latency for r in ok]),
+            "ttft": _percentiles([r.ttft for r in ok if r.ttft is not None]),
+            # Time the stand-in wasn't working on the request: connection
+            # pool waits, SDK retries after errors, and this process's own
+            # scheduling delays
+            "client_wait": _percentiles(
+                [
+                    max(r.latency - service_times[r.request_id], 0)
+                    for r in ok
+                    if r.request_id in service_times
+                ]
+            ),
+        }
+
+    steps = {}
+    for name, seconds in cohort.steps:
+        steps.setdefault(name, []).append(seconds)
+
+    completed = cohort.trainees - len(cohort.failures)
+    rss_after = peak_rss_kib()
+    memory = {
+        "peak_rss_mib": None if rss_after is None else round(rss_after / 1024, 1),
+        "rss_per_live_session_kib": None,
+        "parked_session_kib": None,
+    }
+    if rss_before is not None and rss_after is not None and cohort.max_live:
+        memory["rss_per_live_session_kib"] = round(
+            (rss_after - rss_before) / cohort.max_live, 1
+        )
+    if cohort.state_bytes:
+        memory["parked_session_kib"] = round(
+            sum(cohort.state_bytes) / len(cohort.state_bytes) / 1024, 1
+        )
+
+    return {
+        "trainees": cohort.trainees,
+        "turns": cohort.turns,
+        "max_concurrent_sessions": cohort.max_live,
+        "wall_seconds": round(wall, 2),
+        "sessions_completed": completed,
+        "failures": cohort.failures,
+        "throughput": {
+            "sessions_per_minute": round(completed / wall * 60, 2),
+            "turns_per_second": round(
+                sum(1 for name, _ in cohort.steps if name == "handle_user_response")
+                / wall,
+                2,
+            ),
+            "llm_calls_per_second": round(len(records) / wall, 2),
+        },
+        "call_sites": call_sites,
+        "steps": {name: _percentiles(values) for name, values in steps.items()},
+        "background_queue_wait": _percentiles(cohort.background.waits),
+        "memory": memory,
+        "standin": {k: v for k, v in standin.items() if k != "service_times"},
+    }
+
+
+def format_report(report):
+    """Human-readable load test report"""
+
+    def points(values):
+        return "  ".join(f"{k} {v:.3f}" for k, v in values.items()) or "-"
+
+    throughput = report["throughput"]
+    memory = report["memory"]
+    standin = report["standin"]
+    lines = [
+        "=" * 96,
+        f"LOAD TEST: {report['trainees']} trainees x {report['turns']} turns "
+        f"(peak {report['max_concurrent_sessions']} concurrent), "
+        f"{report['wall_seconds']}s",
+        "=" * 96,
+        f"Sessions completed: {report['sessions_completed']}/{report['trainees']}   "
+        f"{throughput['sessions_per_minute']} sessions/min   "
+        f"{throughput['turns_per_second']} turns/s   "
+        f"{throughput['llm_calls_per_second']} LLM calls/s",
+        "",
+        f"{'call site':<20}{'calls':>6}{'errors':>7}   latency (s)",
+    ]
+    for site, row in report["call_sites"].items():
+        lines.append(
+            f"{site:<20}{row['calls']:>6}{row['errors']:>7}   {points(row['latency'])}"
+        )
+        if row["ttft"]:
+            lines.append(f"{'':<36}ttft: {points(row['ttft'])}")
+        lines.append(f"{'':<36}client wait: {points(row['client_wait'])}")
+    lines.append("")
+    lines.append("Trainee-perceived step time (s):")
+    for name, values in report["steps"].items():
+        lines.append(f"  {name:<30}{points(values)}")
+    lines.append(
+        f"Background queue wait (s): {points(report['background_queue_wait'])}"
+    )
+    lines.append(
+        f"Memory: peak RSS {memory['peak_rss_mib'] or '-'} MiB, "
+        f"{memory['rss_per_live_session_kib'] or '-'} KiB per live session, "
+        f"{memory['parked_session_kib'] or '-'} KiB per parked session"
+    )
+    lines.append(
+        f"Stand-in: {standin['requests']} requests, {standin['errors']} errors, "
+        f"peak {standin['max_in_flight']} in flight"
+    )
+    for failure in report["failures"]:
+        lines.append(f"FAILED {failure}")
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Load test the trainer with a cohort of scripted bot trainees"
+    )
+    parser.add_argument("--trainees", type=int, default=20, help="Bot trainees")
+    parser.add_argument("--turns", type=int, default=6, help="Turns per session")
+    parser.add_argument(
+        "--think-time",
+        type=float,
+        default=2.0,
+        help="Mean seconds a bot takes to answer (default: 2)",
+    )
+    parser.add_argument(
+        "--ramp",
+        type=float,
+        default=10.0,
+        help="Seconds over which the bots start (default: 10)",
+    )
+    parser.add_argument(
+        "--background-workers",
+        type=int,
+        default=32,
+        help="Shared background executor size, as in serve (default: 32)",
+    )
+    parser.add_argument(
+        "--latency",
+        default="recorded",
+        help="Stand-in latency: seconds per response or 'recorded' (default)",
+    )
+    parser.add_argument(
+        "--error-rate",
+        type=float,
+        default=0.0,
+        help="Fraction of stand-in requests answered with 529 overloaded",
+    )
+    parser.add_argument(
+        "--fixture", default=DEFAULT_REPLAY_FIXTURE, help="Replay fixture file"
+    )
+    parser.add_argument(
+        "--base-url",
+        help="Use an already running stand-in server instead of starting one",
+    )
+    parser.add_argument("--json", metavar="PATH", help="Also write the report as JSON")
+    args = parser.parse_args()
+
+    process = None
+    base_url = args.base_url
+    if base_url is None:
+        process, base_url = start_standin(args.latency, args.error_rate, args.fixture)
+    try:
+        report = run_load(
+            base_url,
+            trainees=args.trainees,
+            turns=args.turns,
+            think_time=args.think_time,
+            ramp=args.ramp,
+            background_workers=args.background_workers,
+        )
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait()
+    print(format_report(report))
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -6,115 +6,188 @@ A simple CLI tool to practice customer service skills with AI roleplay
 
 import os
 import argparse
-from llm_providers import create_provider
+import contextlib
+import getpass
+import json
+import secrets
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from llm_providers import (
+    get_provider,
+    registry,
+    base_provider,
+    LLMProvider,
+    RecordingProvider,
+    is_error_response,
+)
+from conversation_context import ConversationContext
+from response_cache import CachingProvider, ResponseCache
+from scenario_catalog import catalog
+from transcript import CUSTOMER, REPRESENTATIVE, Transcript
+from analytics import AnalyticsStore, format_report, session_metrics
+from assessment import RollingAssessor, build_synthesis_prompt
+from feedback_prompts import build_feedback_prompt
+from routing import ModelRouter, parse_tiers
+from event_log import (
+    COACHING_HINT,
+    DEFAULT_EVENT_LOG_PATH,
+    FEEDBACK,
+    LLM_CALL,
+    SESSION_START,
+    TURN,
+    EventLog,
+)
+import telemetry
+import tracing
+
+# CLI commands, as named in traces and profiles (anything else is a response)
+CLI_COMMANDS = ("start", "end", "ref", "reference", "coach", "help")
 
 
 class CustomerServiceTrainer:
-    def __init__(self, provider=None):
+    def __init__(
+        self,
+        provider=None,
+        context_budget=4000,
+        keep_exchanges=4,
+        use_cache=True,
+        record=False,
+        background=None,
+        scenario_id=None,
+        rolling_assessment=True,
+        event_log=None,
+        trainee=None,
+        analytics=None,
+        router=None,
+        profiler=None,
+    ):
         self.conversation_history = []
+        # What was actually said, for coaching and feedback prompts
+        self.transcript = Transcript()
         self.scenario_active = False
         self.coaching_enabled = False  # Coach starts disabled
 
-        # Initialize LLM provider
-        self.llm_provider = create_provider(provider)
-
-        # Scenario setup with comprehensive briefing
-        self.scenario = {
-            "title": "Billing Dispute - Service Enhancement Fee",
-            "company_briefing": {
-                "company_name": "TechFlow Communications",
-                "your_role": "Customer Service Representative - Tier 1 Support",
-                "company_overview": """
-                    TechFlow Communications provides internet, phone, and TV bundle services to residential customers.
-                    We pride ourselves on reliable service and customer satisfaction.
-                    Founded in 2018, we serve over 50,000 customers across the metropolitan area.
-                """,
-                "services": {
-                    "internet": "High-speed fiber internet (100Mbps - 1Gbps plans)",
-                    "phone": "Unlimited local and long-distance calling",
-                    "tv": "200+ channels including premium networks",
-                    "bundles": "Discounted packages combining 2-3 services",
-                },
-                "service_enhancement_package": {
-                    "name": "TechFlow Plus Enhancement",
-                    "cost": "$45/month",
-                    "when_applied": "Automatically after initial 2-year contract expires",
-                    "disclosure": "Mentioned in original contract fine print (Section 12.3)",
-                    "benefits": [
-                        "Priority customer support (24/7 dedicated line)",
-                        "Free premium channels (HBO, Showtime, Sports packages)",
-                        "Internet speed boost (+50% faster)",
-                        "Free tech support visits (normally $75 each)",
-                        "No early termination fees if you want to cancel service",
-                    ],
-                    "value": "Regular price would be $89/month for these features separately",
-                },
-                "policies": {
-                    "fee_removal": "Enhancement can be removed with 30-day written notice",
-                    "refunds": "Can refund current month if removed within 15 days of billing",
-                    "escalation": "Escalate to supervisor if customer requests cancellation of entire service",
-                    "retention_offers": "Can offer 50% discount on enhancement fee for 3 months as retention",
-                },
-            },
-            "customer_background": {
-                "name": "Sarah Chen",
-                "account_details": {
-                    "customer_since": "March 2023 (2 years)",
-                    "services": "Internet + Phone bundle",
-                    "payment_history": "Always pays on time",
-                    "previous_contacts": "Called once in 2023 about internet outage - resolved quickly",
-                },
-                "current_situation": {
-                    "issue": "Unexpected $45 Service Enhancement Fee on latest bill",
-                    "customer_knowledge": "Doesn't remember agreeing to this",
-                    "desired_outcome": "Understand the charge and potentially remove it",
-                    "mood": "Mildly frustrated but reasonable",
-                },
-            },
-            "success_criteria": {
-                "ideal_outcome": "Customer understands the value, keeps the enhancement",
-                "acceptable_outcome": "Customer removes enhancement but stays satisfied",
-                "escalation_needed": "If customer threatens to cancel entire service",
-            },
-            "customer_prompt": """
-                You are Sarah Chen, a customer calling about a billing issue. You have these characteristics:
-
-                PERSONALITY & TONE:
-                - Mildly frustrated but reasonable
-                - Direct communicator who wants clear answers
-                - Willing to work with customer service if treated respectfully
-                - Gets more frustrated if you feel dismissed or not heard
-
-                YOUR SITUATION:
-                - You've been a loyal customer for 2 years
-                - You just received your bill with an unexpected $45 "Service Enhancement Fee"
-                - You never signed up for any service enhancement
-                - You want to understand what this charge is and get it removed if it's a mistake
-
-                CONVERSATION RULES:
-                - Stay in character as Sarah Chen throughout the entire conversation
-                - Only discuss this billing issue - if the human asks about anything else (travel, other topics, personal advice), respond with something like "I'm sorry, but I'm calling about my billing issue. Can we please focus on resolving this charge?"
-                - Be persistent about getting answers but remain civil
-                - Show appreciation when the representative is helpful
-                - Your goal is to understand the charge and get it resolved
-
-                IMPORTANT: You are ONLY Sarah Chen calling about a billing issue. Do not break character or discuss anything unrelated to customer service.
-
-                Start the conversation by explaining your billing concern.
-            """,
-        }
+        # Background work (assessments, coaching hints) runs here so it never
+        # blocks a turn. A server hosting many sessions passes one shared executor.
+        self._owns_background = background is None
+        self.background = background or ThreadPoolExecutor(max_workers=4)
+        self._coaching_generation = 0
+        self._output_lock = threading.Lock()
+        self._at_prompt = False
+
+        # Initialize LLM provider, serving repeatable calls (opening lines,
+        # coaching/feedback on identical transcripts) from the response cache.
+        # Named providers come from the shared registry so sessions in one
+        # process reuse pooled connections.
+        if isinstance(provider, LLMProvider):
+            self.llm_provider = provider
+        else:
+            self.llm_provider = get_provider(provider)
+        self.recorder = None
+        if record:
+            # Capture real responses as a fixture for the replay provider
+            self.recorder = self.llm_provider = RecordingProvider(self.llm_provider)
+        if use_cache:
+            self.llm_provider = CachingProvider(self.llm_provider, ResponseCache())
+
+        # Bounded view of the conversation that is actually sent each turn
+        self.context = ConversationContext(
+            self.summarize_exchange,
+            token_budget=context_budget,
+            keep_exchanges=keep_exchanges,
+            executor=None if self._owns_background else self.background,
+        )
+
+        # Scenarios are loaded once per process and shared read-only
+        self.scenario = catalog.get(scenario_id)
+
+        # Model tier per call site; a server shares one router so adaptive
+        # downgrades see every session's latency
+        self.router = router or ModelRouter()
+
+        # Each exchange is scored in the background as the call goes on, so
+        # end-of-session feedback only synthesizes the results
+        self.rolling_assessment = rolling_assessment
+        self.assessor = RollingAssessor(self.assess_exchange, self.background)
+
+        # Optional event_log.EventLog; each scenario run is one logged session
+        self.event_log = event_log
+        self.trainee = trainee
+        self.session_id = None
+
+        # Optional analytics.AnalyticsStore receiving each finished session
+        self.analytics = analytics
+        self._hinted = set()  # Assessment `upto` values shown as hints
+
+        # Optional tracing.CommandProfiler wrapped around each CLI command
+        self.profiler = profiler
+
+    def make_api_call(self, messages, max_tokens=1000, call_site=None):
+        """Make a call to the configured LLM provider on the site's model tier"""
+        tier = self.router.tier_for(call_site, self.scenario.model_tiers)
+        with tracing.span("llm.call", self.session_id, call_site=call_site, model=tier):
+            started = time.perf_counter()
+            response = self.llm_provider.make_call(
+                messages, max_tokens, call_site, tier
+            )
+            self._log_call(call_site, tier, started, None, response)
+        return response
+
+    def make_api_stream(self, messages, max_tokens=1000, call_site=None):
+        """Stream a call to the configured LLM provider, yielding text chunks"""
+        tier = self.router.tier_for(call_site, self.scenario.model_tiers)
+        with tracing.span(
+            "llm.stream", self.session_id, call_site=call_site, model=tier
+        ) as span:
+            started = time.perf_counter()
+            ttft = None
+            first_chunk = ""
+            for chunk in self.llm_provider.stream_call(
+                messages, max_tokens, call_site, tier
+            ):
+                if ttft is None:
+                    ttft = time.perf_counter() - started
+                    first_chunk = chunk
+                    span.set(ttft=round(ttft, 4))
+                yield chunk
+            self._log_call(call_site, tier, started, ttft, first_chunk)
+
+    def _log_call(self, call_site, tier, started, ttft, response):
+        latency = time.perf_counter() - started
+        error = is_error_response(response)
+        self.router.record(
+            call_site, tier, latency if ttft is None else ttft, ok=not error
+        )
+        self._log(
+            LLM_CALL,
+            call_site=call_site,
+            model=tier,
+            latency=round(latency, 4),
+            ttft=None if ttft is None else round(ttft, 4),
+            error=error,
+        )
 
-    def make_api_call(self, messages, max_tokens=1000):
-        """Make a call to the configured LLM provider"""
-        return self.llm_provider.make_call(messages, max_tokens)
+    def _log(self, kind, **data):
+        """Queue an event for the current scenario run (no-op without a log)"""
+        if self.event_log is not None and self.session_id is not None:
+            self.event_log.record(
+                self.session_id, kind, self.scenario.id, self.trainee, **data
+            )
+
+    def _add_turn(self, speaker, text, **turn_fields):
+        """Append a transcript turn and log it"""
+        turn = self.transcript.add(speaker, text, **turn_fields)
+        self._log(TURN, **turn.to_dict())
+        return turn
 
     def display_briefing(self):
         """Display comprehensive scenario briefing"""
-        briefing = self.scenario["company_briefing"]
-        customer = self.scenario["customer_background"]
+        briefing = self.scenario.company_briefing
+        customer = self.scenario.customer_background
 
         print("=" * 80)
-        print(f"SCENARIO BRIEFING: {self.scenario['title'].upper()}")
+        print(f"SCENARIO BRIEFING: {self.scenario.title.upper()}")
         print("=" * 80)
 
         # Company Overview
@@ -164,7 +237,7 @@ class CustomerServiceTrainer:
 
         # Success Metrics
         print(f"\n🎯 SUCCESS OUTCOMES:")
-        success = self.scenario["success_criteria"]
+        success = self.scenario.success_criteria
         print(f"  • Ideal: {success['ideal_outcome']}")
         print(f"  • Acceptable: {success['acceptable_outcome']}")
         print(f"  • Escalate if: {success['escalation_needed']}")
@@ -174,138 +247,199 @@ class CustomerServiceTrainer:
         print("You can reference this briefing during the conversation if needed.")
         print("=" * 80)
 
-    def start_scenario(self):
-        """Initialize the customer service scenario with briefing"""
-        self.display_briefing()
-
-        print(f"\nPress Enter when ready to start the roleplay...")
-        input()
-
-        # Initialize conversation with customer - enhanced prompt with business context
-        enhanced_customer_prompt = f"""
-            You are Sarah Chen, calling TechFlow Communications about a billing issue. Context:
-
-            PERSONALITY & TONE:
-            - Mildly frustrated but reasonable
-            - Direct communicator who wants clear answers
-            - Willing to work with customer service if treated respectfully
-            - Gets more frustrated if you feel dismissed or not heard
-
-            YOUR SITUATION:
-            - You've been a customer since March 2023 (2 years)
-            - You have Internet + Phone bundle service
-            - You always pay your bills on time
-            - You just received your bill with an unexpected $45 "TechFlow Plus Enhancement" fee
-            - You don't remember signing up for any enhancement
-            - You want to understand what this charge is and get it removed if it's a mistake
-
-            CONVERSATION RULES:
-            - Stay in character as Sarah Chen throughout the entire conversation
-            - Only discuss this billing issue - if asked about anything else, redirect back to billing
-            - Be persistent about getting answers but remain civil
-            - Show appreciation when the representative is helpful
-            - Your goal is to understand the charge and get it resolved
-
-            IMPORTANT: You are ONLY Sarah Chen calling about the billing issue. Stay in character.
-
-            Start by explaining your billing concern.
+    @tracing.traced()
+    def start_scenario(self, interactive=True):
+        """Initialize the customer service scenario with briefing
+
+        Args:
+            interactive: Show the briefing and wait for Enter in the terminal.
+                        Server sessions pass False and get the opening line back.
         """
+        # The opening line doesn't depend on the trainee, so generate it while
+        # they read the briefing
+        opening_line = self.prefetch_opening_line()
 
-        initial_message = [{"role": "user", "content": enhanced_customer_prompt}]
-        customer_response = self.make_api_call(initial_message)
+        if interactive:
+            self.display_briefing()
 
-        print("\n" + "=" * 60)
-        print("CUSTOMER CALLING...")
-        print("=" * 60)
-        print(f"Customer: {customer_response}")
+            print(f"\nPress Enter when ready to start the roleplay...")
+            input()
 
-        # Store the conversation
-        self.conversation_history = [
-            {"role": "user", "content": enhanced_customer_prompt},
-            {"role": "assistant", "content": customer_response},
-        ]
+        # Only waits if the opening line isn't ready yet
+        customer_response = opening_line.result()
+
+        if interactive:
+            print("\n" + "=" * 60)
+            print("CUSTOMER CALLING...")
+            print("=" * 60)
+            print(f"Customer: {customer_response}")
+
+        self.conversation_history.append(
+            {"role": "assistant", "content": customer_response}
+        )
+        self._add_turn(
+            CUSTOMER, customer_response, started_at=self._opening_requested_at
+        )
+        self.context.start(self.conversation_history)
 
         self.scenario_active = True
         return customer_response
 
-    def analyze_conversation_for_coaching(self):
-        """Analyze recent conversation to provide coaching hints"""
-        if not self.conversation_history or len(self.conversation_history) < 3:
-            return None
-
-        # Get the last few exchanges for context
-        recent_conversation = self.conversation_history[-4:]  # Last 2 exchanges
+    @tracing.traced()
+    def prefetch_opening_line(self):
+        """Set up the conversation and request the opening line in the background
 
-        coaching_prompt = f"""
-            Analyze this customer service conversation and provide a brief coaching hint for the representative:
+        Returns:
+            Future resolving to the customer's opening line
+        """
+        # Customer persona goes in a cached system prompt - it is identical on
+        # every call, so only the first call of a session pays for its prefill
+        self.conversation_history = [
+            {"role": "system", "content": self.scenario.persona_prompt, "cache": True},
+            {"role": "user", "content": self.scenario.opening_cue},
+        ]
+        self.transcript = Transcript()
+        self.assessor.reset()
+        self.session_id = secrets.token_hex(8)
+        self._hinted = set()
+        self._log(SESSION_START, title=self.scenario.title)
+        self._opening_requested_at = time.time()
+        return self.background.submit(
+            self.make_api_call,
+            list(self.conversation_history),
+            call_site="opening_line",
+        )
 
-            RECENT CONVERSATION:
-            {self.format_recent_conversation(recent_conversation)}
+    @tracing.traced()
+    def analyze_conversation_for_coaching(self, upto=None):
+        """Coaching hint for the representative's latest response
 
-            CONTEXT: This is a billing dispute where the customer (Sarah Chen) is upset about an unexpected $45 charge.
+        The hint comes from the rolling assessment of that exchange, so
+        coaching and assessment share one call.
 
-            Provide ONE specific coaching hint in 1-2 sentences that would help the representative improve their next response. Focus on:
-            - Empathy and acknowledgment
-            - Active listening 
-            - Addressing customer's actual concerns
-            - Professional problem-solving approach
+        Args:
+            upto: Number of transcript turns to consider, so a hint requested
+                 in the background ignores later turns. Defaults to all.
 
-            Format: Just the coaching advice, no extra text. Keep it concise and actionable.
+        Returns:
+            The hint, or None if there is nothing to assess or the assessment
+            failed
         """
+        if upto is None:
+            upto = len(self.transcript)
+        if upto < 2:  # Needs at least one representative turn
+            return None
+        try:
+            hint = self.assessor.submit(upto).result().hint
+        except Exception:
+            return None
+        self._hint_shown(upto, hint)
+        return hint
+
+    def _hint_shown(self, upto, hint):
+        self._hinted.add(upto)
+        self._log(COACHING_HINT, upto=upto, hint=hint)
 
-        coaching_messages = [{"role": "user", "content": coaching_prompt}]
-        coaching_hint = self.make_api_call(coaching_messages, max_tokens=200)
+    @tracing.traced()
+    def assess_exchange(self, upto):
+        """Assess the representative's last response within the first upto turns"""
+        assessment_prompt = f"""
+            Assess the representative's LAST response in this customer service conversation:
 
-        return coaching_hint
+            RECENT CONVERSATION:
+            {self.transcript.render(upto - 4, upto)}
 
-    def format_recent_conversation(self, recent_messages):
-        """Format recent conversation for coaching analysis"""
-        formatted = []
-        is_customer = True  # Start with customer (skip system prompt)
+            CONTEXT: {self.scenario.coaching_context}
 
-        for msg in recent_messages:
-            if msg["role"] == "assistant":
-                formatted.append(f"Customer: {msg['content']}")
-            elif "Continue playing Sarah Chen" in msg["content"]:
-                # Extract the actual representative response from the prompt
-                content = msg["content"]
-                if 'just said: "' in content:
-                    rep_response = content.split('just said: "')[1].split('"')[0]
-                    formatted.append(f"Representative: {rep_response}")
+            Judge empathy and acknowledgment, active listening, addressing the customer's actual concerns and professional problem-solving.
 
-        return "\n\n".join(formatted[-4:])  # Last 2 exchanges
+            Format: exactly these four lines, no extra text.
+            RATING: <1-5>
+            STRENGTH: <what worked, in a few words, or none>
+            ISSUE: <what to improve, in a few words, or none>
+            HINT: <one specific, actionable coaching hint in 1-2 sentences for their next response>
+        """
+
+        assessment_messages = [{"role": "user", "content": assessment_prompt}]
+        return self.make_api_call(
+            assessment_messages, max_tokens=200, call_site="assessment"
+        )
 
     def handle_user_response(self, user_input):
         """Process user's customer service response"""
-        if not self.scenario_active:
-            return "Please start a scenario first."
+        return "".join(self.stream_user_response(user_input))
 
-        # Add user response to conversation
-        self.conversation_history.append(
-            {
-                "role": "user",
-                "content": f"""
-                    Continue playing Sarah Chen, the customer with the billing issue. 
-                    The customer service representative just said: "{user_input}"
-
-                    Remember:
-                    - Stay in character as Sarah Chen
-                    - Focus only on the billing dispute
-                    - If they ask about anything unrelated, redirect back to your billing issue
-                    - React appropriately to their response (appreciative if helpful, more frustrated if dismissed)
-                """,
-            }
-        )
+    @tracing.traced()
+    def stream_user_response(self, user_input):
+        """Process user's response, yielding the customer's reply as it streams"""
+        if not self.scenario_active:
+            yield "Please start a scenario first."
+            return
 
-        # Get AI customer response
-        customer_response = self.make_api_call(self.conversation_history)
+        # Clear diversions get the scenario's canned redirect without an API
+        # call; the exchange stays out of the model context
+        with tracing.span("topic_filter.classify"):
+            verdict = self.scenario.topic_filter.classify(user_input)
+        if verdict.off_topic:
+            redirect = self.scenario.topic_filter.redirect
+            self.conversation_history.append(
+                {"role": "user", "content": self.scenario.render_turn(user_input)}
+            )
+            self.conversation_history.append({"role": "assistant", "content": redirect})
+            self._add_turn(REPRESENTATIVE, user_input, drift=verdict.drift)
+            self._add_turn(CUSTOMER, redirect)
+            if self.rolling_assessment:
+                self.assessor.submit(len(self.transcript))
+            yield redirect
+            return
 
-        # Add AI response to history
+        # Add user response to conversation, marked as a cache breakpoint so
+        # the next turn reuses everything up to here
+        new_turn = {
+            "role": "user",
+            "cache": True,
+            "content": self.scenario.render_turn(user_input),
+        }
+        with tracing.span("context.build_messages"):
+            messages = self.context.build_messages(new_turn)
+        self.conversation_history.append(new_turn)
+        self._add_turn(REPRESENTATIVE, user_input, drift=verdict.drift)
+        requested_at = time.time()
+
+        # Stream AI customer response
+        chunks = []
+        for chunk in self.make_api_stream(messages, call_site="customer_reply"):
+            chunks.append(chunk)
+            yield chunk
+
+        # Add the full AI response to history once the stream ends
+        customer_response = "".join(chunks)
         self.conversation_history.append(
             {"role": "assistant", "content": customer_response}
         )
+        self._add_turn(CUSTOMER, customer_response, started_at=requested_at)
+        self.context.add_exchange(user_input, customer_response, new_turn)
+        if self.rolling_assessment:
+            self.assessor.submit(len(self.transcript))
 
-        return customer_response
+    @tracing.traced()
+    def summarize_exchange(self, digest, exchange):
+        """Fold one exchange into the running summary of the call"""
+        summary_prompt = f"""
+            Update the running summary of this customer service call with the new exchange.
+
+            CURRENT SUMMARY:
+            {digest or "(The call has just started.)"}
+
+            NEW EXCHANGE:
+            {exchange}
+
+            Keep facts, amounts, offers made and commitments, and note the customer's current mood.
+            Format: Just the updated summary in under 120 words, no extra text.
+        """
+
+        summary_messages = [{"role": "user", "content": summary_prompt}]
+        return self.make_api_call(summary_messages, max_tokens=250, call_site="summary")
 
     def show_quick_reference(self):
         """Show condensed reference during active scenario"""
@@ -313,7 +447,7 @@ class CustomerServiceTrainer:
             print("No active scenario. Start a scenario first.")
             return
 
-        briefing = self.scenario["company_briefing"]
+        briefing = self.scenario.company_briefing
         print("\n" + "=" * 50)
         print("QUICK REFERENCE")
         print("=" * 50)
@@ -338,143 +472,319 @@ class CustomerServiceTrainer:
             print("Coaching hints are turned off. Use 'coach' to re-enable.")
 
     def show_coaching_hint(self):
-        """Display coaching hint if enabled and scenario is active"""
+        """Show the latest exchange's coaching hint in the background if enabled
+
+        The hint is printed when its assessment arrives, without blocking the
+        next prompt.
+        """
         if not self.coaching_enabled or not self.scenario_active:
             return
 
-        print("\n🎯 Getting coaching hint...")
-        coaching_hint = self.analyze_conversation_for_coaching()
+        self.cancel_coaching_hint()
+        generation = self._coaching_generation
+        print("\n🎯 Coach is reviewing your response...")
 
-        if coaching_hint:
-            print(f"💡 COACH HINT: {coaching_hint.strip()}")
-        else:
-            print("💡 COACH: Keep the conversation going!")
-        print()
+        # Pin the turn count so later turns can't change what is analyzed
+        future = self.assessor.submit(len(self.transcript))
+        future.add_done_callback(
+            lambda done: self._display_coaching_hint(done, generation)
+        )
 
+    def cancel_coaching_hint(self):
+        """Discard any pending hint - it is stale once the trainee moves on
+
+        The assessment behind it still completes for the end-of-session feedback.
+        """
+        self._coaching_generation += 1
+
+    def _display_coaching_hint(self, future, generation):
+        """Print a finished hint unless it has been superseded"""
+        if future.cancelled() or generation != self._coaching_generation:
+            return
+
+        try:
+            assessment = future.result()
+            coaching_hint = assessment.hint
+            self._hint_shown(assessment.upto, coaching_hint)
+        except Exception as e:
+            coaching_hint = f"Coaching unavailable: {e}"
+
+        with self._output_lock:
+            if generation != self._coaching_generation:
+                return
+            if coaching_hint:
+                print(f"\n💡 COACH HINT: {coaching_hint.strip()}")
+            else:
+                print("\n💡 COACH: Keep the conversation going!")
+            if self._at_prompt:
+                # Redraw the prompt the trainee is typing at
+                print(self._prompt_text().lstrip("\n"), end="", flush=True)
+
+    def _prompt_text(self):
+        """Input prompt for the current state"""
+        if self.scenario_active:
+            coach_status = "🎯ON" if self.coaching_enabled else "OFF"
+            return f"\n[In Call - Coach:{coach_status}] > "
+        return "\n> "
+
+    def show_cache_report(self):
+        """Display prompt-cache hit and miss input token counts"""
+        cache_stats = getattr(self.llm_provider, "cache_stats", None)
+        if not cache_stats or not any(cache_stats.values()):
+            return
+
+        print(
+            f"\n🗄️  Prompt cache: {cache_stats['hit_tokens']} input tokens read from "
+            f"cache, {cache_stats['miss_tokens']} uncached"
+        )
+
+    @tracing.traced()
     def end_scenario_with_feedback(self):
-        """Generate feedback on the user's performance"""
+        """Generate feedback on the user's performance
+
+        With rolling assessment, this is a short synthesis of the
+        per-exchange assessments (most of which finished during the call).
+        """
         if not self.conversation_history:
             return "No conversation to analyze."
 
-        # Create feedback prompt
-        feedback_prompt = f"""
-            Analyze this customer service conversation and provide constructive feedback:
+        messages, max_tokens, call_site = self._feedback_request()
+        feedback = self.make_api_call(messages, max_tokens, call_site)
+        self._log(FEEDBACK, call_site=call_site, feedback=feedback)
+        self._session_finished()(feedback)
+        return feedback
 
-            CONVERSATION:
-            {self.format_conversation_for_review()}
+    @tracing.traced()
+    def request_feedback(self, batch):
+        """Queue the feedback request on a batching.BatchQueue
 
-            Please provide feedback on the customer service representative's performance:
+        For callers that don't wait on the feedback; the prompt is built
+        now, so the scenario can be reset straight away.
 
-            1. STRENGTHS: What did they do well?
-            2. AREAS FOR IMPROVEMENT: What could they have done better?
-            3. SPECIFIC SUGGESTIONS: Concrete advice for handling similar situations
-            4. OVERALL RATING: Rate their performance from 1-5 with brief explanation
+        Returns:
+            Future resolving to the feedback text
+        """
+        if not self.conversation_history:
+            future = Future()
+            future.set_result("No conversation to analyze.")
+            return future
+        messages, max_tokens, call_site = self._feedback_request()
+        future = batch.submit(
+            messages,
+            max_tokens,
+            call_site,
+            self.router.tier_for(call_site, self.scenario.model_tiers),
+        )
+        finished = self._session_finished()
+        future.add_done_callback(lambda done: finished(done.result()))
+        if self.event_log is not None and self.session_id is not None:
+            # Logged against this run even if another scenario has started
+            record = (self.session_id, FEEDBACK, self.scenario.id, self.trainee)
+            future.add_done_callback(
+                lambda done: self.event_log.record(
+                    *record, call_site=call_site, feedback=done.result(), batched=True
+                )
+            )
+        return future
 
-            Focus on:
-            - Empathy and active listening
-            - Problem-solving approach
-            - Communication clarity
-            - De-escalation techniques
-            - Professional tone
+    def _session_finished(self):
+        """Callable recording this session in analytics, given its feedback
 
-            Keep feedback constructive and specific.
+        Metrics are taken now, so the callable still works after a reset.
         """
+        if self.analytics is None:
+            return lambda feedback: None
+        analytics, scenario_id, trainee = self.analytics, self.scenario.id, self.trainee
+        metrics = session_metrics(
+            self.transcript,
+            self.assessor.results(),
+            self._hinted,
+            self.scenario.topic_filter.redirect,
+        )
 
-        feedback_messages = [{"role": "user", "content": feedback_prompt}]
-        feedback = self.make_api_call(feedback_messages, max_tokens=1500)
-
-        return feedback
+        def record(feedback):
+            if not is_error_response(feedback):
+                analytics.record_session(scenario_id, trainee, metrics, feedback)
+
+        return record
+
+    @tracing.traced()
+    def _feedback_request(self):
+        """(messages, max_tokens, call_site) of the end-of-session feedback call"""
+        if self.rolling_assessment and len(self.transcript) >= 3:
+            self.assessor.submit(len(self.transcript))
+            assessments = self.assessor.results()
+            if assessments:
+                synthesis_messages = [
+                    {
+                        "role": "user",
+                        "content": build_synthesis_prompt(
+                            assessments, self.scenario.coaching_context
+                        ),
+                    }
+                ]
+                return synthesis_messages, 500, "feedback_synthesis"
+
+        feedback_messages = [
+            {
+                "role": "user",
+                "content": build_feedback_prompt(self.format_conversation_for_review()),
+            }
+        ]
+        return feedback_messages, 1500, "feedback"
 
     def format_conversation_for_review(self):
-        """Format conversation history for feedback analysis"""
-        formatted = []
-        is_customer = True  # First message is always customer
+        """Format the transcript for feedback analysis"""
+        return self.transcript.render()
 
-        for i, msg in enumerate(self.conversation_history[1:], 1):  # Skip system prompt
-            if is_customer:
-                formatted.append(f"Customer: {msg['content']}")
-            else:
-                formatted.append(f"Representative: {msg['content']}")
-            is_customer = not is_customer  # Alternate between customer and rep
+    def reset_scenario(self):
+        """Clear the finished scenario so a new one can start"""
+        tracing.end_session(self.session_id)
+        self.conversation_history = []
+        self.transcript = Transcript()
+        self.assessor.reset()
+        self.scenario_active = False
 
-        return "\n\n".join(formatted)
+    def to_state(self):
+        """JSON-serializable session state, for parking idle sessions on disk"""
+        return {
+            "scenario_id": self.scenario.id,
+            "session_id": self.session_id,
+            "trainee": self.trainee,
+            "conversation_history": self.conversation_history,
+            "transcript": self.transcript.to_list(),
+            "assessments": self.assessor.to_list(),
+            "scenario_active": self.scenario_active,
+            "coaching_enabled": self.coaching_enabled,
+            "context": self.context.to_state(),
+        }
+
+    def load_state(self, state):
+        """Restore session state saved with to_state"""
+        self.scenario = catalog.get(state.get("scenario_id"))
+        self.session_id = state.get("session_id")
+        self.trainee = state.get("trainee", self.trainee)
+        self.conversation_history = state["conversation_history"]
+        if "transcript" in state:
+            self.transcript = Transcript.from_list(state["transcript"])
+        else:
+            self.transcript = Transcript.from_messages(
+                self.conversation_history, self.scenario
+            )
+        self.assessor.load(state.get("assessments", []))
+        self.scenario_active = state["scenario_active"]
+        self.coaching_enabled = state["coaching_enabled"]
+        self.context.load_state(state["context"])
+
+    def close(self):
+        """Release the session's worker threads"""
+        tracing.end_session(self.session_id)
+        self.cancel_coaching_hint()
+        self.context.close()
+        if self._owns_background:
+            self.background.shutdown(wait=False)
+
+    @contextlib.contextmanager
+    def _command_scope(self, command):
+        """Span, and profile if requested, around one CLI command"""
+        name = command if command in CLI_COMMANDS else "unknown"
+        if self.scenario_active and name == "unknown":
+            name = "respond"
+        profile = contextlib.nullcontext()
+        if self.profiler is not None:
+            profile = self.profiler.profile(name)
+        with tracing.span(f"command.{name}", self.session_id) as span, profile:
+            yield
+            span.set_session(self.session_id)
 
     def run(self):
         """Main CLI loop with enhanced commands"""
-        provider_name = type(self.llm_provider).__name__.replace("Provider", "")
+        provider_name = type(base_provider(self.llm_provider)).__name__.replace(
+            "Provider", ""
+        )
         print(f"Welcome to Customer Service Training! (Using {provider_name} API)")
         print(
             "Commands: 'start' (scenario), 'end' (feedback), 'ref' (reference), 'coach' (toggle coaching), 'quit'"
         )
 
+        # Per-call latency and token usage for the summary printed at quit
+        call_stats = telemetry.HistogramSink()
+        telemetry.add_sink(call_stats)
+
         while True:
-            if self.scenario_active:
-                coach_status = "🎯ON" if self.coaching_enabled else "OFF"
-                command = (
-                    input(f"\n[In Call - Coach:{coach_status}] > ").strip().lower()
-                )
-            else:
-                command = input("\n> ").strip().lower()
+            self._at_prompt = True
+            command = input(self._prompt_text()).strip().lower()
+            self._at_prompt = False
 
             if command == "quit":
+                self.cancel_coaching_hint()
+                self.show_cache_report()
+                print("\n📊 LLM calls this session:")
+                print(call_stats.summary())
+                telemetry.remove_sink(call_stats)
                 print("Thanks for training! Goodbye.")
                 break
 
-            elif command == "start":
-                if self.scenario_active:
+            with self._command_scope(command):
+                if command == "start":
+                    if self.scenario_active:
+                        print(
+                            "Scenario already active. Type 'end' to finish current scenario first."
+                        )
+                        continue
+                    self.start_scenario()
+
+                elif command == "end":
+                    if not self.scenario_active:
+                        print("No active scenario to end.")
+                        continue
+
+                    self.cancel_coaching_hint()
+                    print("\nGenerating feedback on your performance...")
+                    feedback = self.end_scenario_with_feedback()
+                    print("\n" + "=" * 60)
+                    print("PERFORMANCE FEEDBACK")
+                    print("=" * 60)
+                    print(feedback)
+
+                    # Reset for next scenario
+                    self.reset_scenario()
                     print(
-                        "Scenario already active. Type 'end' to finish current scenario first."
+                        "\nScenario complete! Type 'start' to try again or 'quit' to exit."
                     )
-                    continue
-                self.start_scenario()
-
-            elif command == "end":
-                if not self.scenario_active:
-                    print("No active scenario to end.")
-                    continue
-
-                print("\nGenerating feedback on your performance...")
-                feedback = self.end_scenario_with_feedback()
-                print("\n" + "=" * 60)
-                print("PERFORMANCE FEEDBACK")
-                print("=" * 60)
-                print(feedback)
-
-                # Reset for next scenario
-                self.conversation_history = []
-                self.scenario_active = False
-                print(
-                    "\nScenario complete! Type 'start' to try again or 'quit' to exit."
-                )
 
-            elif command == "ref" or command == "reference":
-                self.show_quick_reference()
+                elif command == "ref" or command == "reference":
+                    self.show_quick_reference()
 
-            elif command == "coach":
-                self.toggle_coaching()
+                elif command == "coach":
+                    self.toggle_coaching()
 
-            elif command.startswith("help"):
-                print("\nCommands:")
-                print("- start: Begin customer service roleplay")
-                print("- end: Finish scenario and get feedback")
-                print("- ref: Show quick reference during calls")
-                print("- coach: Toggle coaching hints on/off")
-                print("- quit: Exit the program")
-                print("- During roleplay: Type your customer service responses")
+                elif command.startswith("help"):
+                    print("\nCommands:")
+                    print("- start: Begin customer service roleplay")
+                    print("- end: Finish scenario and get feedback")
+                    print("- ref: Show quick reference during calls")
+                    print("- coach: Toggle coaching hints on/off")
+                    print("- quit: Exit the program")
+                    print("- During roleplay: Type your customer service responses")
 
-            elif self.scenario_active:
-                # User is responding to customer during active scenario
-                print("\nProcessing your response...")
-                customer_response = self.handle_user_response(command)
-                print(f"\nCustomer: {customer_response}")
+                elif self.scenario_active:
+                    # User is responding to customer during active scenario, so
+                    # any hint still in flight is about an exchange they've moved past
+                    self.cancel_coaching_hint()
+                    print("\nCustomer: ", end="", flush=True)
+                    for chunk in self.stream_user_response(command):
+                        with tracing.span("terminal.write"):
+                            print(chunk, end="", flush=True)
+                    print()
 
-                # Show coaching hint if enabled
-                self.show_coaching_hint()
+                    # Start coaching hint in the background if enabled
+                    self.show_coaching_hint()
 
-                print("\nYour response (or 'ref'/'coach' for help):")
+                    print("\nYour response (or 'ref'/'coach' for help):")
 
-            else:
-                print("Unknown command. Type 'help' for available commands.")
+                else:
+                    print("Unknown command. Type 'help' for available commands.")
 
 
 def main():
@@ -482,23 +792,297 @@ def main():
     parser = argparse.ArgumentParser(description="AI-Powered Customer Service Training")
     parser.add_argument(
         "--provider",
-        choices=["openai", "anthropic"],
+        choices=["openai", "anthropic", "hedged", "replay"],
         help="LLM provider to use (default: anthropic, or set LLM_PROVIDER env var)",
     )
+    parser.add_argument(
+        "--scenario",
+        help="Scenario id from the scenarios/ catalog (default: billing_dispute)",
+    )
+    parser.add_argument(
+        "--context-budget",
+        type=int,
+        default=4000,
+        help="Estimated token budget for each customer reply request (default: 4000)",
+    )
+    parser.add_argument(
+        "--keep-exchanges",
+        type=int,
+        default=4,
+        help="Recent exchanges sent verbatim before older ones are summarized (default: 4)",
+    )
+    parser.add_argument(
+        "--no-rolling-assessment",
+        action="store_true",
+        help="Don't score each exchange during the call; generate all feedback at 'end'",
+    )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Always call the API instead of serving repeatable calls from the response cache",
+    )
+
+    parser.add_argument(
+        "--model-tier",
+        action="append",
+        metavar="SITE=TIER",
+        help="Model tier ('fast', 'standard') or model id for a call site, e.g. "
+        "assessment=standard (repeatable; scenarios may set their own)",
+    )
+    parser.add_argument(
+        "--adaptive-models",
+        action="store_true",
+        help="Move a call site to the fast tier while its recent latency is over budget",
+    )
+
+    parser.add_argument(
+        "--event-log",
+        metavar="PATH",
+        help="SQLite event log of turns, hints, feedback and call timings "
+        "(default: ~/.cache/ai-roleplay-trainer/events.sqlite3)",
+    )
+    parser.add_argument(
+        "--no-event-log",
+        action="store_true",
+        help="Don't persist session events",
+    )
+    parser.add_argument(
+        "--no-analytics",
+        action="store_true",
+        help="Don't add finished sessions to the analytics store used by 'report'",
+    )
+    parser.add_argument(
+        "--trainee",
+        help="Trainee name recorded in the event log (default: your login name)",
+    )
+
+    parser.add_argument(
+        "--profile",
+        metavar="DIR",
+        help="Write a Chrome trace timeline per session to DIR "
+        "(open in ui.perfetto.dev or chrome://tracing)",
+    )
+    parser.add_argument(
+        "--profile-cpu",
+        action="store_true",
+        help="With --profile, also save a cProfile .prof file per command",
+    )
+    parser.add_argument(
+        "--profile-memory",
+        action="store_true",
+        help="With --profile, also save a tracemalloc snapshot per command",
+    )
+
+    parser.add_argument(
+        "--record",
+        metavar="FIXTURE",
+        help="Record provider responses to a fixture file for --provider replay",
+    )
+
+    parser.add_argument(
+        "--metrics-jsonl",
+        metavar="PATH",
+        help="Append a JSON record of every LLM call (latency, tokens, errors) to PATH",
+    )
+    parser.add_argument(
+        "--metrics-prom",
+        metavar="PATH",
+        help="Keep Prometheus-format call metrics up to date in PATH",
+    )
+    parser.add_argument(
+        "--metrics-port",
+        type=int,
+        help="Serve Prometheus-format call metrics on localhost:PORT/metrics",
+    )
+
+    subparsers = parser.add_subparsers(dest="command")
+    grade_parser = subparsers.add_parser(
+        "grade", help="Grade stored transcripts from a JSONL file (non-interactive)"
+    )
+    grade_parser.add_argument("input", help="JSONL file of transcripts to grade")
+    grade_parser.add_argument("output", help="JSONL file to append results to")
+    grade_parser.add_argument(
+        "--workers",
+        type=int,
+        default=8,
+        help="Maximum concurrent grading calls (default: 8)",
+    )
+    grade_parser.add_argument(
+        "--batch",
+        action="store_true",
+        help="Submit through the provider's batch API (cheaper, results within hours)",
+    )
+
+    subparsers.add_parser("scenarios", help="List the scenarios in the catalog")
+
+    report_parser = subparsers.add_parser(
+        "report",
+        help="Cohort report over finished sessions (filter with --scenario/--trainee)",
+    )
+    report_parser.add_argument(
+        "--days", type=float, help="Only sessions from the last DAYS days"
+    )
+    report_parser.add_argument(
+        "--json", action="store_true", help="Print the report as JSON"
+    )
+
+    serve_parser = subparsers.add_parser(
+        "serve", help="Host many trainee sessions behind a local JSON HTTP API"
+    )
+    serve_parser.add_argument("--host", default="127.0.0.1", help="Interface to bind")
+    serve_parser.add_argument("--port", type=int, default=8765, help="Port to bind")
+    serve_parser.add_argument(
+        "--session-dir",
+        help="Directory idle sessions are parked in "
+        "(default: ~/.cache/ai-roleplay-trainer/sessions)",
+    )
+    serve_parser.add_argument(
+        "--idle-timeout",
+        type=float,
+        default=600,
+        help="Seconds of inactivity before a session is moved to disk (default: 600)",
+    )
+    serve_parser.add_argument(
+        "--batch-feedback",
+        action="store_true",
+        help="Generate end-of-session feedback through the provider's batch API",
+    )
 
     args = parser.parse_args()
 
+    if args.metrics_jsonl:
+        telemetry.add_sink(telemetry.JsonlSink(args.metrics_jsonl))
+    if args.metrics_prom or args.metrics_port:
+        telemetry.add_sink(
+            telemetry.PrometheusSink(path=args.metrics_prom, port=args.metrics_port)
+        )
+
+    if (args.profile_cpu or args.profile_memory) and not args.profile:
+        parser.error("--profile-cpu and --profile-memory need --profile DIR")
+    profiler = None
+    if args.profile:
+        tracing.enable(args.profile)
+        if args.profile_cpu or args.profile_memory:
+            profiler = tracing.CommandProfiler(
+                args.profile, cpu=args.profile_cpu, memory=args.profile_memory
+            )
+
+    try:
+        tiers = parse_tiers(args.model_tier)
+    except ValueError as e:
+        parser.error(str(e))
+    router = ModelRouter(tiers, adaptive=args.adaptive_models)
+
+    # Only trainer sessions (interactive or served) record session events
+    event_log = None
+    if args.command in (None, "serve") and not args.no_event_log:
+        event_log = EventLog(args.event_log or DEFAULT_EVENT_LOG_PATH)
+    analytics = None if args.no_analytics else AnalyticsStore()
+
     try:
-        trainer = CustomerServiceTrainer(provider=args.provider)
-        trainer.run()
+        if args.command in (None, "serve", "grade"):
+            # Open API connections while the CLI starts up; report and
+            # scenarios never call a model
+            registry.prewarm([args.provider])
+
+        if args.command == "grade":
+            from batch_grading import grade_transcripts
+            from batching import BatchQueue
+
+            provider = get_provider(args.provider)
+            batch = BatchQueue(provider, max_batch_size=1000) if args.batch else None
+            try:
+                grade_transcripts(
+                    args.input,
+                    args.output,
+                    provider,
+                    workers=args.workers,
+                    batch=batch,
+                )
+            finally:
+                if batch is not None:
+                    batch.close(wait=False)
+            return
+
+        if args.command == "report":
+            report = AnalyticsStore().report(
+                scenario_id=args.scenario,
+                trainee=args.trainee,
+                since=time.time() - args.days * 86400 if args.days else None,
+            )
+            print(json.dumps(report, indent=2) if args.json else format_report(report))
+            return
+
+        if args.command == "scenarios":
+            for entry in catalog.entries():
+                tags = ", ".join(entry["tags"] or [])
+                print(
+                    f"{entry['id']:<24} {entry['difficulty'] or '':<14} "
+                    f"{entry['title']}  [{tags}]"
+                )
+            return
+
+        if args.command == "serve":
+            from server import DEFAULT_SESSION_DIR, make_server, serve
+
+            serve(
+                make_server(
+                    {
+                        "provider": args.provider,
+                        "context_budget": args.context_budget,
+                        "keep_exchanges": args.keep_exchanges,
+                        "use_cache": not args.no_cache,
+                        "scenario_id": args.scenario,
+                        "rolling_assessment": not args.no_rolling_assessment,
+                        "event_log": event_log,
+                        "analytics": analytics,
+                        "router": router,
+                    },
+                    host=args.host,
+                    port=args.port,
+                    store_dir=args.session_dir or DEFAULT_SESSION_DIR,
+                    idle_seconds=args.idle_timeout,
+                    batch_feedback=args.batch_feedback,
+                )
+            )
+            return
+
+        trainer = CustomerServiceTrainer(
+            provider=args.provider,
+            context_budget=args.context_budget,
+            keep_exchanges=args.keep_exchanges,
+            use_cache=not args.no_cache,
+            record=bool(args.record),
+            scenario_id=args.scenario,
+            rolling_assessment=not args.no_rolling_assessment,
+            event_log=event_log,
+            trainee=args.trainee or getpass.getuser(),
+            analytics=analytics,
+            router=router,
+            profiler=profiler,
+        )
+        try:
+            trainer.run()
+        finally:
+            if trainer.recorder:
+                trainer.recorder.save(args.record)
+                recorded = len(trainer.recorder.recordings)
+                print(f"Recorded {recorded} calls to {args.record}")
     except ValueError as e:
         print(f"Configuration Error: {e}")
-        print("Available providers: openai, anthropic")
+        print("Available providers: openai, anthropic, hedged, replay")
         print("Set LLM_PROVIDER environment variable or use --provider flag")
     except KeyboardInterrupt:
         print("\nGoodbye!")
     except Exception as e:
         print(f"Error: {e}")
+    finally:
+        if event_log is not None:
+            event_log.close()
+        tracer = tracing.disable()
+        if tracer is not None:
+            tracer.write_all()
+            print(f"Traces written to {args.profile}")
 
 
 if __name__ == "__main__":
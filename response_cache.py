@@ -0,0 +1,234 @@
+#!/usr/bin/env python3
+"""
+Response Cache
+Content-addressed cache of LLM responses with an in-memory LRU tier and a
+SQLite tier on disk
+"""
+
+import hashlib
+import json
+import os
+import random
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Iterator, List
+
+from llm_providers import LLMProvider, base_provider, is_error_response
+
+DEFAULT_CACHE_PATH = os.path.join(
+    os.path.expanduser("~"), ".cache", "ai-roleplay-trainer", "responses.sqlite3"
+)
+
+# Share of max_disk_bytes a full disk tier is trimmed back to
+EVICT_TO = 0.9
+
+
+class CachePolicy:
+    """How responses from one call site are cached
+
+    Args:
+        ttl: Seconds a cached response stays valid
+        variety: Number of distinct responses collected per key before the
+                cache starts serving them (chosen at random), so repeated
+                sessions don't all open with the same line
+    """
+
+    def __init__(self, ttl: float, variety: int = 1):
+        self.ttl = ttl
+        self.variety = variety
+
+
+# Opening lines are cached with a variety pool; live customer replies are not
+# cached. Identical transcripts produce identical assessment/feedback payloads.
+DEFAULT_CACHE_POLICIES = {
+    "opening_line": CachePolicy(ttl=7 * 24 * 3600, variety=5),
+    "assessment": CachePolicy(ttl=24 * 3600),
+    "summary": CachePolicy(ttl=24 * 3600),
+    "feedback": CachePolicy(ttl=24 * 3600),
+    "feedback_synthesis": CachePolicy(ttl=24 * 3600),
+}
+
+
+class ResponseCache:
+    """Two-tier response cache keyed by a hash of the request
+
+    Each key holds a pool of responses. The memory tier is an LRU of pools;
+    the disk tier is a SQLite table with per-row expiry. Once the stored
+    responses exceed max_disk_bytes, expired rows and then the oldest rows are
+    dropped until they fill no more than EVICT_TO of it, so a full cache
+    evicts in occasional batches rather than on every insert.
+    """
+
+    def __init__(
+        self,
+        path: str = DEFAULT_CACHE_PATH,
+        memory_entries: int = 256,
+        max_disk_bytes: int = 50 * 1024 * 1024,
+    ):
+        self.memory_entries = memory_entries
+        self.max_disk_bytes = max_disk_bytes
+        self._memory: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT NOT NULL,
+                response TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                expires_at REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS responses_key ON responses (key);
+            CREATE INDEX IF NOT EXISTS responses_created ON responses (created_at);
+            """
+        )
+        # Running size of the disk tier, so inserts needn't sum the table
+        self._disk_bytes = self._stored_bytes()
+
+    @staticmethod
+    def make_key(
+        provider: str, model: str, messages: List[Dict[str, str]], max_tokens: int
+    ) -> str:
+        """Content hash of everything that determines a response"""
+        payload = json.dumps(
+            [provider, model, messages, max_tokens], sort_keys=True, ensure_ascii=False
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> List[str]:
+        """Return the pool of unexpired responses for a key (possibly empty)"""
+        now = time.time()
+        with self._lock:
+            pool = self._memory.get(key)
+            if pool is not None:
+                self._memory.move_to_end(key)
+            else:
+                rows = self._db.execute(
+                    "SELECT response, expires_at FROM responses "
+                    "WHERE key = ? AND expires_at > ?",
+                    (key, now),
+                ).fetchall()
+                pool = [(response, expires_at) for response, expires_at in rows]
+                self._remember(key, pool)
+
+            pool[:] = [entry for entry in pool if entry[1] > now]
+            return [response for response, _ in pool]
+
+    def add(self, key: str, response: str, ttl: float):
+        """Add a response to a key's pool on both tiers"""
+        now = time.time()
+        size = len(response.encode("utf-8"))
+        with self._lock:
+            pool = self._memory.get(key)
+            if pool is None:
+                pool = []
+                self._remember(key, pool)
+            pool.append((response, now + ttl))
+
+            self._db.execute(
+                "INSERT INTO responses (key, response, size, created_at, expires_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (key, response, size, now, now + ttl),
+            )
+            self._disk_bytes += size
+            if self._disk_bytes > self.max_disk_bytes:
+                self._evict(now)
+            self._db.commit()
+
+    def _remember(self, key: str, pool: list):
+        self._memory[key] = pool
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    def _stored_bytes(self) -> int:
+        """Size of the disk tier; also picks up rows other processes added"""
+        (total,) = self._db.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM responses"
+        ).fetchone()
+        return total
+
+    def _evict(self, now: float):
+        """Drop expired rows, then the oldest rows until under EVICT_TO"""
+        self._db.execute("DELETE FROM responses WHERE expires_at <= ?", (now,))
+        self._disk_bytes = self._stored_bytes()
+        target = int(self.max_disk_bytes * EVICT_TO)
+        if self._disk_bytes <= target:
+            return
+
+        doomed = []
+        for rowid, size in self._db.execute(
+            "SELECT rowid, size FROM responses ORDER BY created_at"
+        ):
+            doomed.append((rowid,))
+            self._disk_bytes -= size
+            if self._disk_bytes <= target:
+                break
+        self._db.executemany("DELETE FROM responses WHERE rowid = ?", doomed)
+        # Evicted rows may still be pooled in memory; let them reload from disk
+        self._memory.clear()
+
+
+class CachingProvider(LLMProvider):
+    """Provider wrapper that serves cacheable call sites from a ResponseCache
+
+    Call sites without a policy always go to the wrapped provider.
+    """
+
+    def __init__(
+        self,
+        provider: LLMProvider,
+        cache: ResponseCache,
+        policies: Dict[str, CachePolicy] = None,
+    ):
+        self.provider = provider
+        self.cache = cache
+        self.policies = DEFAULT_CACHE_POLICIES if policies is None else policies
+        # Prompt-cache stats are kept by the wrapped provider
+        self.cache_stats = provider.cache_stats
+
+    def make_call(
+        self,
+        messages: List[Dict[str, str]],
+        max_tokens: int = 1000,
+        call_site: str = None,
+        model: str = None,
+    ) -> str:
+        """Serve from the cache when the call site allows it"""
+        policy = self.policies.get(call_site)
+        if policy is None:
+            return self.provider.make_call(messages, max_tokens, call_site, model)
+
+        key = self.cache.make_key(
+            type(base_provider(self.provider)).__name__,
+            base_provider(self.provider).model_for(model),
+            messages,
+            max_tokens,
+        )
+        pool = self.cache.get(key)
+        if len(pool) >= policy.variety:
+            return random.choice(pool)
+
+        response = self.provider.make_call(messages, max_tokens, call_site, model)
+        if not is_error_response(response):
+            self.cache.add(key, response, policy.ttl)
+        return response
+
+    def stream_call(
+        self,
+        messages: List[Dict[str, str]],
+        max_tokens: int = 1000,
+        call_site: str = None,
+        model: str = None,
+    ) -> Iterator[str]:
+        """Stream uncached call sites; cached ones arrive as a single chunk"""
+        if call_site in self.policies:
+            yield self.make_call(messages, max_tokens, call_site, model)
+        else:
+            yield from self.provider.stream_call(messages, max_tokens, call_site, model)
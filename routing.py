@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+Model Routing
+Maps each trainer call site to a model tier, and optionally moves a site to
+the fast tier while its recent latency is over budget
+"""
+
+import threading
+import time
+from typing import Dict
+
+from hedging import LatencyTracker
+
+FAST = "fast"
+STANDARD = "standard"
+
+# Short structured outputs go to the fast tier; the customer persona and the
+# feedback report stay on the standard model
+DEFAULT_TIERS = {
+    "opening_line": STANDARD,
+    "customer_reply": STANDARD,
+    "assessment": FAST,
+    "summary": FAST,
+    "feedback": STANDARD,
+    "feedback_synthesis": STANDARD,
+    "batch_grading": STANDARD,
+}
+
+# Seconds to the first chunk (streamed sites) or full response, at p90
+DEFAULT_LATENCY_BUDGETS = {
+    "opening_line": 6.0,
+    "customer_reply": 2.0,
+    "assessment": 4.0,
+    "summary": 8.0,
+}
+
+
+def parse_tiers(pairs) -> Dict[str, str]:
+    """{"site": "tier"} from "SITE=TIER" strings (CLI --model-tier values)"""
+    tiers = {}
+    for pair in pairs or []:
+        site, separator, tier = pair.partition("=")
+        if not separator or not site.strip() or not tier.strip():
+            raise ValueError(f"Expected SITE=TIER, got {pair!r}")
+        tiers[site.strip()] = tier.strip()
+    return tiers
+
+
+class ModelRouter:
+    """Chooses the tier (or model id) for each call site
+
+    Scenario overrides win over the router's own tiers, which win over
+    DEFAULT_TIERS; unknown sites use the standard tier. In adaptive mode,
+    a site on the standard tier whose rolling p90 latency exceeds its budget
+    is downgraded to the fast tier for recovery_seconds, after which it is
+    tried on its configured tier again.
+
+    Args:
+        tiers: Call site -> tier name or model id, over DEFAULT_TIERS
+        latency_budgets: Call site -> seconds, over DEFAULT_LATENCY_BUDGETS
+        adaptive: Downgrade sites that are over their latency budget
+        window: Latencies kept per site
+        min_samples: Latencies needed before a site can be downgraded
+        recovery_seconds: How long a downgrade lasts
+    """
+
+    def __init__(
+        self,
+        tiers: Dict[str, str] = None,
+        latency_budgets: Dict[str, float] = None,
+        adaptive: bool = False,
+        window: int = 20,
+        min_samples: int = 5,
+        recovery_seconds: float = 300.0,
+    ):
+        self.tiers = {**DEFAULT_TIERS, **(tiers or {})}
+        self.latency_budgets = {**DEFAULT_LATENCY_BUDGETS, **(latency_budgets or {})}
+        self.adaptive = adaptive
+        self.window = window
+        self.min_samples = min_samples
+        self.recovery_seconds = recovery_seconds
+        self.stats = {"downgrades": 0, "downgraded_calls": 0}
+        self._trackers: Dict[str, LatencyTracker] = {}
+        self._downgraded_until: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def tier_for(self, call_site: str, overrides: Dict[str, str] = None) -> str:
+        """Tier name or model id for a call site"""
+        tier = (overrides or {}).get(call_site) or self.tiers.get(call_site, STANDARD)
+        if self.adaptive and tier == STANDARD:
+            with self._lock:
+                until = self._downgraded_until.get(call_site)
+                if until is not None:
+                    if time.monotonic() < until:
+                        self.stats["downgraded_calls"] += 1
+                        return FAST
+                    # Recovered: judge the configured tier on fresh samples
+                    del self._downgraded_until[call_site]
+                    self._trackers.pop(call_site, None)
+        return tier
+
+    def record(self, call_site: str, tier: str, seconds: float, ok: bool = True):
+        """Record a call's latency, downgrading its site if over budget
+
+        Only calls on the standard tier count; a downgraded site's fast-tier
+        latencies say nothing about whether the standard model recovered.
+        """
+        budget = self.latency_budgets.get(call_site)
+        if not self.adaptive or budget is None or tier != STANDARD:
+            return
+        with self._lock:
+            tracker = self._trackers.get(call_site)
+            if tracker is None:
+                tracker = LatencyTracker(self.window, self.min_samples)
+                self._trackers[call_site] = tracker
+        tracker.record(seconds, ok)
+        latency = tracker.percentile(0.9)
+        if latency is not None and latency > budget:
+            with self._lock:
+                if call_site not in self._downgraded_until:
+                    self.stats["downgrades"] += 1
+                self._downgraded_until[call_site] = (
+                    time.monotonic() + self.recovery_seconds
+                )
+
+    def downgraded(self) -> Dict[str, float]:
+        """Downgraded call sites -> seconds until they're retried"""
+        now = time.monotonic()
+        with self._lock:
+            return {
+                site: round(until - now, 1)
+                for site, until in self._downgraded_until.items()
+                if until > now
+            }
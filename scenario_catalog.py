@@ -0,0 +1,218 @@
+#!/usr/bin/env python3
+"""
+Scenario Catalog
+Roleplay scenarios loaded from TOML files, indexed on disk and built lazily
+"""
+
+import hashlib
+import json
+import os
+import threading
+import tomllib
+from string import Template
+from typing import Any, Dict, List
+
+from topic_filter import TopicFilter
+
+DEFAULT_SCENARIO_DIR = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "scenarios"
+)
+DEFAULT_INDEX_DIR = os.path.join(
+    os.path.expanduser("~"), ".cache", "ai-roleplay-trainer"
+)
+DEFAULT_SCENARIO_ID = "billing_dispute"
+
+# Scenario fields copied into the index, so listing never opens scenario files
+INDEX_FIELDS = ("id", "title", "tags", "difficulty")
+
+
+class Scenario:
+    """One fully loaded scenario with its prompts rendered
+
+    Instances are shared read-only by every session that selects the
+    scenario. Templates are rendered once at load; the per-turn template is
+    kept pre-split around the representative's text.
+    """
+
+    def __init__(self, data: Dict[str, Any]):
+        self.id = data["id"]
+        self.title = data["title"]
+        self.tags = list(data.get("tags", []))
+        self.difficulty = data.get("difficulty", "")
+        self.company_briefing = data["company_briefing"]
+        self.customer_background = data["customer_background"]
+        self.success_criteria = data["success_criteria"]
+        # Call site -> model tier or model id, over the trainer's routing
+        self.model_tiers = dict(data.get("model_tiers", {}))
+
+        variables = {
+            "title": self.title,
+            "customer_name": self.customer_background["name"],
+            "company_name": self.company_briefing["company_name"],
+            **data.get("variables", {}),
+        }
+        prompts = data["prompts"]
+        self.persona_prompt = _render(prompts["persona"], variables)
+        self.opening_cue = _render(prompts["opening_cue"], variables)
+        self.coaching_context = _render(prompts["coaching_context"], variables)
+        # Split the turn template around the representative's text once, so
+        # each turn is a single join
+        self._turn_parts = _render(
+            prompts["turn"], {**variables, "representative_text": "\0"}
+        ).split("\0")
+
+        redirect = prompts.get("redirect")
+        self.topic_filter = TopicFilter.from_fields(
+            [
+                self.title,
+                self.company_briefing,
+                self.customer_background,
+                self.success_criteria,
+                self.persona_prompt,
+                self.coaching_context,
+                data.get("vocabulary", []),
+            ],
+            **({"redirect": _render(redirect, variables)} if redirect else {}),
+        )
+
+    @property
+    def customer_name(self) -> str:
+        return self.customer_background["name"]
+
+    def render_turn(self, representative_text: str) -> str:
+        """Instruction-wrapped message for one representative turn"""
+        return representative_text.join(self._turn_parts)
+
+    def parse_turn(self, content: str):
+        """Representative text from a message made by render_turn, else None"""
+        if len(self._turn_parts) != 2:
+            return None
+        head, tail = self._turn_parts
+        if not (content.startswith(head) and content.endswith(tail)):
+            return None
+        return content[len(head) : len(content) - len(tail)]
+
+    def briefing(self) -> Dict[str, Any]:
+        """Everything the trainee may see (no prompts)"""
+        return {
+            "id": self.id,
+            "title": self.title,
+            "tags": self.tags,
+            "difficulty": self.difficulty,
+            "company_briefing": self.company_briefing,
+            "customer_background": self.customer_background,
+            "success_criteria": self.success_criteria,
+        }
+
+
+def _render(text: str, variables: Dict[str, str]) -> str:
+    return Template(text.strip()).substitute(variables)
+
+
+class ScenarioCatalog:
+    """Directory of *.toml scenario files behind a compact on-disk index
+
+    The index (id, title, tags, difficulty per file) is stored as JSON and
+    only files whose size or mtime changed are re-read when it is refreshed.
+    Full scenarios are parsed on first selection and cached.
+
+    Args:
+        directory: Directory of scenario files
+        index_path: Where the index is kept. Defaults to a file under
+                   ~/.cache/ai-roleplay-trainer named after the directory.
+    """
+
+    def __init__(self, directory: str = DEFAULT_SCENARIO_DIR, index_path: str = None):
+        self.directory = os.path.abspath(directory)
+        if index_path is None:
+            digest = hashlib.sha256(self.directory.encode("utf-8")).hexdigest()[:12]
+            index_path = os.path.join(DEFAULT_INDEX_DIR, f"scenarios-{digest}.json")
+        self.index_path = index_path
+        self._index = None  # file name -> index entry
+        self._by_id = {}  # scenario id -> file name
+        self._loaded: Dict[str, Scenario] = {}
+        self._lock = threading.Lock()
+
+    def entries(self) -> List[Dict[str, Any]]:
+        """Index entries for every scenario, sorted by id"""
+        with self._lock:
+            self._ensure_index()
+            return sorted(
+                (
+                    {field: entry[field] for field in INDEX_FIELDS}
+                    for entry in self._index.values()
+                ),
+                key=lambda entry: entry["id"],
+            )
+
+    def get(self, scenario_id: str = None) -> Scenario:
+        """Load (once) and return a scenario
+
+        Raises:
+            ValueError: If no scenario has that id
+        """
+        scenario_id = scenario_id or DEFAULT_SCENARIO_ID
+        with self._lock:
+            scenario = self._loaded.get(scenario_id)
+            if scenario is None:
+                self._ensure_index()
+                file_name = self._by_id.get(scenario_id)
+                if file_name is None:
+                    raise ValueError(f"Unknown scenario: {scenario_id}")
+                scenario = Scenario(self._read(file_name))
+                self._loaded[scenario_id] = scenario
+            return scenario
+
+    def refresh(self):
+        """Pick up added, changed and removed scenario files"""
+        with self._lock:
+            self._index = None
+            self._loaded.clear()
+            self._ensure_index()
+
+    def _read(self, file_name: str) -> Dict[str, Any]:
+        with open(os.path.join(self.directory, file_name), "rb") as f:
+            return tomllib.load(f)
+
+    def _ensure_index(self):
+        if self._index is not None:
+            return
+
+        stored = {}
+        try:
+            with open(self.index_path, encoding="utf-8") as f:
+                stored = json.load(f)
+        except (OSError, ValueError):
+            pass
+
+        index = {}
+        changed = False
+        with os.scandir(self.directory) as files:
+            for entry in files:
+                if not entry.name.endswith(".toml") or not entry.is_file():
+                    continue
+                stat = entry.stat()
+                signature = [stat.st_size, stat.st_mtime_ns]
+                cached = stored.get(entry.name)
+                if cached is None or cached["signature"] != signature:
+                    data = self._read(entry.name)
+                    cached = {field: data.get(field) for field in INDEX_FIELDS}
+                    cached["signature"] = signature
+                    changed = True
+                index[entry.name] = cached
+        changed = changed or index.keys() != stored.keys()
+
+        if changed:
+            try:
+                os.makedirs(os.path.dirname(self.index_path), exist_ok=True)
+                with open(self.index_path + ".tmp", "w", encoding="utf-8") as f:
+                    json.dump(index, f, ensure_ascii=False)
+                os.replace(self.index_path + ".tmp", self.index_path)
+            except OSError:
+                pass  # A read-only cache only costs a re-scan next start
+
+        self._index = index
+        self._by_id = {entry["id"]: name for name, entry in index.items()}
+
+
+catalog = ScenarioCatalog()
@@ -0,0 +1,256 @@
+#!/usr/bin/env python3
+"""
+Rate Limit Scheduler
+Token-bucket limits on requests and tokens per minute, shared by every
+session using an API key, with priority classes per call site
+"""
+
+import heapq
+import itertools
+import os
+import threading
+import time
+from typing import Any, Dict, Iterator, List
+
+from conversation_context import estimate_tokens
+from llm_providers import LLMProvider, is_error_response
+
+# Lower numbers are served first. Live conversation beats background work.
+CALL_SITE_PRIORITIES = {
+    "opening_line": 0,
+    "customer_reply": 0,
+    "assessment": 1,  # Also carries the coaching hint
+    "summary": 1,
+    "feedback": 2,
+    "feedback_synthesis": 2,
+    "batch_grading": 3,
+}
+DEFAULT_PRIORITY = 2
+
+
+def _limit_from_env(name: str):
+    value = float(os.getenv(name, "0") or 0)
+    return value if value > 0 else None
+
+
+class TokenBucket:
+    """Continuously refilling allowance of `per_minute` units"""
+
+    def __init__(self, per_minute: float, capacity: float = None):
+        self.rate = per_minute / 60
+        self.capacity = max(capacity if capacity is not None else per_minute, 1)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float, now: float) -> float:
+        """Seconds until `amount` units are available (0 if they are now)"""
+        self._refill(now)
+        amount = min(amount, self.capacity)
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / self.rate
+
+    def take(self, amount: float) -> float:
+        """Take units (capped at capacity); returns the amount taken"""
+        amount = min(amount, self.capacity)
+        self.tokens -= amount
+        return amount
+
+    def refund(self, amount: float):
+        self.tokens = min(self.capacity, self.tokens + amount)
+
+
+class RateLimitScheduler:
+    """Grants capacity to queued calls in priority order
+
+    Calls wait in one queue ordered by call-site priority, then arrival. Only
+    the head of the queue may take from the buckets, so a queued customer
+    reply is never overtaken by background work. Token reservations cover
+    the estimated input plus max_tokens and are settled against the actual
+    response size afterwards.
+
+    Args:
+        requests_per_minute: Request limit, or None for no limit
+        tokens_per_minute: Input + output token limit, or None for no limit
+        burst_seconds: How many seconds of allowance a bucket can bank
+    """
+
+    def __init__(
+        self,
+        requests_per_minute: float = None,
+        tokens_per_minute: float = None,
+        burst_seconds: float = 60.0,
+    ):
+        self.buckets = {}
+        for name, per_minute in (
+            ("requests", requests_per_minute),
+            ("tokens", tokens_per_minute),
+        ):
+            if per_minute:
+                self.buckets[name] = TokenBucket(
+                    per_minute, per_minute * burst_seconds / 60
+                )
+        self.paused_until = 0.0
+        self._queue = []
+        self._order = itertools.count()
+        self._condition = threading.Condition()
+
+    @classmethod
+    def from_env(cls) -> "RateLimitScheduler":
+        """Limits from LLM_RATE_LIMIT_RPM and LLM_RATE_LIMIT_TPM (unset = none)"""
+        return cls(
+            _limit_from_env("LLM_RATE_LIMIT_RPM"), _limit_from_env("LLM_RATE_LIMIT_TPM")
+        )
+
+    def acquire(self, call_site: str, tokens: int) -> float:
+        """Block until this call may be sent
+
+        Returns:
+            Tokens reserved, to be settled with release()
+        """
+        entry = (
+            CALL_SITE_PRIORITIES.get(call_site, DEFAULT_PRIORITY),
+            next(self._order),
+        )
+        with self._condition:
+            heapq.heappush(self._queue, entry)
+            while True:
+                timeout = None
+                if self._queue[0] == entry:
+                    now = time.monotonic()
+                    timeout = max(
+                        [self.paused_until - now]
+                        + [
+                            bucket.wait_time(1 if name == "requests" else tokens, now)
+                            for name, bucket in self.buckets.items()
+                        ]
+                    )
+                    if timeout <= 0:
+                        break
+                self._condition.wait(timeout)
+
+            heapq.heappop(self._queue)
+            if "requests" in self.buckets:
+                self.buckets["requests"].take(1)
+            reserved = 0.0
+            if "tokens" in self.buckets:
+                reserved = self.buckets["tokens"].take(tokens)
+            # Let the next caller in line check the buckets
+            self._condition.notify_all()
+            return reserved
+
+    def release(self, reserved: float, used: int):
+        """Return the unused part of a token reservation"""
+        if reserved > used and "tokens" in self.buckets:
+            with self._condition:
+                self.buckets["tokens"].refund(reserved - used)
+                self._condition.notify_all()
+
+    def back_off(self, seconds: float):
+        """Hold every queued call for `seconds` (after the API rate-limits us)"""
+        with self._condition:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+            self._condition.notify_all()
+
+    def queued(self) -> int:
+        with self._condition:
+            return len(self._queue)
+
+
+def is_rate_limited(response: str) -> bool:
+    """Whether a provider error string reports an HTTP 429"""
+    return is_error_response(response) and (
+        "429" in response or "rate limit" in response.lower()
+    )
+
+
+class ScheduledProvider(LLMProvider):
+    """Provider wrapper that sends calls through a RateLimitScheduler
+
+    Calls the API still rate-limits are queued again behind an exponential
+    back-off instead of failing, up to max_retries times.
+    """
+
+    def __init__(
+        self,
+        provider: LLMProvider,
+        scheduler: RateLimitScheduler,
+        max_retries: int = 3,
+        retry_delay: float = 5.0,
+    ):
+        super().__init__()
+        self.provider = provider
+        self.scheduler = scheduler
+        self.model = getattr(provider, "model", "")
+        self.max_retries = max_retries
+        self.retry_delay = retry_delay
+        self.cache_stats = provider.cache_stats
+
+    @staticmethod
+    def _input_tokens(messages: List[Dict[str, str]]) -> int:
+        return sum(estimate_tokens(str(msg["content"])) for msg in messages)
+
+    def make_call(
+        self,
+        messages: List[Dict[str, str]],
+        max_tokens: int = 1000,
+        call_site: str = None,
+        model: str = None,
+    ) -> str:
+        """Wait for capacity at the call site's priority, then make the call"""
+        input_tokens = self._input_tokens(messages)
+        for attempt in range(self.max_retries + 1):
+            reserved = self.scheduler.acquire(call_site, input_tokens + max_tokens)
+            response = ""
+            try:
+                response = self.provider.make_call(
+                    messages, max_tokens, call_site, model
+                )
+            finally:
+                self.scheduler.release(
+                    reserved, input_tokens + estimate_tokens(response)
+                )
+            if not is_rate_limited(response) or attempt == self.max_retries:
+                return response
+            self.scheduler.back_off(self.retry_delay * 2**attempt)
+
+    def stream_call(
+        self,
+        messages: List[Dict[str, str]],
+        max_tokens: int = 1000,
+        call_site: str = None,
+        model: str = None,
+    ) -> Iterator[str]:
+        """Stream once capacity is granted; a rate-limited start is retried"""
+        input_tokens = self._input_tokens(messages)
+        for attempt in range(self.max_retries + 1):
+            reserved = self.scheduler.acquire(call_site, input_tokens + max_tokens)
+            output_chars = 0
+            try:
+                for chunk in self.provider.stream_call(
+                    messages, max_tokens, call_site, model
+                ):
+                    if (
+                        output_chars == 0
+                        and attempt < self.max_retries
+                        and is_rate_limited(chunk)
+                    ):
+                        break
+                    output_chars += len(chunk)
+                    yield chunk
+                else:
+                    return
+            finally:
+                self.scheduler.release(reserved, input_tokens + output_chars // 4 + 1)
+            self.scheduler.back_off(self.retry_delay * 2**attempt)
+
+    def submit_batch(self, requests: List[Dict[str, Any]]) -> str:
+        """Submit to the wrapped provider; batch endpoints have their own quota"""
+        return self.provider.submit_batch(requests)
+
+    def poll_batch(self, batch_id: str):
+        return self.provider.poll_batch(batch_id)
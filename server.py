@@ -0,0 +1,461 @@
+#!/usr/bin/env python3
+"""
+Training Server
+Hosts many trainer sessions in one process behind a local JSON HTTP API,
+parking idle sessions on disk until they are used again
+"""
+
+import contextlib
+import json
+import os
+import re
+import secrets
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict
+from urllib.parse import parse_qs, urlsplit
+
+from batching import BatchQueue
+from main import CustomerServiceTrainer
+from scenario_catalog import catalog
+
+DEFAULT_SESSION_DIR = os.path.join(
+    os.path.expanduser("~"), ".cache", "ai-roleplay-trainer", "sessions"
+)
+
+SESSION_ID = re.compile(r"^[A-Za-z0-9_-]{8,64}$")
+
+
+class UnknownSession(LookupError):
+    """No resident or parked session has this id"""
+
+
+class TrainingSession:
+    """A resident trainer and the lock serializing requests to it"""
+
+    def __init__(self, trainer: CustomerServiceTrainer):
+        self.trainer = trainer
+        self.lock = threading.Lock()
+        self.last_used = time.monotonic()
+        self.evicted = False
+
+
+class SessionManager:
+    """Keeps active sessions in memory and idle ones on disk
+
+    Sessions idle for longer than idle_seconds are serialized to
+    `<store_dir>/<session id>.json` and dropped from memory; the next request
+    for them restores the trainer transparently.
+
+    Args:
+        trainer_factory: Callable returning a fresh CustomerServiceTrainer,
+                        given optional trainer keyword arguments
+        store_dir: Directory evicted sessions are written to
+        idle_seconds: Inactivity after which a session is evicted
+    """
+
+    def __init__(
+        self,
+        trainer_factory: Callable[[], CustomerServiceTrainer],
+        store_dir: str = DEFAULT_SESSION_DIR,
+        idle_seconds: float = 600,
+    ):
+        self.trainer_factory = trainer_factory
+        self.store_dir = store_dir
+        self.idle_seconds = idle_seconds
+        self.stats = {"created": 0, "evicted": 0, "restored": 0}
+        # Session id -> future of feedback queued on a batch (in memory only)
+        self.feedback: Dict[str, Future] = {}
+        self._sessions: Dict[str, TrainingSession] = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        os.makedirs(store_dir, exist_ok=True)
+
+    def _path(self, session_id: str) -> str:
+        return os.path.join(self.store_dir, f"{session_id}.json")
+
+    def create(self, **trainer_options) -> str:
+        """Start a new session and return its id"""
+        session_id = secrets.token_urlsafe(16)
+        trainer = self.trainer_factory(**trainer_options)
+        with self._lock:
+            self._sessions[session_id] = TrainingSession(trainer)
+            self.stats["created"] += 1
+        return session_id
+
+    @contextlib.contextmanager
+    def session(self, session_id: str):
+        """Lock a session for one request, restoring it from disk if needed
+
+        Raises:
+            UnknownSession: If no such session exists
+        """
+        while True:
+            with self._lock:
+                session = self._sessions.get(session_id)
+                if session is None:
+                    session = self._restore(session_id)
+                session.last_used = time.monotonic()
+            with session.lock:
+                if session.evicted:
+                    continue  # Parked between lookup and lock; load it again
+                try:
+                    yield session.trainer
+                finally:
+                    session.last_used = time.monotonic()
+                return
+
+    def _restore(self, session_id: str) -> TrainingSession:
+        path = self._path(session_id)
+        if not SESSION_ID.match(session_id) or not os.path.exists(path):
+            raise UnknownSession(session_id)
+        with open(path, encoding="utf-8") as f:
+            state = json.load(f)
+        trainer = self.trainer_factory()
+        trainer.load_state(state)
+        os.remove(path)
+        session = self._sessions[session_id] = TrainingSession(trainer)
+        self.stats["restored"] += 1
+        return session
+
+    def delete(self, session_id: str):
+        """Discard a session, resident or parked"""
+        self.feedback.pop(session_id, None)
+        with self._lock:
+            session = self._sessions.pop(session_id, None)
+            if session is None:
+                if not SESSION_ID.match(session_id) or not os.path.exists(
+                    self._path(session_id)
+                ):
+                    raise UnknownSession(session_id)
+                os.remove(self._path(session_id))
+                return
+        # Outside the manager lock: a request may still be running on it
+        with session.lock:
+            session.evicted = True
+            session.trainer.close()
+
+    def evict_idle(self, idle_seconds: float = None) -> int:
+        """Park sessions idle for longer than idle_seconds; returns the count
+
+        Sessions busy with a request are skipped. Parking waits on pending
+        digest folds, so it runs outside the manager lock: other sessions'
+        requests carry on meanwhile.
+        """
+        if idle_seconds is None:
+            idle_seconds = self.idle_seconds
+        cutoff = time.monotonic() - idle_seconds
+        idle = []
+        with self._lock:
+            for session_id, session in self._sessions.items():
+                if session.last_used <= cutoff and session.lock.acquire(blocking=False):
+                    idle.append((session_id, session))
+        evicted = 0
+        for session_id, session in idle:
+            try:
+                evicted += self._park(session_id, session)
+            finally:
+                session.lock.release()
+        with self._lock:
+            self.stats["evicted"] += evicted
+        return evicted
+
+    def _park(self, session_id: str, session: TrainingSession) -> bool:
+        """Write a locked session to disk and drop it; False if it was deleted"""
+        state = session.trainer.to_state()
+        path = self._path(session_id)
+        with open(path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(state, f, ensure_ascii=False)
+        os.replace(path + ".tmp", path)
+        with self._lock:
+            if self._sessions.get(session_id) is not session:
+                os.remove(path)  # Deleted meanwhile; delete() closes it
+                return False
+            del self._sessions[session_id]
+        session.evicted = True
+        session.trainer.close()
+        return True
+
+    def resident(self) -> int:
+        with self._lock:
+            return len(self._sessions)
+
+    def start_sweeper(self, interval: float = None) -> threading.Thread:
+        """Evict idle sessions periodically in a daemon thread"""
+        interval = interval or max(self.idle_seconds / 4, 1)
+
+        def sweep():
+            while not self._stop.wait(interval):
+                self.evict_idle()
+
+        thread = threading.Thread(target=sweep, daemon=True)
+        thread.start()
+        return thread
+
+    def close(self):
+        """Stop sweeping and park every session, so a restart can resume them"""
+        self._stop.set()
+        self.evict_idle(idle_seconds=-1)
+
+
+class TrainingRequestHandler(BaseHTTPRequestHandler):
+    """JSON API over a SessionManager (see make_server for the routes)"""
+
+    protocol_version = "HTTP/1.1"
+    manager: SessionManager = None
+    batch: BatchQueue = None
+    routes = [
+        ("POST", re.compile(r"^/sessions$"), "create_session"),
+        ("GET", re.compile(r"^/sessions/([^/]+)$"), "get_session"),
+        ("DELETE", re.compile(r"^/sessions/([^/]+)$"), "delete_session"),
+        ("POST", re.compile(r"^/sessions/([^/]+)/start$"), "start"),
+        ("POST", re.compile(r"^/sessions/([^/]+)/respond$"), "respond"),
+        ("POST", re.compile(r"^/sessions/([^/]+)/coach$"), "coach"),
+        ("POST", re.compile(r"^/sessions/([^/]+)/end$"), "end"),
+        ("GET", re.compile(r"^/scenarios$"), "list_scenarios"),
+        ("GET", re.compile(r"^/scenarios/([^/]+)$"), "scenario"),
+        ("GET", re.compile(r"^/health$"), "health"),
+    ]
+
+    def do_GET(self):
+        self._dispatch("GET")
+
+    def do_POST(self):
+        self._dispatch("POST")
+
+    def do_DELETE(self):
+        self._dispatch("DELETE")
+
+    def log_message(self, format, *args):
+        pass  # One line per chat turn would drown the server log
+
+    def _dispatch(self, method: str):
+        url = urlsplit(self.path)
+        path = url.path
+        self.query = parse_qs(url.query, keep_blank_values=True)
+        for route_method, pattern, handler_name in self.routes:
+            match = pattern.match(path)
+            if match and route_method == method:
+                try:
+                    getattr(self, handler_name)(*match.groups())
+                except UnknownSession:
+                    self._send_json(404, {"error": "Unknown session"})
+                except (ValueError, json.JSONDecodeError) as e:
+                    self._send_json(400, {"error": str(e)})
+                return
+        self._send_json(404, {"error": f"No route for {method} {path}"})
+
+    def _read_json(self) -> Dict:
+        length = int(self.headers.get("Content-Length") or 0)
+        if not length:
+            return {}
+        return json.loads(self.rfile.read(length))
+
+    def _send_json(self, status: int, payload: Dict):
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def create_session(self):
+        body = self._read_json()
+        options = {}
+        if body.get("scenario") is not None:
+            catalog.get(body["scenario"])  # ValueError (400) if unknown
+            options["scenario_id"] = body["scenario"]
+        if body.get("trainee") is not None:
+            options["trainee"] = str(body["trainee"])
+        session_id = self.manager.create(**options)
+        self._send_json(201, {"session_id": session_id})
+
+    def get_session(self, session_id):
+        with self.manager.session(session_id) as trainer:
+            payload = {
+                "session_id": session_id,
+                "scenario": trainer.scenario.id,
+                "scenario_active": trainer.scenario_active,
+                "transcript": trainer.format_conversation_for_review(),
+                "assessments": trainer.assessor.to_list(),
+            }
+        feedback = self.manager.feedback.get(session_id)
+        if feedback is not None:
+            payload["feedback"] = feedback.result() if feedback.done() else None
+        self._send_json(200, payload)
+
+    def delete_session(self, session_id):
+        self.manager.delete(session_id)
+        self._send_json(200, {"deleted": session_id})
+
+    def start(self, session_id):
+        with self.manager.session(session_id) as trainer:
+            if trainer.scenario_active:
+                self._send_json(409, {"error": "Scenario already active"})
+                return
+            customer = trainer.start_scenario(interactive=False)
+        self._send_json(200, {"customer": customer})
+
+    def respond(self, session_id):
+        body = self._read_json()
+        text = body.get("text", "").strip()
+        if not text:
+            raise ValueError('Request body needs a non-empty "text"')
+        with self.manager.session(session_id) as trainer:
+            if not trainer.scenario_active:
+                self._send_json(409, {"error": "No active scenario"})
+                return
+            # Any hint still in flight is about an exchange the trainee has moved past
+            trainer.cancel_coaching_hint()
+            if "stream" in self.query or body.get("stream"):
+                self._stream_reply(trainer.stream_user_response(text))
+            else:
+                self._send_json(200, {"customer": trainer.handle_user_response(text)})
+
+    def _stream_reply(self, chunks):
+        """Send the customer's reply as a chunked text/plain body"""
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; charset=utf-8")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        connected = True
+        # Drain the whole stream even if the client leaves, so the session's
+        # history still records the reply
+        for chunk in chunks:
+            data = chunk.encode("utf-8")
+            if not connected or not data:
+                continue
+            try:
+                self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+                self.wfile.flush()
+            except OSError:
+                connected = False
+        if connected:
+            self.wfile.write(b"0\r\n\r\n")
+
+    def coach(self, session_id):
+        with self.manager.session(session_id) as trainer:
+            hint = trainer.analyze_conversation_for_coaching()
+        self._send_json(200, {"hint": hint})
+
+    def end(self, session_id):
+        with self.manager.session(session_id) as trainer:
+            if not trainer.scenario_active:
+                self._send_json(409, {"error": "No active scenario"})
+                return
+            trainer.cancel_coaching_hint()
+            if self.batch is not None:
+                self.manager.feedback[session_id] = trainer.request_feedback(self.batch)
+                trainer.reset_scenario()
+                self._send_json(202, {"feedback": None})
+                return
+            feedback = trainer.end_scenario_with_feedback()
+            trainer.reset_scenario()
+        self._send_json(200, {"feedback": feedback})
+
+    def list_scenarios(self):
+        self._send_json(200, {"scenarios": catalog.entries()})
+
+    def scenario(self, scenario_id):
+        try:
+            briefing = catalog.get(scenario_id).briefing()
+        except ValueError:
+            self._send_json(404, {"error": "Unknown scenario"})
+            return
+        self._send_json(200, briefing)
+
+    def health(self):
+        self._send_json(
+            200, {"resident_sessions": self.manager.resident(), **self.manager.stats}
+        )
+
+
+def make_server(
+    trainer_options: Dict = None,
+    host: str = "127.0.0.1",
+    port: int = 8765,
+    store_dir: str = DEFAULT_SESSION_DIR,
+    idle_seconds: float = 600,
+    background_workers: int = 32,
+    batch_feedback: bool = False,
+) -> ThreadingHTTPServer:
+    """Build the training server
+
+    Every session shares one provider (and response cache) and one background
+    executor. Routes, all JSON unless noted:
+
+        POST   /sessions                 {"scenario"?, "trainee"?}
+                                         -> {"session_id"}
+        GET    /sessions/<id>            -> {"scenario", "scenario_active",
+                                             "transcript", "assessments",
+                                             "feedback"?}
+        DELETE /sessions/<id>
+        POST   /sessions/<id>/start      -> {"customer"} (opening line)
+        POST   /sessions/<id>/respond    {"text"} -> {"customer"}
+               (?stream or {"stream": true} sends the reply as chunked text)
+        POST   /sessions/<id>/coach      -> {"hint"}
+        POST   /sessions/<id>/end        -> {"feedback"}
+               (with batch_feedback: 202, and feedback appears on the
+               session once its batch finishes)
+        GET    /scenarios                -> catalog index entries
+        GET    /scenarios/<id>           -> briefing shown to trainees
+        GET    /health                   -> session counts
+
+    Args:
+        trainer_options: CustomerServiceTrainer keyword arguments
+        host: Interface to bind
+        port: Port to bind
+        store_dir: Directory idle sessions are parked in
+        idle_seconds: Inactivity after which a session is parked
+        background_workers: Size of the shared background executor
+        batch_feedback: Queue end-of-session feedback on the provider's
+                       batch endpoint instead of answering /end with it.
+                       Feedback still pending when the server stops is lost.
+    """
+    trainer_options = dict(trainer_options or {})
+    background = ThreadPoolExecutor(max_workers=background_workers)
+
+    # Build the provider stack (registry provider, response cache) once
+    shared = CustomerServiceTrainer(background=background, **trainer_options)
+    trainer_options.update(provider=shared.llm_provider, use_cache=False)
+    shared.close()
+
+    manager = SessionManager(
+        lambda **options: CustomerServiceTrainer(
+            background=background, **{**trainer_options, **options}
+        ),
+        store_dir=store_dir,
+        idle_seconds=idle_seconds,
+    )
+    handler = type(
+        "BoundTrainingRequestHandler",
+        (TrainingRequestHandler,),
+        {
+            "manager": manager,
+            "batch": BatchQueue(shared.llm_provider) if batch_feedback else None,
+        },
+    )
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    server.manager = manager
+    server.batch = handler.batch
+    return server
+
+
+def serve(server: ThreadingHTTPServer):
+    """Run until interrupted, then park every session on disk"""
+    host, port = server.server_address[:2]
+    print(f"Training server listening on http://{host}:{port}")
+    server.manager.start_sweeper()
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        server.manager.close()
+        if server.batch is not None:
+            server.batch.close(wait=False)
+        print(f"Parked sessions in {server.manager.store_dir}")
@@ -0,0 +1,285 @@
+#!/usr/bin/env python3
+"""
+Stand-in LLM Server
+Local HTTP server speaking the Anthropic Messages API, answering from a
+replay fixture with configurable latency and error rate, for load tests
+"""
+
+import argparse
+import itertools
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict
+
+from llm_providers import DEFAULT_REPLAY_FIXTURE, ReplayProvider
+
+
+class StandInRequestHandler(BaseHTTPRequestHandler):
+    """POST /v1/messages (plain or streamed), GET /stats, HEAD for warm-up"""
+
+    protocol_version = "HTTP/1.1"  # Keep-alive, like the real API
+    replay: ReplayProvider = None
+    error_rate: float = 0.0
+    stats: "StandInStats" = None
+    message_id: str = None  # Request whose service time is still unrecorded
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_HEAD(self):
+        self.send_response(200)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def do_GET(self):
+        if self.path == "/stats":
+            self._send_json(200, self.stats.to_dict())
+        else:
+            self._send_json(404, _error("not_found_error", f"No route {self.path}"))
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        body = json.loads(self.rfile.read(length) or b"{}")
+        if self.path.split("?")[0] != "/v1/messages":
+            self._send_json(404, _error("not_found_error", f"No route {self.path}"))
+            return
+
+        message_id = self.message_id = self.stats.start()
+        self.started = time.perf_counter()
+        try:
+            if random.random() < self.error_rate:
+                self._send_json(
+                    529,
+                    _error("overloaded_error", "Stand-in server is overloaded"),
+                    message_id,
+                )
+                return
+            messages = _flatten(body)
+            chunks = self.replay.stream_call(messages, body.get("max_tokens", 1000))
+            if body.get("stream"):
+                self._stream(message_id, body, messages, chunks)
+            else:
+                text = "".join(chunks)
+                self._send_json(
+                    200,
+                    {
+                        "id": message_id,
+                        "type": "message",
+                        "role": "assistant",
+                        "model": body.get("model", "stand-in"),
+                        "content": [{"type": "text", "text": text}],
+                        "stop_reason": "end_turn",
+                        "stop_sequence": None,
+                        "usage": _usage(messages, text),
+                    },
+                    message_id,
+                )
+        finally:
+            self._finish(False)  # Only if the response failed midway
+
+    def _stream(self, message_id, body, messages, chunks):
+        """Send the reply as Messages API server-sent events"""
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.send_header("request-id", message_id)
+        self.end_headers()
+        self._event(
+            "message_start",
+            {
+                "message": {
+                    "id": message_id,
+                    "type": "message",
+                    "role": "assistant",
+                    "model": body.get("model", "stand-in"),
+                    "content": [],
+                    "stop_reason": None,
+                    "stop_sequence": None,
+                    "usage": _usage(messages, ""),
+                }
+            },
+        )
+        self._event(
+            "content_block_start",
+            {"index": 0, "content_block": {"type": "text", "text": ""}},
+        )
+        text = []
+        for chunk in chunks:
+            text.append(chunk)
+            self._event(
+                "content_block_delta",
+                {"index": 0, "delta": {"type": "text_delta", "text": chunk}},
+            )
+        self._event("content_block_stop", {"index": 0})
+        output_tokens = _usage(messages, "".join(text))["output_tokens"]
+        self._event(
+            "message_delta",
+            {
+                "delta": {"stop_reason": "end_turn", "stop_sequence": None},
+                "usage": {"output_tokens": output_tokens},
+            },
+        )
+        self._finish(True)
+        self._event("message_stop", {})
+        self.wfile.write(b"0\r\n\r\n")
+
+    def _event(self, kind: str, data: Dict):
+        payload = f"event: {kind}\ndata: {json.dumps({'type': kind, **data})}\n\n"
+        data = payload.encode("utf-8")
+        self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+        self.wfile.flush()
+
+    def _send_json(self, status: int, payload: Dict, request_id: str = None):
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        if request_id:
+            self.send_header("request-id", request_id)
+        self.end_headers()
+        self._finish(status < 400)
+        self.wfile.write(body)
+
+    def _finish(self, ok: bool):
+        """Record the request's service time before its last bytes are sent,
+        so a client never finishes reading a response missing from the stats
+        """
+        if self.message_id is not None:
+            self.stats.finish(self.message_id, time.perf_counter() - self.started, ok)
+            self.message_id = None
+
+
+class StandInStats:
+    """Request counts and per-request service time, keyed by message id"""
+
+    def __init__(self):
+        self.requests = 0
+        self.errors = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.service_times: Dict[str, float] = {}
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def start(self) -> str:
+        with self._lock:
+            self.requests += 1
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+            return f"msg_standin_{next(self._ids):08d}"
+
+    def finish(self, message_id: str, seconds: float, ok: bool):
+        with self._lock:
+            self.in_flight -= 1
+            self.errors += not ok
+            self.service_times[message_id] = seconds
+
+    def to_dict(self) -> Dict:
+        with self._lock:
+            return {
+                "requests": self.requests,
+                "errors": self.errors,
+                "in_flight": self.in_flight,
+                "max_in_flight": self.max_in_flight,
+                "service_times": dict(self.service_times),
+            }
+
+
+def _flatten(body: Dict):
+    """Messages API request -> the plain message list ReplayProvider matches on"""
+    system = body.get("system") or []
+    if isinstance(system, str):
+        system = [{"text": system}]
+    messages = [{"role": "system", "content": block["text"]} for block in system]
+    for msg in body.get("messages", []):
+        content = msg["content"]
+        if not isinstance(content, str):
+            content = "".join(block.get("text", "") for block in content)
+        messages.append({"role": msg["role"], "content": content})
+    return messages
+
+
+def _usage(messages, text: str) -> Dict[str, int]:
+    # About 4 characters per token, as the replay provider estimates
+    return {
+        "input_tokens": sum(len(msg["content"]) for msg in messages) // 4,
+        "output_tokens": len(text) // 4,
+    }
+
+
+def _error(kind: str, message: str) -> Dict:
+    return {"type": "error", "error": {"type": kind, "message": message}}
+
+
+def make_standin_server(
+    fixture_path: str = DEFAULT_REPLAY_FIXTURE,
+    latency="recorded",
+    error_rate: float = 0.0,
+    host: str = "127.0.0.1",
+    port: int = 0,
+) -> ThreadingHTTPServer:
+    """Build the stand-in server (port 0 picks a free port)
+
+    Args:
+        fixture_path: Replay fixture the responses come from
+        latency: ReplayProvider latency model: seconds before each response,
+                "recorded" to sample recorded time-to-first-token and
+                throughput, or None for none
+        error_rate: Fraction of requests answered with 529 overloaded
+    """
+    handler = type(
+        "BoundStandInRequestHandler",
+        (StandInRequestHandler,),
+        {
+            "replay": ReplayProvider(fixture_path, latency=latency),
+            "error_rate": error_rate,
+            "stats": StandInStats(),
+        },
+    )
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    server.stats = handler.stats
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stand-in Anthropic API server")
+    parser.add_argument("--host", default="127.0.0.1", help="Interface to bind")
+    parser.add_argument(
+        "--port", type=int, default=8766, help="Port to bind (0 for any free port)"
+    )
+    parser.add_argument(
+        "--fixture", default=DEFAULT_REPLAY_FIXTURE, help="Replay fixture file"
+    )
+    parser.add_argument(
+        "--latency",
+        default="recorded",
+        help="Seconds before each response, or 'recorded' (default) to sample "
+        "the fixture's timings",
+    )
+    parser.add_argument(
+        "--error-rate",
+        type=float,
+        default=0.0,
+        help="Fraction of requests answered with 529 overloaded (default: 0)",
+    )
+    args = parser.parse_args()
+
+    server = make_standin_server(
+        args.fixture, args.latency, args.error_rate, args.host, args.port
+    )
+    host, port = server.server_address[:2]
+    print(f"Stand-in LLM server listening on http://{host}:{port}", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,234 @@
+#!/usr/bin/env python3
+"""
+Call Telemetry
+Structured per-call records emitted by LLM providers, and pluggable sinks
+(JSONL file, Prometheus text format, in-process histogram summary)
+"""
+
+import json
+import os
+import threading
+import time
+from dataclasses import asdict, dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, List, Optional
+
+# Latency histogram bucket upper bounds, in seconds
+LATENCY_BUCKETS = (0.1, 0.25, 0.5, 1, 2, 4, 8, 16, 32, 64)
+
+
+@dataclass
+class CallRecord:
+    """One provider API call"""
+
+    provider: str
+    model: str
+    call_site: Optional[str]
+    latency: float  # Seconds from request to full response
+    ttft: Optional[float] = None  # Seconds to first streamed chunk
+    input_tokens: int = 0
+    output_tokens: int = 0
+    cached_tokens: int = 0
+    request_id: Optional[str] = None
+    error: Optional[str] = None
+    streamed: bool = False
+    timestamp: float = field(default_factory=time.time)
+
+
+_sinks: List[Callable[[CallRecord], None]] = []
+
+
+def add_sink(sink: Callable[[CallRecord], None]):
+    """Register a callable that receives every CallRecord in this process"""
+    _sinks.append(sink)
+
+
+def remove_sink(sink: Callable[[CallRecord], None]):
+    if sink in _sinks:
+        _sinks.remove(sink)
+
+
+def emit(record: CallRecord):
+    """Send a record to every sink; a failing sink never breaks the call"""
+    for sink in list(_sinks):
+        try:
+            sink(record)
+        except Exception:
+            pass
+
+
+class JsonlSink:
+    """Appends each record as a JSON line"""
+
+    def __init__(self, path: str):
+        self._file = open(path, "a", encoding="utf-8")
+        self._lock = threading.Lock()
+
+    def __call__(self, record: CallRecord):
+        line = json.dumps(asdict(record), ensure_ascii=False)
+        with self._lock:
+            self._file.write(line + "\n")
+            self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+
+class PrometheusSink:
+    """Aggregates records into Prometheus text exposition format
+
+    Metrics are written to `path` after every call (for a node-exporter
+    textfile collector; replaced atomically, so a scrape never sees a
+    partial file) and/or served at http://127.0.0.1:<port>/metrics.
+    """
+
+    def __init__(self, path: str = None, port: int = None):
+        self.path = path
+        self._calls = {}  # (provider, model, call_site, status) -> count
+        self._tokens = {}  # (provider, model, kind) -> count
+        self._latency = {}  # (provider, model, call_site) -> bucket counts, sum
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()  # One writer of path + ".tmp"
+        self._server = None
+        if port is not None:
+            self._serve(port)
+
+    def __call__(self, record: CallRecord):
+        status = "error" if record.error else "ok"
+        site = record.call_site or "unknown"
+        with self._lock:
+            key = (record.provider, record.model, site, status)
+            self._calls[key] = self._calls.get(key, 0) + 1
+
+            for kind in ("input", "output", "cached"):
+                token_key = (record.provider, record.model, kind)
+                self._tokens[token_key] = self._tokens.get(token_key, 0) + getattr(
+                    record, f"{kind}_tokens"
+                )
+
+            if not record.error:
+                buckets, total = self._latency.get(
+                    (record.provider, record.model, site),
+                    ([0] * (len(LATENCY_BUCKETS) + 1), 0.0),
+                )
+                for position, bound in enumerate(LATENCY_BUCKETS):
+                    if record.latency <= bound:
+                        buckets[position] += 1
+                buckets[-1] += 1  # +Inf
+                self._latency[(record.provider, record.model, site)] = (
+                    buckets,
+                    total + record.latency,
+                )
+
+        if self.path:
+            with self._write_lock:
+                with open(self.path + ".tmp", "w", encoding="utf-8") as f:
+                    f.write(self.render())
+                os.replace(self.path + ".tmp", self.path)
+
+    def render(self) -> str:
+        """Current metrics in Prometheus text format"""
+        lines = [
+            "# HELP llm_calls_total LLM API calls by outcome",
+            "# TYPE llm_calls_total counter",
+        ]
+        with self._lock:
+            for (provider, model, site, status), count in sorted(self._calls.items()):
+                labels = f'provider="{provider}",model="{model}",call_site="{site}"'
+                lines.append(f'llm_calls_total{{{labels},status="{status}"}} {count}')
+
+            lines += [
+                "# HELP llm_tokens_total Tokens by kind",
+                "# TYPE llm_tokens_total counter",
+            ]
+            for (provider, model, kind), count in sorted(self._tokens.items()):
+                labels = f'provider="{provider}",model="{model}",kind="{kind}"'
+                lines.append(f"llm_tokens_total{{{labels}}} {count}")
+
+            lines += [
+                "# HELP llm_call_latency_seconds Wall latency of successful calls",
+                "# TYPE llm_call_latency_seconds histogram",
+            ]
+            for (provider, model, site), (buckets, total) in sorted(
+                self._latency.items()
+            ):
+                labels = f'provider="{provider}",model="{model}",call_site="{site}"'
+                metric = "llm_call_latency_seconds"
+                for bound, count in zip(LATENCY_BUCKETS + ("+Inf",), buckets):
+                    lines.append(f'{metric}_bucket{{{labels},le="{bound}"}} {count}')
+                lines.append(f"{metric}_sum{{{labels}}} {total:.6f}")
+                lines.append(f"{metric}_count{{{labels}}} {buckets[-1]}")
+        return "\n".join(lines) + "\n"
+
+    def _serve(self, port: int):
+        sink = self
+
+        class MetricsHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                body = sink.render().encode("utf-8")
+                self.send_response(200 if self.path == "/metrics" else 404)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass  # Keep scrapes out of the trainee's terminal
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", port), MetricsHandler)
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+
+    def close(self):
+        if self._server is not None:
+            self._server.shutdown()
+
+
+class HistogramSink:
+    """Keeps records in memory and summarizes them per call site"""
+
+    def __init__(self):
+        self.records: List[CallRecord] = []
+        self._lock = threading.Lock()
+
+    def __call__(self, record: CallRecord):
+        with self._lock:
+            self.records.append(record)
+
+    def summary(self) -> str:
+        """Table of latency percentiles, TTFT and tokens per call site"""
+        with self._lock:
+            records = list(self.records)
+        if not records:
+            return "No LLM calls recorded."
+
+        lines = [
+            f"{'call site':<16}{'calls':>6}{'errors':>7}{'p50 s':>8}{'p95 s':>8}"
+            f"{'max s':>8}{'ttft p50':>9}{'in tok':>9}{'out tok':>9}{'cached':>9}"
+        ]
+        sites = sorted({r.call_site or "unknown" for r in records})
+        for site in sites:
+            site_records = [r for r in records if (r.call_site or "unknown") == site]
+            ok = [r for r in site_records if not r.error]
+            latencies = sorted(r.latency for r in ok)
+            ttfts = sorted(r.ttft for r in ok if r.ttft is not None)
+            lines.append(
+                f"{site:<16}{len(site_records):>6}{len(site_records) - len(ok):>7}"
+                f"{_format_seconds(_percentile(latencies, 0.50)):>8}"
+                f"{_format_seconds(_percentile(latencies, 0.95)):>8}"
+                f"{_format_seconds(latencies[-1] if latencies else None):>8}"
+                f"{_format_seconds(_percentile(ttfts, 0.50)):>9}"
+                f"{sum(r.input_tokens for r in site_records):>9}"
+                f"{sum(r.output_tokens for r in site_records):>9}"
+                f"{sum(r.cached_tokens for r in site_records):>9}"
+            )
+        return "\n".join(lines)
+
+
+def _percentile(ordered: List[float], fraction: float):
+    if not ordered:
+        return None
+    return ordered[min(int(fraction * len(ordered)), len(ordered) - 1)]
+
+
+def _format_seconds(value) -> str:
+    return "-" if value is None else f"{value:.2f}"
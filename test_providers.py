@@ -3,7 +3,91 @@
 Test script to verify LLM providers work correctly
 """
 
-from llm_providers import create_provider, AnthropicProvider, OpenAIProvider
+import asyncio
+import json
+import os
+import tempfile
+import threading
+import time
+from types import SimpleNamespace
+
+from llm_providers import (
+    create_provider,
+    AnthropicProvider,
+    OpenAIProvider,
+    LLMProvider,
+    RecordingProvider,
+    ReplayProvider,
+    DEFAULT_REPLAY_FIXTURE,
+    is_error_response,
+)
+from hedging import HedgedProvider
+from scheduler import RateLimitScheduler, ScheduledProvider
+import telemetry
+from response_cache import CachePolicy, CachingProvider, ResponseCache
+
+
+class CountingProvider(LLMProvider):
+    """Offline provider that numbers its responses"""
+
+    def __init__(self):
+        super().__init__()
+        self.model = "counting"
+        self.calls = 0
+
+    def make_call(self, messages, max_tokens=1000, call_site=None, model=None):
+        self.calls += 1
+        return f"response {self.calls}"
+
+
+class SlowProvider(LLMProvider):
+    """Offline provider that answers after a fixed delay"""
+
+    def __init__(self, name, delay, fail=False):
+        super().__init__()
+        self.model = name
+        self.delay = delay
+        self.fail = fail
+
+    def make_call(self, messages, max_tokens=1000, call_site=None, model=None):
+        time.sleep(self.delay)
+        if self.fail:
+            return f"Error making {self.model} API call: unavailable"
+        return self.model
+
+
+class FakeResponsesClient:
+    """Offline stand-in for the OpenAI client's responses endpoint
+
+    Stored responses can be forgotten to simulate an expired chain.
+    """
+
+    class NotFound(Exception):
+        status_code = 404
+
+    def __init__(self):
+        self.responses = self
+        self.requests = []
+        self.stored = set()
+
+    def create(self, **request):
+        self.requests.append(request)
+        previous = request.get("previous_response_id")
+        if previous is not None and previous not in self.stored:
+            raise self.NotFound(f"Previous response with id '{previous}' not found.")
+        response_id = f"resp_{len(self.requests)}"
+        self.stored.add(response_id)
+        response = SimpleNamespace(
+            id=response_id, output_text=f"reply {len(self.requests)}", usage=None
+        )
+        if request.get("stream"):
+            return [
+                SimpleNamespace(
+                    type="response.output_text.delta", delta=response.output_text
+                ),
+                SimpleNamespace(type="response.completed", response=response),
+            ]
+        return response
 
 
 def test_provider_creation():
@@ -61,6 +145,697 @@ def test_simple_api_calls():
         print(f"❌ OpenAI API call failed: {e}")
 
 
+def test_async_api_calls():
+    """Test concurrent calls through the async providers"""
+    print("\nTesting async API calls...")
+
+    message_sets = [
+        [{"role": "user", "content": f"Reply with the number {n} only."}]
+        for n in range(3)
+    ]
+
+    for name in ("anthropic", "openai"):
+        try:
+            provider = create_provider(name, async_mode=True)
+            responses = asyncio.run(
+                provider.make_calls(message_sets, max_tokens=20, max_concurrency=2)
+            )
+            print(f"✅ Async {name} responses: {[r[:20] for r in responses]}")
+        except Exception as e:
+            print(f"❌ Async {name} calls failed: {e}")
+
+
+def test_response_cache():
+    """Test that cacheable call sites are served from the response cache"""
+    print("\nTesting response cache...")
+
+    provider = CountingProvider()
+    cached = CachingProvider(
+        provider,
+        ResponseCache(":memory:"),
+        {"opening_line": CachePolicy(ttl=60, variety=2)},
+    )
+    messages = [{"role": "user", "content": "Open the call."}]
+
+    openings = {cached.make_call(messages, call_site="opening_line") for _ in range(10)}
+    assert provider.calls == 2, provider.calls
+    assert openings == {"response 1", "response 2"}, openings
+
+    cached.make_call(messages, call_site="customer_reply")
+    cached.make_call(messages, call_site="customer_reply")
+    assert provider.calls == 4, provider.calls
+
+    # The disk tier keeps a running size and trims the oldest rows when full
+    cache = ResponseCache(":memory:", max_disk_bytes=100)
+    for number in range(20):
+        cache.add(f"key {number}", "x" * 20, ttl=60)
+        assert cache._disk_bytes == cache._stored_bytes() <= 100
+    assert cache.get("key 19") and not cache.get("key 0")
+    print("✅ Opening lines served from a variety pool, live replies uncached")
+
+
+def test_record_and_replay():
+    """Test that recorded calls replay by request, then by call site"""
+    print("\nTesting record/replay...")
+
+    recorder = RecordingProvider(CountingProvider())
+    messages = [{"role": "user", "content": "Open the call."}]
+    recorder.make_call(messages, call_site="opening_line")
+    "".join(recorder.stream_call(messages + messages, call_site="customer_reply"))
+
+    with tempfile.TemporaryDirectory() as directory:
+        fixture = os.path.join(directory, "fixture.json")
+        recorder.save(fixture)
+        with open(fixture, encoding="utf-8") as f:
+            assert len(json.load(f)["recordings"]) == 2
+
+        replay = ReplayProvider(fixture)
+        assert replay.make_call(messages) == "response 1"
+        assert replay.make_call([], call_site="customer_reply") == "response 2"
+        assert "".join(replay.stream_call([], call_site="customer_reply")) == (
+            "response 2"
+        )
+    print("✅ Recorded responses replayed offline")
+
+
+def test_hedged_provider():
+    """Test hedging a slow primary and failing over from a broken one"""
+    print("\nTesting hedged provider...")
+
+    hedged = HedgedProvider(
+        [SlowProvider("slow", 1.0), SlowProvider("fast", 0.01)],
+        default_hedge_delay=0.05,
+    )
+    started = time.perf_counter()
+    assert hedged.make_call([]) == "fast"
+    assert "".join(hedged.stream_call([])) == "fast"
+    assert time.perf_counter() - started < 0.5
+    print("✅ Slow primary hedged onto the secondary")
+
+    failover = HedgedProvider(
+        [SlowProvider("broken", 0.01, fail=True), SlowProvider("backup", 0.01)]
+    )
+    for _ in range(6):
+        assert failover.make_call([]) == "backup"
+    assert failover.ranked("call")[0] == 1
+    print("✅ Failed primary fails over and traffic shifts to the healthy backend")
+
+    # Batches, over backends wrapped the way the registry wraps them
+    from batching import BatchQueue
+
+    backends = [ReplayProvider(DEFAULT_REPLAY_FIXTURE) for _ in range(2)]
+    hedged = HedgedProvider(
+        [ScheduledProvider(backend, RateLimitScheduler()) for backend in backends]
+    )
+    batch = BatchQueue(hedged, max_batch_size=1, max_wait=0.01, poll_interval=0.01)
+    request = batch.submit([{"role": "user", "content": "Grade this"}], 50, "feedback")
+    assert not is_error_response(request.result(timeout=5))
+    batch.close()
+    assert [backend.batch_sizes for backend in backends] == [[1], []]
+    print("✅ Batches go through the healthiest backend's batch endpoint")
+
+
+def test_call_telemetry():
+    """Test that streamed calls emit records to registered sinks"""
+    print("\nTesting call telemetry...")
+
+    histogram = telemetry.HistogramSink()
+    prometheus = telemetry.PrometheusSink()
+    telemetry.add_sink(histogram)
+    telemetry.add_sink(prometheus)
+    try:
+        replay = ReplayProvider(DEFAULT_REPLAY_FIXTURE)
+        "".join(replay.stream_call([], call_site="customer_reply"))
+    finally:
+        telemetry.remove_sink(histogram)
+        telemetry.remove_sink(prometheus)
+
+    (record,) = histogram.records
+    assert record.call_site == "customer_reply" and record.streamed
+    assert record.output_tokens > 0 and record.ttft is not None
+    assert "customer_reply" in histogram.summary()
+    assert 'call_site="customer_reply",status="ok"} 1' in prometheus.render()
+    print("✅ Call records reach the histogram and Prometheus sinks")
+
+
+def test_priority_scheduler():
+    """Test that queued live replies are granted before background work"""
+    print("\nTesting rate limit scheduler...")
+
+    # 1200 requests/min with one request of burst: one grant every 50ms
+    scheduler = RateLimitScheduler(requests_per_minute=1200, burst_seconds=0.05)
+    provider = ScheduledProvider(CountingProvider(), scheduler)
+    provider.make_call([], call_site="batch_grading")  # Empty the bucket
+
+    granted = []
+
+    def call(call_site):
+        provider.make_call([], call_site=call_site)
+        granted.append(call_site)
+
+    threads = []
+    for call_site in ("batch_grading", "feedback", "assessment", "customer_reply"):
+        threads.append(threading.Thread(target=call, args=(call_site,)))
+        threads[-1].start()
+        time.sleep(0.005)  # Queue them in this order
+    for thread in threads:
+        thread.join()
+
+    assert granted == ["customer_reply", "assessment", "feedback", "batch_grading"]
+    print("✅ Calls queued under the limit are served by priority")
+
+
+def test_context_summary_failure():
+    """Test that a failed summary call keeps the digest and retries the exchange"""
+    from conversation_context import ConversationContext
+
+    print("\nTesting context summary failure...")
+
+    replies = iter(["Fee disputed.", "Error making OpenAI API call: timeout"])
+
+    def summarize(digest, exchange):
+        return next(replies, f"{digest} | {exchange.count('Representative:')} more")
+
+    context = ConversationContext(summarize, keep_exchanges=1)
+    context.start([{"role": "system", "content": "You are Sarah."}])
+    for turn in range(4):
+        turn_message = {"role": "user", "content": f"turn {turn}"}
+        context.add_exchange(f"rep {turn}", f"reply {turn}", turn_message)
+        digest = context.wait_for_digest()
+        if turn == 2:
+            assert digest == "Fee disputed." and len(context.unfolded) == 1
+    assert digest == "Fee disputed. | 2 more" and context.unfolded == []
+    context.close()
+    print("✅ Failed summary kept the old digest and was folded in next time")
+
+
+def test_scenario_catalog():
+    """Test that the catalog indexes files and loads scenarios once, on demand"""
+    from scenario_catalog import DEFAULT_SCENARIO_DIR, ScenarioCatalog
+
+    print("\nTesting scenario catalog...")
+
+    with tempfile.TemporaryDirectory() as directory:
+        index_path = os.path.join(directory, "index.json")
+        scenarios = ScenarioCatalog(DEFAULT_SCENARIO_DIR, index_path=index_path)
+        assert [entry["id"] for entry in scenarios.entries()] == ["billing_dispute"]
+        assert os.path.exists(index_path)
+        assert not scenarios._loaded  # Listing doesn't build scenarios
+
+        scenario = scenarios.get("billing_dispute")
+        assert scenarios.get("billing_dispute") is scenario
+        assert 'just said: "Hello "there""' in scenario.render_turn('Hello "there"')
+        assert "$" not in scenario.render_turn("Hi").replace("$45", "")
+
+        # A second catalog reuses the stored index without re-reading files
+        reopened = ScenarioCatalog(DEFAULT_SCENARIO_DIR, index_path=index_path)
+        reopened._read = None
+        assert reopened.entries() == scenarios.entries()
+    print("✅ Scenarios indexed on disk and loaded lazily")
+
+
+def test_transcript():
+    """Test that prompts render what was said, even with quotes in it"""
+    from feedback_prompts import format_conversation_for_review
+    from main import CustomerServiceTrainer
+
+    print("\nTesting transcript...")
+
+    trainer = CustomerServiceTrainer(
+        provider=ReplayProvider(DEFAULT_REPLAY_FIXTURE), use_cache=False
+    )
+    trainer.start_scenario(interactive=False)
+    trainer.handle_user_response('The "Plus" package is $45.')
+    review = trainer.format_conversation_for_review()
+    assert review.startswith("Customer: ")
+    assert '\n\nRepresentative: The "Plus" package is $45.\n\nCustomer: ' in review
+    assert "Continue playing" not in review
+
+    # Stored message lists are unwrapped to the same transcript
+    assert format_conversation_for_review(trainer.conversation_history) == review
+    print("✅ Transcript renders representative text verbatim")
+
+
+def test_rolling_assessment():
+    """Test that exchanges are assessed during the call and feedback synthesizes them"""
+    from main import CustomerServiceTrainer
+
+    print("\nTesting rolling assessment...")
+
+    provider = ReplayProvider(DEFAULT_REPLAY_FIXTURE)
+    trainer = CustomerServiceTrainer(provider=provider, use_cache=False)
+    trainer.start_scenario(interactive=False)
+    for response in ("Hi, how can I help?", "Let me look into that charge."):
+        trainer.handle_user_response(response)
+    assessments = trainer.assessor.results()
+    assert [a.upto for a in assessments] == [3, 5]
+    assert all(a.rating and a.hint for a in assessments)
+    assert trainer.analyze_conversation_for_coaching() == assessments[-1].hint
+
+    trainer.end_scenario_with_feedback()
+    sites = [site for site, _ in provider.request_sizes]
+    assert sites.count("assessment") == 2, sites  # Coaching reused the assessment
+    assert sites[-1] == "feedback_synthesis", sites
+
+    # A provider error string is a failed assessment, not a coaching hint
+    trainer = CustomerServiceTrainer(provider=provider, use_cache=False)
+    trainer.start_scenario(interactive=False)
+    trainer.handle_user_response("Hi, how can I help?")
+    trainer.assessor.assess = lambda upto: "API Error: overloaded"
+    trainer.assessor.reset()
+    assert trainer.analyze_conversation_for_coaching() is None
+    assert trainer.assessor.results() == []
+    print("✅ Exchanges assessed in the background and synthesized at the end")
+
+
+def test_topic_filter():
+    """Test that clearly off-topic input is redirected without an API call"""
+    from main import CustomerServiceTrainer
+
+    print("\nTesting off-topic filter...")
+
+    provider = ReplayProvider(DEFAULT_REPLAY_FIXTURE)
+    trainer = CustomerServiceTrainer(provider=provider, use_cache=False)
+    trainer.start_scenario(interactive=False)
+    calls = len(provider.request_sizes)
+
+    topic_filter = trainer.scenario.topic_filter
+    on_topic = (
+        "Okay, I have gone ahead and taken that off, effective immediately.",
+        "I totally hear you. Let me reverse that immediately and email a confirmation.",
+        "Mind if I place you on a brief hold while I speak with my lead?",
+        "Alright, that's been waived, and you won't see it going forward.",
+        "Give me just a sec, I'm bringing somebody senior onto the line.",
+        "Would you prefer we mail a paper copy or send an e-statement?",
+    )
+    for line in on_topic:
+        assert not topic_filter.classify(line).off_topic, line
+        trainer.handle_user_response(line)
+    trainer.assessor.results()
+    sites = [site for site, _ in provider.request_sizes[calls:]]
+    assert sites.count("customer_reply") == len(on_topic), sites
+    calls = len(provider.request_sizes)
+
+    off_topic = "Do you prefer pepperoni pizza or sushi for dinner on weekends?"
+    reply = "".join(trainer.stream_user_response(off_topic))
+    assert reply == topic_filter.redirect
+    trainer.assessor.results()
+    assert len(provider.request_sizes) == calls + 1  # Only the assessment
+    assert provider.request_sizes[-1][0] == "assessment"
+    assert trainer.transcript.turns[-2].drift == 1.0
+
+    trainer.handle_user_response("Let me look into that overage charge for you.")
+    assert trainer.transcript.turns[-2].drift < 0.2
+    print("✅ Off-topic input redirected locally, on-topic input sent to the model")
+
+
+def test_batch_submission():
+    """Test that grading and feedback go out as batches and map back by request"""
+    from batch_grading import grade_transcripts
+    from batching import BatchQueue
+    from main import CustomerServiceTrainer
+
+    print("\nTesting batch submission...")
+
+    provider = ReplayProvider(DEFAULT_REPLAY_FIXTURE, batch_delay=0.05)
+    batch = BatchQueue(provider, max_batch_size=2, max_wait=0.01, poll_interval=0.02)
+    with tempfile.TemporaryDirectory() as directory:
+        input_path = os.path.join(directory, "transcripts.jsonl")
+        output_path = os.path.join(directory, "results.jsonl")
+        with open(input_path, "w", encoding="utf-8") as f:
+            for transcript_id in ("a", "b", "c"):
+                record = {"id": transcript_id, "transcript": "Customer: Hi"}
+                f.write(json.dumps(record) + "\n")
+        stats = grade_transcripts(
+            input_path, output_path, provider, batch=batch, progress=lambda line: None
+        )
+        with open(output_path, encoding="utf-8") as f:
+            results = [json.loads(line) for line in f]
+    assert stats["graded"] == 3 and sorted(r["id"] for r in results) == ["a", "b", "c"]
+    assert provider.batch_sizes == [2, 1], provider.batch_sizes
+
+    trainer = CustomerServiceTrainer(provider=provider, use_cache=False)
+    trainer.start_scenario(interactive=False)
+    trainer.handle_user_response("Let me look into that charge.")
+    feedback = trainer.request_feedback(batch)
+    trainer.reset_scenario()
+    assert feedback.result(timeout=5)
+    batch.close()
+    sites = [site for site, _ in provider.request_sizes]
+    assert sites[-1] == "feedback_synthesis" and sites.count("batch_grading") == 3
+
+    # The local fallback never reuses the id of a batch already polled
+    local = CountingProvider()
+    request = {"custom_id": "a", "messages": [], "max_tokens": 10, "call_site": None}
+    first, second = local.submit_batch([request]), local.submit_batch([request])
+    assert local.poll_batch(first) == {"a": "response 1"}
+    assert local.submit_batch([request]) not in (first, second)
+    print("✅ Batched requests resolved back to their transcripts and sessions")
+
+
+def test_event_log():
+    """Test that turns, hints, feedback and call timings reach the event log"""
+    from event_log import EventLog
+    from main import CustomerServiceTrainer
+
+    print("\nTesting event log...")
+
+    with tempfile.TemporaryDirectory() as directory:
+        log = EventLog(os.path.join(directory, "events.sqlite3"), commit_interval=0.05)
+        trainer = CustomerServiceTrainer(
+            provider=ReplayProvider(DEFAULT_REPLAY_FIXTURE),
+            use_cache=False,
+            event_log=log,
+            trainee="sam",
+        )
+        trainer.start_scenario(interactive=False)
+        trainer.handle_user_response("Let me look into that charge.")
+        trainer.analyze_conversation_for_coaching()
+        trainer.end_scenario_with_feedback()
+        assert log.flush(timeout=5)
+
+        events = log.session_events(trainer.session_id)
+        kinds = [event["kind"] for event in events]
+        assert kinds[0] == "session_start" and kinds.count("turn") == 3, kinds
+        assert "coaching_hint" in kinds and kinds[-1] == "feedback", kinds
+        calls = [event for event in events if event["kind"] == "llm_call"]
+        assert {"opening_line", "customer_reply"} <= {c["call_site"] for c in calls}
+        assert log.sessions(trainee="sam")[0]["session_id"] == trainer.session_id
+        assert log.stats["commits"] < len(events)  # Commits are batched
+        trainer.close()
+        log.close()
+    print("✅ Session events committed in batches by the background writer")
+
+
+def test_session_analytics():
+    """Test that finished sessions land in the column store and aggregate"""
+    from analytics import AnalyticsStore
+    from assessment import extract_rating
+    from main import CustomerServiceTrainer
+
+    print("\nTesting session analytics...")
+
+    assert extract_rating("4. OVERALL RATING: 3.5 out of 5 - solid") == 3.5
+    assert extract_rating("Scored 2/5 early, 4/5 by the end") == 4.0
+    assert extract_rating("No rating given") is None
+    assert extract_rating("**OVERALL RATING (1-5):** 4") == 4.0
+    assert extract_rating("OVERALL RATING (1-5): 3/5") == 3.0
+    assert extract_rating("OVERALL RATING: improved over 2 calls, 4/5") == 4.0
+
+    with tempfile.TemporaryDirectory() as directory:
+        store = AnalyticsStore(directory)
+        trainer = CustomerServiceTrainer(
+            provider=ReplayProvider(DEFAULT_REPLAY_FIXTURE),
+            use_cache=False,
+            trainee="sam",
+            analytics=store,
+        )
+        for _ in range(2):
+            trainer.start_scenario(interactive=False)
+            for response in ("Hi, how can I help?", "Let me look into that charge."):
+                trainer.handle_user_response(response)
+            trainer.analyze_conversation_for_coaching(3)
+            trainer.end_scenario_with_feedback()
+            trainer.reset_scenario()
+        trainer.close()
+        metrics = {"turns": 1, "hints": 0, "hints_followed": 0, "off_topic": 0}
+        store.record_session(
+            "other", "kim", {**metrics, "latencies": [0.5]}, "OVERALL RATING: 2/5"
+        )
+
+        report = AnalyticsStore(directory).report(trainee="sam")
+        assert report["sessions"] == 2 and report["rating_mean"] == 4.0, report
+        assert report["rating_distribution"]["4"] == 2
+        assert report["turns_mean"] == 2 and report["coaching_hints"] == 2
+        assert set(report["reply_latency"]) == {"p50", "p90", "p99"}
+        assert AnalyticsStore(directory).report()["sessions"] == 3
+    print("✅ Ratings extracted and cohort aggregates computed from columns")
+
+
+def test_openai_response_chain():
+    """Test that follow-up turns send only new messages with previous_response_id"""
+    print("\nTesting OpenAI response chaining...")
+
+    client = FakeResponsesClient()
+    provider = OpenAIProvider(client=client)
+    messages = [
+        {"role": "system", "content": "You are Sarah.", "cache": True},
+        {"role": "user", "content": "Begin the call."},
+    ]
+    for turn in range(3):
+        reply = provider.make_call(messages, max_tokens=300)
+        messages = messages + [
+            {"role": "assistant", "content": reply},
+            {"role": "user", "content": f"Representative turn {turn}"},
+        ]
+
+    first, second, third = client.requests
+    assert "previous_response_id" not in first and len(first["input"]) == 1
+    assert second["previous_response_id"] == "resp_1"
+    assert second["input"] == [{"role": "user", "content": "Representative turn 0"}]
+    assert len(third["input"]) == 1 and third["instructions"] == "You are Sarah."
+    assert first["max_output_tokens"] >= 300
+
+    # The stored response expired: the turn is replayed in full
+    client.stored.clear()
+    provider.make_call(messages, max_tokens=300)
+    assert "previous_response_id" not in client.requests[-1]
+    assert len(client.requests[-1]["input"]) == 7
+    assert provider.chain_stats == {"chained": 2, "replayed": 2, "lost": 1}
+
+    # Through the trainer: every reply within the verbatim window is chained
+    from main import CustomerServiceTrainer
+
+    client = FakeResponsesClient()
+    trainer = CustomerServiceTrainer(
+        provider=OpenAIProvider(client=client), use_cache=False, keep_exchanges=8
+    )
+    trainer.start_scenario(interactive=False)
+    for turn in range(6):
+        trainer.handle_user_response(f"I'm sorry about the fee, let me check {turn}.")
+    trainer.close()
+    replies = [request for request in client.requests if request.get("stream")]
+    assert len(replies) == 6
+    assert all(request.get("previous_response_id") for request in replies)
+    assert [len(request["input"]) for request in replies] == [1] * 6
+    print("✅ Turns chained by response id, with a full replay when the chain is lost")
+
+
+def test_model_routing():
+    """Test that call sites go to their model tier and slow sites are downgraded"""
+    from main import CustomerServiceTrainer
+    from routing import ModelRouter, parse_tiers
+
+    print("\nTesting model routing...")
+
+    client = FakeResponsesClient()
+    provider = OpenAIProvider(client=client)
+    provider.make_call([{"role": "user", "content": "Hi"}], 200, "assessment", "fast")
+    assert client.requests[-1]["model"] == provider.model_tiers["fast"]
+    assert provider.model_for("standard") == provider.model_for(None) == "gpt-5"
+    assert provider.model_for("gpt-4.1") == "gpt-4.1"
+
+    class TierProvider(CountingProvider):
+        def __init__(self):
+            super().__init__()
+            self.models = []
+
+        def make_call(self, messages, max_tokens=1000, call_site=None, model=None):
+            self.models.append((call_site, model))
+            return super().make_call(messages, max_tokens, call_site, model)
+
+    provider = TierProvider()
+    trainer = CustomerServiceTrainer(provider=provider, use_cache=False)
+    trainer.start_scenario(interactive=False)
+    trainer.handle_user_response("I'm sorry about the fee on your bill, let me check.")
+    trainer.assessor.results()
+    trainer.close()
+    assert ("opening_line", "standard") in provider.models
+    assert ("customer_reply", "standard") in provider.models
+    assert ("assessment", "fast") in provider.models
+
+    router = ModelRouter(adaptive=True, min_samples=3, recovery_seconds=0.05)
+    assert router.tier_for("assessment", {"assessment": "standard"}) == "standard"
+    for _ in range(3):
+        router.record("customer_reply", "standard", 3.0)
+    assert router.tier_for("customer_reply") == "fast"
+    assert router.stats == {"downgrades": 1, "downgraded_calls": 1}
+    time.sleep(0.06)
+    assert router.tier_for("customer_reply") == "standard"
+
+    assert parse_tiers(["summary=standard"]) == {"summary": "standard"}
+    try:
+        parse_tiers(["summary"])
+        raise AssertionError("expected a ValueError")
+    except ValueError:
+        pass
+    print("✅ Call sites routed to tiers, slow site downgraded and recovered")
+
+
+def test_load_generator():
+    """Test the stand-in LLM server and a small bot cohort's report"""
+    import urllib.error
+    import urllib.request
+
+    from loadtest import Cohort, build_report, format_report
+    from standin_llm import make_standin_server
+
+    print("\nTesting load generator...")
+
+    def post(server, body):
+        url = "http://%s:%d/v1/messages" % server.server_address[:2]
+        request = urllib.request.Request(url, json.dumps(body).encode("utf-8"))
+        with urllib.request.urlopen(request) as response:
+            return response.headers["request-id"], response.read().decode("utf-8")
+
+    body = {
+        "model": "m",
+        "max_tokens": 100,
+        "messages": [{"role": "user", "content": "Hi"}],
+    }
+    server = make_standin_server(latency=None)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    request_id, reply = post(server, body)
+    assert json.loads(reply)["id"] == request_id
+    _, events = post(server, {**body, "stream": True})
+    assert "content_block_delta" in events and "event: message_stop" in events
+    assert set(server.stats.service_times) == {request_id, "msg_standin_00000002"}
+    server.shutdown()
+
+    server = make_standin_server(latency=None, error_rate=1.0)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        post(server, body)
+        raise AssertionError("expected a 529")
+    except urllib.error.HTTPError as e:
+        assert e.code == 529
+    server.shutdown()
+
+    sink = telemetry.HistogramSink()
+    telemetry.add_sink(sink)
+    cohort = Cohort(ReplayProvider(DEFAULT_REPLAY_FIXTURE), 3, 2, 0, 0)
+    wall = cohort.run()
+    telemetry.remove_sink(sink)
+    standin = {"requests": 0, "errors": 0, "max_in_flight": 0, "service_times": {}}
+    report = build_report(cohort, sink.records, standin, wall)
+    assert report["sessions_completed"] == 3 and not report["failures"]
+    assert report["call_sites"]["customer_reply"]["calls"] == 6
+    assert set(report["steps"]["coaching_hint"]) == {"p50", "p95", "p99"}
+    assert "3 trainees x 2 turns" in format_report(report)
+    print("✅ Stand-in server answered, failed on cue, and the cohort was reported")
+
+
+def test_span_tracing():
+    """Test that trainer and provider spans nest and are written per session"""
+    import tracing
+    from main import CustomerServiceTrainer
+
+    print("\nTesting span tracing...")
+
+    assert tracing.span("disabled") is tracing.span("also disabled")
+    with tempfile.TemporaryDirectory() as directory:
+        tracing.enable(directory)
+        try:
+            trainer = CustomerServiceTrainer(
+                provider=ReplayProvider(DEFAULT_REPLAY_FIXTURE), use_cache=False
+            )
+            trainer.start_scenario(interactive=False)
+            trainer.handle_user_response("I'm sorry about the fee, let me check.")
+            trainer.end_scenario_with_feedback()
+            session_id = trainer.session_id
+            trainer.reset_scenario()
+            trainer.close()
+
+            profiler = tracing.CommandProfiler(directory, cpu=True, memory=True)
+            with profiler.profile("start"):
+                sum(range(1000))
+        finally:
+            tracing.disable()
+
+        with open(os.path.join(directory, f"trace-{session_id}.json")) as f:
+            events = json.load(f)["traceEvents"]
+        spans = {e["name"]: e for e in events if e["ph"] == "X"}
+        assert {e["args"]["session"] for e in spans.values()} == {session_id}
+        outer = spans["CustomerServiceTrainer.stream_user_response"]
+        inner = spans["llm.stream"]
+        assert inner["args"]["call_site"] == "customer_reply"
+        assert outer["ts"] <= inner["ts"]
+        assert inner["ts"] + inner["dur"] <= outer["ts"] + outer["dur"]
+        assert "CustomerServiceTrainer.start_scenario" in spans
+        assert "context.build_messages" in spans
+        files = set(os.listdir(directory))
+        assert {"command-001-start.prof", "command-001-start.tracemalloc"} <= files
+    print("✅ Nested spans written to a per-session trace, command profiles saved")
+
+
+def test_session_eviction():
+    """Test that idle server sessions are parked on disk and restored intact"""
+    from main import CustomerServiceTrainer
+    from server import SessionManager, UnknownSession
+
+    print("\nTesting session eviction...")
+
+    provider = ReplayProvider(DEFAULT_REPLAY_FIXTURE)
+    with tempfile.TemporaryDirectory() as directory:
+        manager = SessionManager(
+            lambda: CustomerServiceTrainer(provider=provider, use_cache=False),
+            store_dir=directory,
+        )
+        session_id = manager.create()
+        with manager.session(session_id) as trainer:
+            trainer.start_scenario(interactive=False)
+            trainer.handle_user_response("Hi, how can I help?")
+            history = list(trainer.conversation_history)
+
+        assert manager.evict_idle(idle_seconds=0) == 1
+        assert manager.resident() == 0
+        with manager.session(session_id) as trainer:
+            assert trainer.conversation_history == history
+            assert len(trainer.context.exchanges) == 1
+            trainer.handle_user_response("Let me check that charge.")
+        assert manager.stats["restored"] == 1
+        try:
+            with manager.session("no-such-session"):
+                pass
+            raise AssertionError("expected UnknownSession")
+        except UnknownSession:
+            pass
+
+        # A slow park (waiting on a digest fold) doesn't hold up other sessions
+        with manager.session(session_id) as trainer:
+            to_state = trainer.to_state
+            trainer.to_state = lambda: time.sleep(0.5) or to_state()
+        sweep = threading.Thread(target=manager.evict_idle, args=(0,))
+        sweep.start()
+        time.sleep(0.1)
+        started = time.perf_counter()
+        with manager.session(manager.create()) as other:
+            other.start_scenario(interactive=False)
+        assert time.perf_counter() - started < 0.3
+        sweep.join()
+        manager.close()
+    print("✅ Idle session parked on disk and resumed")
+
+
 if __name__ == "__main__":
     test_provider_creation()
     test_simple_api_calls()
+    test_async_api_calls()
+    test_response_cache()
+    test_record_and_replay()
+    test_hedged_provider()
+    test_call_telemetry()
+    test_priority_scheduler()
+    test_context_summary_failure()
+    test_scenario_catalog()
+    test_transcript()
+    test_rolling_assessment()
+    test_topic_filter()
+    test_batch_submission()
+    test_event_log()
+    test_session_analytics()
+    test_openai_response_chain()
+    test_model_routing()
+    test_load_generator()
+    test_span_tracing()
+    test_session_eviction()
@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+"""
+Topic Filter
+Local off-topic detection for trainee input, scored against the active
+scenario's vocabulary so clear diversions skip the LLM round trip
+"""
+
+import math
+import re
+from typing import Dict, Iterable
+
+WORD = re.compile(r"[a-z0-9$]+(?:'[a-z]+)?")
+
+STOPWORDS = frozenset(
+    """
+    a about above after again all am an and any are as at be because been
+    before being below between both but by can could did do does doing don't
+    down during each few for from further had has have having he her here hers
+    herself him himself his how i i'd i'll i'm i've if in into is it it's its
+    itself just let let's me more most my myself no nor not now of off on once
+    only or other our ours ourselves out over own really same she should so
+    some such than that that's the their theirs them themselves then there
+    these they this those through to too under until up us very was we we'll
+    we're were what what's when where which while who whom why will with would
+    yes you you'd you'll you're you've your yours yourself yourselves ok okay
+    oh well hi hello hey please thanks thank also maybe get got go going know
+    think want like see say said tell one two much many way right
+    """.split()
+)
+
+# Words any representative uses on any call; never evidence of drift
+SERVICE_VOCABULARY = frozenset(
+    """
+    help assist sorry apologize apologise apologies understand understanding
+    account bill billing charge charges charged fee fees refund credit payment
+    pay paid price cost month monthly service services plan plans customer
+    call calling issue problem concern question questions check look looking
+    pull record records sure certainly absolutely happy glad appreciate
+    patience moment minute confirm verify name number email address today
+    anything else option options offer discount cancel remove removal policy
+    contract team manager supervisor escalate frustrating frustrated frustration
+    fix resolve resolved solution explain reason note notice support data
+    usage overage balance amount total due date last current recent previous
+    next new time week year days line details information system end
+    identity identify verification verified ssn social security zip code
+    postal digits four birth pin passcode holder authorized
+    hold holding wait waiting bear brief transfer transferring connect department
+    computer computers systems slow loading second seconds shortly
+    """.split()
+)
+
+DEFAULT_REDIRECT = (
+    "I'm sorry, but that's not why I'm calling. Can we please focus on my issue?"
+)
+
+
+def tokenize(text: str) -> Iterable[str]:
+    """Lowercased content words (stopwords and single letters removed)"""
+    return [
+        word
+        for word in WORD.findall(text.lower())
+        if len(word) > 1 and word not in STOPWORDS
+    ]
+
+
+class TopicVerdict:
+    """Result of classifying one input
+
+    drift is 0.0 when every content word belongs to the scenario or to
+    general service language, and 1.0 when none does.
+    """
+
+    __slots__ = ("drift", "off_topic")
+
+    def __init__(self, drift: float, off_topic: bool):
+        self.drift = drift
+        self.off_topic = off_topic
+
+
+class TopicFilter:
+    """TF-IDF-weighted vocabulary match against a scenario's own text
+
+    Each scenario text field is a document. A word's weight is its smoothed
+    inverse document frequency, and words the scenario never uses weigh
+    slightly more than the rarest scenario word. Drift is the weighted share
+    of the input's content words outside the vocabulary.
+
+    Args:
+        documents: Scenario texts (briefing fields, persona prompt, ...)
+        redirect: Canned in-character reply for off-topic input
+        min_unknown: Input is flagged only when it has no scenario or service
+                    word at all and at least this many content words outside
+                    the vocabulary. Anything less certain just records its
+                    drift and still reaches the model, which can handle
+                    phrasings the word lists miss
+    """
+
+    def __init__(
+        self,
+        documents: Iterable[str],
+        redirect: str = DEFAULT_REDIRECT,
+        min_unknown: int = 6,
+    ):
+        self.redirect = redirect
+        self.min_unknown = min_unknown
+
+        document_frequency: Dict[str, int] = {}
+        count = 0
+        for document in documents:
+            count += 1
+            for word in set(tokenize(document)):
+                document_frequency[word] = document_frequency.get(word, 0) + 1
+        self.unknown_weight = 1 + math.log(count + 1)
+        self.weights = {
+            word: 1 + math.log((count + 1) / (frequency + 1))
+            for word, frequency in document_frequency.items()
+        }
+        for word in SERVICE_VOCABULARY:
+            self.weights.setdefault(word, 1.0)
+
+    @classmethod
+    def from_fields(cls, fields: Iterable, **options) -> "TopicFilter":
+        """Filter whose documents are every string found in nested fields"""
+
+        def strings(value):
+            if isinstance(value, str):
+                yield value
+            elif isinstance(value, dict):
+                for key, item in value.items():
+                    yield from strings(key.replace("_", " "))
+                    yield from strings(item)
+            elif isinstance(value, (list, tuple)):
+                for item in value:
+                    yield from strings(item)
+
+        return cls(strings(list(fields)), **options)
+
+    def classify(self, text: str) -> TopicVerdict:
+        """Score one input; a few dict lookups per word"""
+        words = tokenize(text)
+        if not words:
+            return TopicVerdict(0.0, False)
+
+        total = outside = 0.0
+        unknown = known = 0
+        for word in words:
+            weight = self.weights.get(word)
+            if weight is None:
+                # Allow plurals/possessives of scenario words
+                weight = self.weights.get(word.removesuffix("'s").removesuffix("s"))
+            if weight is None:
+                unknown += 1
+                outside += self.unknown_weight
+                total += self.unknown_weight
+            else:
+                known += 1
+                total += weight
+        drift = outside / total
+        return TopicVerdict(drift, not known and unknown >= self.min_unknown)
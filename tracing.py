@@ -0,0 +1,348 @@
+#!/usr/bin/env python3
+"""
+Span Tracing
+Nested, session-tagged timing spans across the trainer and provider calls,
+written as Chrome trace timelines, plus per-command cProfile and tracemalloc
+snapshots for the CLI
+"""
+
+import cProfile
+import functools
+import inspect
+import json
+import os
+import re
+import threading
+import time
+import tracemalloc
+from typing import Dict, List
+
+# The active Tracer; None while tracing is off, so a disabled span costs one
+# global lookup
+_tracer = None
+
+
+class _NoopSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def set(self, **attrs):
+        pass
+
+    def set_session(self, session):
+        pass
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+class Span:
+    """One timed, named operation; use as a context manager"""
+
+    __slots__ = ("tracer", "name", "session", "attrs", "started")
+
+    def __init__(self, tracer: "Tracer", name: str, session: str, attrs: Dict):
+        self.tracer = tracer
+        self.name = name
+        self.session = session
+        self.attrs = attrs
+        self.started = None
+
+    def __enter__(self):
+        stack = self.tracer._stack()
+        if self.session is None and stack:
+            self.session = stack[-1].session
+        stack.append(self)
+        self.started = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        ended = time.perf_counter_ns()
+        stack = self.tracer._stack()
+        # A generator's span can close out of order when the generator is
+        # abandoned, so remove this span rather than the innermost one
+        for position in range(len(stack) - 1, -1, -1):
+            if stack[position] is self:
+                del stack[position]
+                break
+        if exc is not None:
+            self.attrs["error"] = repr(exc)
+        self.tracer._add(self, ended)
+        return False
+
+    def set(self, **attrs):
+        """Attach attributes known only once the span is running"""
+        self.attrs.update(attrs)
+
+    def set_session(self, session):
+        """File the span under a session that started while it was running"""
+        self.session = session
+
+
+class Tracer:
+    """Collects finished spans and writes one Chrome trace per session
+
+    Spans nest per thread; a span without a session id takes its parent's.
+    Spans that never get a session (CLI startup, batch grading) are written
+    to trace-process.json.
+
+    Args:
+        directory: Where trace files are written
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self._events: Dict[str, List[Dict]] = {}  # session id -> events
+        self._thread_names: Dict[int, str] = {}
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._pid = os.getpid()
+
+    def span(self, name: str, session: str = None, **attrs) -> Span:
+        return Span(self, name, session, attrs)
+
+    def instant(self, name: str, **attrs):
+        """Record a point in time (e.g. HTTP response headers received)"""
+        stack = self._stack()
+        session = stack[-1].session if stack else None
+        self._append(
+            session,
+            {
+                "name": name,
+                "ph": "i",
+                "s": "t",
+                "ts": time.perf_counter_ns() / 1000,
+                "pid": self._pid,
+                "tid": threading.get_ident(),
+                "args": attrs,
+            },
+        )
+
+    def _stack(self) -> List[Span]:
+        stack = getattr(self._local, "stack", None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    def _add(self, span: Span, ended: int):
+        self._append(
+            span.session,
+            {
+                "name": span.name,
+                "ph": "X",
+                "ts": span.started / 1000,
+                "dur": (ended - span.started) / 1000,
+                "pid": self._pid,
+                "tid": threading.get_ident(),
+                "args": {"session": span.session, **span.attrs},
+            },
+        )
+
+    def _append(self, session: str, event: Dict):
+        thread = threading.current_thread()
+        with self._lock:
+            self._thread_names[thread.ident] = thread.name
+            self._events.setdefault(session, []).append(event)
+
+    def write_session(self, session: str) -> str:
+        """Write (or extend) a session's trace file and drop its spans
+
+        Returns:
+            The file path, or None if the session had no spans
+        """
+        with self._lock:
+            events = self._events.pop(session, None)
+            thread_names = dict(self._thread_names)
+        if not events:
+            return None
+        path = os.path.join(self.directory, f"trace-{session or 'process'}.json")
+        try:
+            with open(path, encoding="utf-8") as f:
+                # Spans that finished after the session's file was written
+                events = json.load(f)["traceEvents"] + events
+        except (OSError, ValueError, KeyError):
+            pass
+        named = {event["tid"] for event in events if event["ph"] == "M"}
+        metadata = [
+            {
+                "name": "thread_name",
+                "ph": "M",
+                "pid": self._pid,
+                "tid": tid,
+                "args": {"name": thread_names.get(tid, str(tid))},
+            }
+            for tid in {event["tid"] for event in events} - named
+        ]
+        with open(path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(
+                {"traceEvents": events + metadata, "displayTimeUnit": "ms"},
+                f,
+                ensure_ascii=False,
+            )
+        os.replace(path + ".tmp", path)
+        return path
+
+    def write_all(self) -> List[str]:
+        """Write every session still in memory"""
+        with self._lock:
+            sessions = list(self._events)
+        return [path for path in map(self.write_session, sessions) if path]
+
+
+def enable(directory: str) -> Tracer:
+    """Start tracing into directory"""
+    global _tracer
+    _tracer = Tracer(directory)
+    return _tracer
+
+
+def disable() -> Tracer:
+    """Stop tracing; returns the tracer that was active (or None)"""
+    global _tracer
+    tracer, _tracer = _tracer, None
+    return tracer
+
+
+def span(name: str, session: str = None, **attrs):
+    """Context manager timing a block (a no-op when tracing is off)"""
+    tracer = _tracer
+    if tracer is None:
+        return _NOOP_SPAN
+    return tracer.span(name, session, **attrs)
+
+
+def instant(name: str, **attrs):
+    tracer = _tracer
+    if tracer is not None:
+        tracer.instant(name, **attrs)
+
+
+def end_session(session: str):
+    """Write a finished session's trace file (no-op when tracing is off)"""
+    tracer = _tracer
+    if tracer is not None and session is not None:
+        tracer.write_session(session)
+
+
+def traced(name: str = None):
+    """Decorator running a method (or generator method) inside a span
+
+    The span carries the instance's session_id as of when the method
+    returns, so a method that starts a new session is filed under it.
+    """
+
+    def decorator(fn):
+        label = name or fn.__qualname__
+
+        if inspect.isgeneratorfunction(fn):
+
+            @functools.wraps(fn)
+            def generator_wrapper(self, *args, **kwargs):
+                tracer = _tracer
+                if tracer is None:
+                    return (yield from fn(self, *args, **kwargs))
+                with tracer.span(label, getattr(self, "session_id", None)) as span:
+                    try:
+                        return (yield from fn(self, *args, **kwargs))
+                    finally:
+                        span.set_session(getattr(self, "session_id", span.session))
+
+            return generator_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(self, *args, **kwargs):
+            tracer = _tracer
+            if tracer is None:
+                return fn(self, *args, **kwargs)
+            with tracer.span(label, getattr(self, "session_id", None)) as span:
+                try:
+                    return fn(self, *args, **kwargs)
+                finally:
+                    span.set_session(getattr(self, "session_id", span.session))
+
+        return wrapper
+
+    return decorator
+
+
+def http_request_hook(request):
+    """httpx event hook marking when a request is handed to the network"""
+    instant("http.request", method=request.method, url=str(request.url))
+
+
+def http_response_hook(response):
+    """httpx event hook marking when response headers arrive"""
+    instant("http.response", status=response.status_code)
+
+
+class CommandProfiler:
+    """cProfile and/or tracemalloc snapshots around each CLI command
+
+    Each command writes command-<n>-<name>.prof (cProfile stats, for pstats
+    or snakeviz) and/or .tracemalloc (a tracemalloc.Snapshot dump) plus a
+    .tracemalloc.txt of the largest allocation changes since the previous
+    command.
+
+    Args:
+        directory: Where profiles are written
+        cpu: Run each command under cProfile
+        memory: Snapshot traced memory after each command
+    """
+
+    def __init__(self, directory: str, cpu: bool = False, memory: bool = False):
+        self.directory = directory
+        self.cpu = cpu
+        self.memory = memory
+        self.commands = 0
+        os.makedirs(directory, exist_ok=True)
+        if memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+        self._snapshot = tracemalloc.take_snapshot() if memory else None
+
+    def profile(self, command: str):
+        """Context manager profiling one command"""
+        return _CommandProfile(self, command)
+
+    def _prefix(self, command: str) -> str:
+        self.commands += 1
+        label = re.sub(r"[^a-z0-9_]+", "_", command.lower())
+        return os.path.join(self.directory, f"command-{self.commands:03d}-{label}")
+
+
+class _CommandProfile:
+    __slots__ = ("profiler", "command", "_cprofile")
+
+    def __init__(self, profiler: CommandProfiler, command: str):
+        self.profiler = profiler
+        self.command = command
+        self._cprofile = None
+
+    def __enter__(self):
+        if self.profiler.cpu:
+            self._cprofile = cProfile.Profile()
+            self._cprofile.enable()
+        return self
+
+    def __exit__(self, *exc):
+        if self._cprofile is not None:
+            self._cprofile.disable()
+        profiler = self.profiler
+        if not (profiler.cpu or profiler.memory):
+            return False
+        prefix = profiler._prefix(self.command)
+        if self._cprofile is not None:
+            self._cprofile.dump_stats(prefix + ".prof")
+        if profiler.memory:
+            snapshot = tracemalloc.take_snapshot()
+            snapshot.dump(prefix + ".tracemalloc")
+            changes = snapshot.compare_to(profiler._snapshot, "lineno")[:25]
+            with open(prefix + ".tracemalloc.txt", "w", encoding="utf-8") as f:
+                f.write("\n".join(str(stat) for stat in changes) + "\n")
+            profiler._snapshot = snapshot
+        return False
@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+Transcript Model
+Compact record of who said what in a roleplay call, kept alongside the
+provider message list so prompts never have to re-parse wrapped messages
+"""
+
+import time
+from typing import Dict, List
+
+from conversation_context import estimate_tokens
+
+CUSTOMER = "customer"
+REPRESENTATIVE = "representative"
+
+LABELS = {CUSTOMER: "Customer", REPRESENTATIVE: "Representative"}
+
+
+class Turn:
+    """One utterance: speaker, raw text, wall-clock timestamps, token estimate
+
+    Representative turns also carry the topic filter's drift score.
+    """
+
+    __slots__ = ("speaker", "text", "started_at", "ended_at", "tokens", "drift")
+
+    def __init__(
+        self,
+        speaker: str,
+        text: str,
+        started_at: float,
+        ended_at: float,
+        tokens: int = None,
+        drift: float = None,
+    ):
+        self.speaker = speaker
+        self.text = text
+        self.started_at = started_at
+        self.ended_at = ended_at
+        self.tokens = estimate_tokens(text) if tokens is None else tokens
+        self.drift = drift
+
+    def render(self) -> str:
+        return f"{LABELS[self.speaker]}: {self.text}"
+
+    def to_dict(self) -> Dict:
+        return {slot: getattr(self, slot) for slot in self.__slots__}
+
+
+class Transcript:
+    """Append-only list of turns with each turn's rendered line cached
+
+    Rendering any window of the call is a join over cached lines, so coaching
+    and feedback prompts cost nothing per turn beyond the text itself.
+    """
+
+    def __init__(self):
+        self.turns: List[Turn] = []
+        self._lines: List[str] = []
+
+    def __len__(self) -> int:
+        return len(self.turns)
+
+    def add(
+        self,
+        speaker: str,
+        text: str,
+        started_at: float = None,
+        ended_at: float = None,
+        tokens: int = None,
+        drift: float = None,
+    ) -> Turn:
+        """Append a turn
+
+        Args:
+            speaker: CUSTOMER or REPRESENTATIVE
+            text: What was actually said
+            started_at: When the turn began. Defaults to the end of the
+                       previous turn (so a representative turn spans the time
+                       the trainee took to answer).
+            ended_at: When the turn finished. Defaults to now.
+            tokens: Token count, estimated from the text if not given
+            drift: Off-topic drift score of a representative turn
+        """
+        ended_at = time.time() if ended_at is None else ended_at
+        if started_at is None:
+            started_at = self.turns[-1].ended_at if self.turns else ended_at
+        turn = Turn(speaker, text, started_at, ended_at, tokens, drift)
+        self.turns.append(turn)
+        self._lines.append(turn.render())
+        return turn
+
+    def render(self, start: int = 0, end: int = None) -> str:
+        """Transcript text for turns[start:end], one paragraph per turn"""
+        return "\n\n".join(self._lines[max(start, 0) : end])
+
+    def tokens(self, speaker: str = None) -> int:
+        """Total token estimate, optionally for one speaker"""
+        return sum(
+            turn.tokens for turn in self.turns if speaker in (None, turn.speaker)
+        )
+
+    def to_list(self) -> List[Dict]:
+        return [turn.to_dict() for turn in self.turns]
+
+    @classmethod
+    def from_list(cls, turns: List[Dict]) -> "Transcript":
+        transcript = cls()
+        for turn in turns:
+            transcript.add(**turn)
+        return transcript
+
+    @classmethod
+    def from_messages(cls, messages: List[Dict], scenario) -> "Transcript":
+        """Rebuild a transcript from a trainer message list
+
+        For histories stored without a transcript. Leading system messages
+        and the opening cue are skipped; representative turns are unwrapped
+        with the scenario's turn template. Timestamps are unknown (0).
+        """
+        transcript = cls()
+        opened = False
+        for msg in messages:
+            if msg["role"] == "assistant":
+                opened = True
+                transcript.add(CUSTOMER, msg["content"], 0.0, 0.0)
+            elif msg["role"] == "user" and opened:
+                text = scenario.parse_turn(msg["content"])
+                transcript.add(
+                    REPRESENTATIVE, msg["content"] if text is None else text, 0.0, 0.0
+                )
+        return transcript